@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""
+Asyncio scraping engine: many sessions inside one event loop.
+
+The multiprocessing engine spends almost all of its wall time waiting on
+sockets and time.sleep, paying a full Python process per session for it.
+Here every session still has its own cookie jar and p_auth and follows the
+same request sequence as parallel_scraper, split in the same two stages as
+pipeline.py:
+
+    Stage 1: search → pagination, ASYNC_CONCURRENCY long-lived sessions
+             taking prefixes in turn (home page for p_auth loaded once each)
+    Stage 2: DetailsPPAction → infoDetailPP → detailsPPDossierPro
+             → detailsPPDiplomes → detailsPPPersonne, ASYNC_DETAIL_CONCURRENCY
+             long-lived sessions pulling cards from a shared queue
+
+All sessions share one connection pool. With OFFLOAD_EXTRACTION the tabs are
+extracted in a process pool, not on the event loop. Enable with ENGINE = 'async' in config.py.
+"""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import time
+import aiohttp
+
+import config
+from smart_expansion import ExpansionPlanner, expansion_message, will_expand
+from seen_index import SeenIndex, card_fingerprint
+from frontier import Frontier, PrefixQueue
+from pipeline import new_prefix_result
+from db_writer import DbWriter
+from rate_limiter import get_rate_limiter, pool_options
+import telemetry
+import profiler
+from transport import count_opened, count_response
+from retries import RequestFailed, is_retryable_status, backoff_delay
+from response_store import extract_raw, extract_workers
+from parallel_scraper import (
+    HOME_URL,
+    SEARCH_URL,
+    RESULTS_URL,
+    USER_AGENT,
+    PAGINATION_HEADERS,
+    WorkerSession,
+    extract_p_auth,
+    extract_total_results,
+    build_search_data,
+    build_pagination_params,
+    parse_cards,
+    parse_card,
+    build_detail_requests,
+    has_full_details,
+    endpoint_name,
+    record_request,
+)
+
+
+def new_session(connector):
+    """Client session with its own cookie jar on the shared connection pool"""
+    return aiohttp.ClientSession(
+        connector=connector,
+        connector_owner=False,
+        cookie_jar=aiohttp.CookieJar(),
+        headers={'User-Agent': USER_AGENT},
+        timeout=aiohttp.ClientTimeout(total=config.REQUEST_TIMEOUT),
+        trace_configs=[connection_trace()],
+    )
+
+
+def connection_trace():
+    """aiohttp side of the transport metrics: connections opened, responses by protocol"""
+    trace = aiohttp.TraceConfig()
+
+    async def on_connection_create_end(session, context, params):
+        count_opened('aiohttp')
+
+    async def on_request_end(session, context, params):
+        version = params.response.version
+        count_response('aiohttp', f'HTTP/{version.major}.{version.minor}')
+
+    trace.on_connection_create_end.append(on_connection_create_end)
+    trace.on_request_end.append(on_request_end)
+    return trace
+
+
+# Network errors worth retrying (anything else is raised right away)
+RETRYABLE_ERRORS = (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)
+
+
+async def limited_request_async(session, method, url, **kwargs):
+    """
+    Async twin of parallel_scraper.limited_request: global rate limiter,
+    same retry policy. Returns (status, text).
+    """
+    limiter = get_rate_limiter()
+    endpoint = endpoint_name(url, kwargs.get('params'))
+    profile = profiler.current()
+
+    for attempt in range(1, config.RETRY_ATTEMPTS + 1):
+        waited = profiler.clock() if profile is not None else None
+        await limiter.acquire_async()
+        if waited:
+            profiler.add(profile, 'sleep', waited)
+            fetching = profiler.clock()
+        start = time.monotonic()
+        try:
+            async with session.request(method, url, **kwargs) as response:
+                body = await response.read()
+                text = await response.text()
+        except RETRYABLE_ERRORS:
+            limiter.record(None, time.monotonic() - start)
+            record_request(endpoint, None, time.monotonic() - start)
+            if waited:
+                profiler.add(profile, f'fetch:{endpoint}', fetching)
+            if attempt == config.RETRY_ATTEMPTS:
+                raise
+            await backoff_async(backoff_delay(attempt), profile)
+            continue
+
+        latency = time.monotonic() - start
+        limiter.record(response.status, latency)
+        record_request(endpoint, response.status, latency, len(body))
+        if waited:
+            profiler.add(profile, f'fetch:{endpoint}', fetching)
+        if not is_retryable_status(response.status):
+            return response.status, text
+        if attempt == config.RETRY_ATTEMPTS:
+            raise RequestFailed(response.status, url)
+        await backoff_async(backoff_delay(attempt, response.headers.get('Retry-After')), profile)
+
+
+async def backoff_async(delay, profile=None):
+    """Async twin of parallel_scraper.backoff"""
+    start = profiler.clock() if profile is not None else None
+    await asyncio.sleep(delay)
+    if start:
+        profiler.add(profile, 'sleep', start)
+
+
+async def get_p_auth_async(session):
+    """Load the home page and return the p_auth token ('' if missing)"""
+    _, html = await limited_request_async(session, 'GET', HOME_URL)
+    return extract_p_auth(html)
+
+
+async def ensure_p_auth_async(worker):
+    """Async twin of WorkerSession.ensure_p_auth"""
+    if not worker.p_auth:
+        worker.p_auth = await get_p_auth_async(worker.session)
+    return worker.p_auth
+
+
+async def fetch_details_async(worker, data, ids, tabs=None, extract=True):
+    """Async twin of parallel_scraper.fetch_details"""
+    failed = {}
+    raw = {}
+    steps = build_detail_requests(data['rpps'], ids, await ensure_p_auth_async(worker))
+    fields = [field for field, _, _, _ in steps if field and (tabs is None or field in tabs)]
+    profiling = profiler.activate(data)
+
+    for index in range(len(steps)):
+        field, url, params, _ = steps[index]
+        if field and field not in fields:
+            continue
+        try:
+            _, html = await limited_request_async(worker.session, 'POST', url, params=params, data=b'')
+            if not field and not worker.accepted(html):
+                # Stale p_auth: open the popup again, and go on, with the token of the new session
+                steps = build_detail_requests(data['rpps'], ids, worker.p_auth)
+                _, html = await limited_request_async(worker.session, 'POST', url, params=steps[index][2], data=b'')
+            if field:
+                raw[field] = html
+        except Exception as e:
+            print(f"    ERROR fetching {field or 'details'} for {data['name']}: {e!r}")
+            if not field:
+                # No detail context on the server, none of the tabs can be fetched
+                failed = {f: str(e) or repr(e) for f in fields}
+                break
+            failed[field] = str(e) or repr(e)
+
+    profiler.deactivate(profiling)
+    data['failed_requests'] = {'ids': ids, 'tabs': failed}
+    data['raw'] = raw
+    return extract_raw(data) if extract else data
+
+
+async def search_prefix_async(worker, prefix):
+    """Async twin of parallel_scraper.search_prefix, returns the page"""
+    _, html = await limited_request_async(worker.session, 'POST', SEARCH_URL,
+                                          data=build_search_data(prefix, await ensure_p_auth_async(worker)))
+    if not worker.accepted(html):
+        _, html = await limited_request_async(worker.session, 'POST', SEARCH_URL,
+                                              data=build_search_data(prefix, worker.p_auth))
+    return html
+
+
+async def harvest_prefix_async(worker, prefix, expand=False):
+    """
+    Stage 1: search + pagination for one prefix on a long-lived WorkerSession.
+    expand=True skips the pagination of prefixes that will be expanded.
+    Returns {'prefix', 'total_cards', 'total_results', 'pages', 'cards': [(data, ids), ...]} or an error dict.
+    """
+    try:
+        session = worker.session
+        if not await ensure_p_auth_async(worker):
+            print(f"[async] Prefix '{prefix}': Failed to get p_auth")
+            return {'prefix': prefix, 'error': 'No p_auth'}
+
+        html = await search_prefix_async(worker, prefix)
+        all_cards = list(parse_cards(html))
+        total_results = extract_total_results(html)
+
+        for page in range(2, config.MAX_PAGES + 1):
+            if expand and will_expand(total_results):
+                break
+            status, html = await limited_request_async(session, 'GET', RESULTS_URL,
+                                                       params=build_pagination_params(page),
+                                                       headers=PAGINATION_HEADERS)
+            if status == 200 and not worker.accepted(html):
+                # Session reset mid-pagination: the search lives in the session, run it again
+                await search_prefix_async(worker, prefix)
+                status, html = await limited_request_async(session, 'GET', RESULTS_URL,
+                                                           params=build_pagination_params(page),
+                                                           headers=PAGINATION_HEADERS)
+            if status != 200:
+                break
+
+            page_cards = parse_cards(html)
+            if not page_cards:
+                break
+
+            all_cards.extend(page_cards)
+
+        cards = []
+        for card in all_cards:
+            data, ids = parse_card(card, prefix)
+            if data:
+                cards.append((data, ids))
+
+        pages_scraped = (len(all_cards) + 9) // 10
+        print(f"[async] Prefix '{prefix}': ✓ Collected {len(all_cards)} cards from {pages_scraped} pages")
+
+        return {'prefix': prefix, 'total_cards': len(all_cards), 'total_results': total_results,
+                'pages': pages_scraped, 'cards': cards}
+
+    except Exception as e:
+        print(f"[async] Prefix '{prefix}': ERROR - {e!r}")
+        return {'prefix': prefix, 'error': str(e) or repr(e)}
+
+
+async def detail_worker(connector, cards, on_doctor, writer, extract_pool=None):
+    """
+    Stage 2 consumer: one long-lived session fetching one doctor at a time
+    (never concurrent detail chains on the same session).
+    With an extract_pool (process executor) the tabs are extracted there,
+    off the event loop.
+    The record is handed to the DbWriter and the session moves on to the next
+    card; on_doctor(data, is_duplicate, error) is called for every card, once
+    its batch is committed, and only then is the card done for cards.join().
+    """
+    loop = asyncio.get_running_loop()
+
+    def finish(data, is_duplicate, error):
+        try:
+            on_doctor(data, is_duplicate, error)
+        finally:
+            cards.task_done()
+
+    def on_saved(data):
+        # Called from the writer thread
+        return lambda is_duplicate, error: loop.call_soon_threadsafe(finish, data, is_duplicate, error)
+
+    async with new_session(connector) as session:
+        worker = WorkerSession(session)
+        while True:
+            data, ids = await cards.get()
+            started = time.monotonic()
+            try:
+                await fetch_details_async(worker, data, ids, extract=extract_pool is None)
+                if extract_pool is not None:
+                    data = await loop.run_in_executor(extract_pool, extract_raw, data)
+            except Exception as e:
+                finish(data, False, repr(e))
+            else:
+                writer.save(data, on_saved(data))
+            finally:
+                telemetry.reporter().count('scraper_worker_busy_seconds_total', time.monotonic() - started,
+                                           pool='detail')
+
+
+async def async_scrape(initial_prefixes, concurrency, detail_concurrency, expand=False):
+    """
+    Harvest prefixes with a pool of `concurrency` sessions and fetch
+    details with `detail_concurrency` sessions. With expand=True, prefixes
+    that hit the pagination wall are expanded (same rule as
+    smart_expansion.smart_scrape) as soon as they are harvested.
+    Cards of doctors in the seen-RPPS index are never fetched.
+    Progress is checkpointed in the frontier tables, like pipeline_scrape.
+
+    Returns:
+        List of per-prefix results (same shape as scrape_prefix results)
+    """
+    connector = aiohttp.TCPConnector(limit=concurrency + detail_concurrency,
+                                     limit_per_host=concurrency + detail_concurrency,
+                                     keepalive_timeout=config.HTTP_KEEPALIVE_EXPIRY)
+    # Harvest sessions, each used by one prefix at a time (search state lives in the session)
+    harvest_sessions = asyncio.Queue()
+    for _ in range(concurrency):
+        harvest_sessions.put_nowait(WorkerSession(new_session(connector)))
+    cards = asyncio.Queue()
+    results = {}
+    tasks = set()
+    progress = telemetry.reporter()
+    seen = SeenIndex() if config.SKIP_SEEN_DOCTORS else None
+
+    planner = ExpansionPlanner()
+    frontier = Frontier()
+    frontier.seed(initial_prefixes, planner.priorities(initial_prefixes))
+    to_harvest = frontier.resumable_prefixes()
+    resumed_cards = frontier.pending_cards()
+    print(f"   Frontier: {frontier.counts()} → {len(to_harvest)} prefixes to harvest, "
+          f"{len(resumed_cards)} cards pending from a previous run")
+
+    def queue_card(card):
+        results[card[0]['prefix']]['remaining'] += 1
+        cards.put_nowait(card)
+
+    def on_doctor(data, is_duplicate, error):
+        prefix = data['prefix']
+        res = results[prefix]
+        res['remaining'] -= 1
+        progress.set('scraper_queue_depth', cards.qsize(), queue='doctors')
+        progress.set('scraper_queue_depth', writer.queue.qsize(), queue='db_writer')
+        if res['remaining'] == 0:
+            frontier.mark_done(prefix)
+            progress.done(prefix)
+
+        if error:
+            # Card stays in the detail queue for the next run
+            print(f"    ERROR scraping {data['name']} ({prefix}): {error}")
+            if seen is not None:
+                seen.release(data['rpps'])
+            return
+
+        has_details = has_full_details(data)
+        res['count'] += 1
+        if has_details:
+            res['details_complete'] += 1
+            frontier.card_done(data['rpps'])
+        elif seen is not None:
+            seen.release(data['rpps'])
+        if is_duplicate:
+            res['duplicates'] += 1
+
+        progress.doctor(prefix, res['count'], res['count'] + res['remaining'], has_details, is_duplicate)
+
+    # One run() task per waiting prefix; whichever gets a free session takes the best prefix left
+    waiting = PrefixQueue()
+
+    async def run():
+        worker = await harvest_sessions.get()
+        prefix = waiting.pop()
+        progress.set('scraper_queue_depth', len(waiting), queue='prefixes')
+        frontier.mark_harvesting(prefix)
+        started = time.monotonic()
+        try:
+            harvest = await harvest_prefix_async(worker, prefix, expand)
+        finally:
+            harvest_sessions.put_nowait(worker)
+            progress.count('scraper_worker_busy_seconds_total', time.monotonic() - started, pool='harvest')
+
+        if harvest.get('error'):
+            frontier.mark_failed(prefix, harvest['error'])
+            results[prefix] = {'prefix': prefix, 'count': 0, 'error': harvest['error']}
+            return
+
+        total_cards = harvest['total_cards']
+        total_results = harvest['total_results']
+        results[prefix] = new_prefix_result(prefix, total_cards)
+
+        children, pruned = planner.plan(prefix, total_cards, total_results) if expand else ([], [])
+        if children or pruned:
+            print(expansion_message(prefix, total_cards, total_results, children, pruned) + "\n")
+
+        doctor_cards = harvest['cards']
+        captured = [card[0]['rpps'] for card in doctor_cards]
+        priorities = planner.priorities(
+            children, total_results or total_cards,
+            frontier.new_fraction(prefix, captured)) if children else {}
+        if config.MAX_DOCTORS_PER_PREFIX > 0:
+            doctor_cards = doctor_cards[:config.MAX_DOCTORS_PER_PREFIX]
+
+        if seen is not None:
+            fresh = [card for card in doctor_cards
+                     if seen.claim(card[0]['rpps'], card_fingerprint(card[0]))]
+            results[prefix]['skipped'] = len(doctor_cards) - len(fresh)
+            doctor_cards = fresh
+
+        # Checkpoint before dispatching anything
+        frontier.mark_harvested(prefix, total_cards, harvest['pages'], children, doctor_cards,
+                                total_results=total_results, pruned=pruned, captured=captured,
+                                priorities=priorities)
+        if not doctor_cards:
+            frontier.mark_done(prefix)
+
+        for child in children:
+            spawn(child, priorities[child])
+        for card in doctor_cards:
+            queue_card(card)
+
+    def spawn(prefix, priority=0.0):
+        waiting.push(prefix, priority)
+        task = asyncio.create_task(run())
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    # BeautifulSoup would otherwise run on the event loop, stalling every session
+    extract_pool = ProcessPoolExecutor(extract_workers(), **pool_options()) if config.OFFLOAD_EXTRACTION else None
+    writer = DbWriter()
+    writer.start()
+    progress.set('scraper_pool_workers', concurrency, pool='harvest')
+    progress.set('scraper_pool_workers', detail_concurrency, pool='detail')
+    if extract_pool is not None:
+        progress.set('scraper_pool_workers', extract_workers(), pool='extract')
+    workers = [asyncio.create_task(detail_worker(connector, cards, on_doctor, writer, extract_pool))
+               for _ in range(detail_concurrency)]
+
+    try:
+        stored = frontier.priorities()
+        for prefix in to_harvest:
+            spawn(prefix, stored.get(prefix, 0.0))
+
+        for card in resumed_cards:
+            prefix = card[0]['prefix']
+            if seen is not None and not seen.claim(card[0]['rpps'], card_fingerprint(card[0])):
+                frontier.card_done(card[0]['rpps'])
+                continue
+            if prefix not in results:
+                info = frontier.prefix_info(prefix)
+                results[prefix] = new_prefix_result(prefix, info[1] if info else 0)
+            queue_card(card)
+        frontier.finish_harvested()
+
+        # Children are spawned while we wait, so loop until nothing is left
+        while tasks:
+            await asyncio.gather(*list(tasks))
+
+        await cards.join()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        while not harvest_sessions.empty():
+            await harvest_sessions.get_nowait().session.close()
+        await connector.close()
+        if extract_pool is not None:
+            extract_pool.shutdown()
+        writer.close()
+        frontier.close()
+
+    if seen is not None:
+        print(f"   Seen-RPPS index: {seen.changed} known doctors refetched because their card changed")
+    for res in results.values():
+        res.pop('remaining', None)
+
+    return list(results.values())
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark against the local mock site.
+
+Starts mock_annuaire.py (synthetic directory, configurable latency and
+error rate), then runs parallel_scraper.main() once per worker count, each
+in a fresh process with a fresh database, and reports:
+
+    doctors/s   doctors saved / wall time
+    requests/s  requests served by the mock / wall time
+    CPU         user + sys seconds of the scraper and all its workers
+    RSS         peak resident memory of the whole process tree (Linux),
+                and of the largest single process
+
+No network access needed, so runs are reproducible.
+
+--extractors times the detail tab extractors instead (bs4 and lxml backends
+of legacy/scraper/content_extractor.py) on the saved HTML fixtures of
+legacy/tests.
+
+Usage:
+    python benchmark.py --engine pipeline --workers 4 8 16 32 --doctors 5000 --latency 0.05
+    python benchmark.py --engine async --workers 50 100 300 --error-rate 0.01
+    python benchmark.py --extractors
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+
+import config
+import mock_annuaire
+
+
+# Worker-count setting of each engine
+WORKER_SETTINGS = {
+    'process': 'NUM_WORKERS',
+    'pipeline': 'DETAIL_WORKERS',
+    'async': 'ASYNC_DETAIL_CONCURRENCY',
+}
+
+
+def mock_stats(base_url):
+    with urllib.request.urlopen(f'{base_url}/__stats', timeout=5) as response:
+        return json.loads(response.read())
+
+
+def start_mock(args):
+    """Run the mock in its own process (it must not share our GIL), wait until it answers"""
+    process = mp.Process(target=mock_annuaire.serve, daemon=True,
+                         kwargs={'port': args.port, 'doctors': args.doctors, 'latency': args.latency,
+                                 'error_rate': args.error_rate, 'seed': args.seed,
+                                 'session_ttl': args.session_ttl})
+    process.start()
+
+    base_url = f'http://localhost:{args.port}'
+    for _ in range(100):
+        try:
+            mock_stats(base_url)
+            return process, base_url
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Mock server did not start on port {args.port}")
+
+
+def process_tree_rss(root_pid):
+    """(total RSS in MB, largest process RSS in MB, process count) of root_pid and its descendants"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total = largest = count = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                rss = next((int(line.split()[1]) for line in f if line.startswith('VmRSS:')), 0) / 1024
+        except OSError:
+            continue
+        total += rss
+        largest = max(largest, rss)
+        count += 1
+    return total, largest, count
+
+
+def run_once(args, base_url, workers, workdir):
+    """Run the scraper once with `workers`, return its measurements"""
+    settings = {
+        'BASE_URL': base_url,
+        'DATABASE_PATH': str(Path(workdir) / f'bench_{workers}.db'),
+        'LOGS_DIR': str(workdir),
+        'ENGINE': args.engine,
+        WORKER_SETTINGS[args.engine]: workers,
+        'HARVEST_WORKERS': args.harvest_workers,
+        'ASYNC_CONCURRENCY': args.harvest_workers,
+        'PREFIXES': list(args.prefixes),
+        'SMART_EXPANSION': True,
+        'MAX_DOCTORS_PER_PREFIX': 0,
+        'RESUME': False,
+        'ENABLE_FILE_LOGGING': False,
+        'TRACK_METRICS': False,
+    }
+    if args.rate_limit:
+        settings.update(RATE_LIMIT_INITIAL=args.rate_limit, RATE_LIMIT_MAX=args.rate_limit)
+    else:
+        # Unthrottled: measure the engine, not the politeness policy
+        settings.update(RATE_LIMIT_INITIAL=1e6, RATE_LIMIT_MIN=1e6, RATE_LIMIT_MAX=1e6, RATE_LIMIT_BURST=1e6)
+
+    log_path = Path(workdir) / f'bench_{workers}.log'
+    before_requests = mock_stats(base_url)['requests']
+    before_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    peak = {'total': 0, 'largest': 0, 'processes': 0}
+
+    start = time.time()
+    with open(log_path, 'w', encoding='utf-8') as log:
+        child = subprocess.Popen([sys.executable, __file__, '--child', json.dumps(settings)],
+                                 stdout=log, stderr=subprocess.STDOUT, cwd=Path(__file__).parent)
+
+        def sample():
+            while child.poll() is None:
+                total, largest, count = process_tree_rss(child.pid)
+                if total > peak['total']:
+                    peak.update(total=total, processes=count)
+                peak['largest'] = max(peak['largest'], largest)
+                time.sleep(0.5)
+
+        if sys.platform.startswith('linux'):
+            threading.Thread(target=sample, daemon=True).start()
+        returncode = child.wait()
+    elapsed = time.time() - start
+
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (usage.ru_utime - before_usage.ru_utime) + (usage.ru_stime - before_usage.ru_stime)
+    requests = mock_stats(base_url)['requests'] - before_requests
+    if not peak['largest']:
+        peak['largest'] = usage.ru_maxrss / 1024
+
+    doctors = complete = 0
+    if Path(settings['DATABASE_PATH']).exists():
+        conn = sqlite3.connect(settings['DATABASE_PATH'])
+        doctors, complete = conn.execute('''
+            SELECT COUNT(*), SUM(LENGTH(situation_data) > 10 AND LENGTH(dossier_data) > 10
+                                 AND LENGTH(diplomes_data) > 10 AND LENGTH(personne_data) > 10)
+            FROM professionals
+        ''').fetchone()
+        conn.close()
+
+    return {
+        'workers': workers,
+        'returncode': returncode,
+        'log': str(log_path),
+        'elapsed_seconds': elapsed,
+        'doctors': doctors,
+        'details_complete': complete or 0,
+        'requests': requests,
+        'doctors_per_second': doctors / elapsed if elapsed else 0,
+        'requests_per_second': requests / elapsed if elapsed else 0,
+        'cpu_seconds': cpu,
+        'cpu_percent': cpu / elapsed * 100 if elapsed else 0,
+        'peak_rss_mb': peak['total'],
+        'peak_processes': peak['processes'],
+        'max_process_rss_mb': peak['largest'],
+    }
+
+
+def time_extractor(extractor, html, backend, runs):
+    """Mean time of one extraction, in ms"""
+    start = time.perf_counter()
+    for _ in range(runs):
+        extractor(html, backend)
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def benchmark_extractors(runs):
+    """--extractors: bs4 vs lxml time of each tab extractor on every HTML fixture"""
+    from legacy.scraper.content_extractor import extract_generic_content, extract_diplomes_content
+
+    fixtures = sorted((Path(__file__).parent / 'legacy' / 'tests').glob('*.html'))
+    print("="*100)
+    print(f"EXTRACTOR BENCHMARK ({len(fixtures)} fixtures, {runs} runs each)")
+    print("="*100)
+    print(f"{'fixture':35} {'extractor':9} {'bytes':>6} {'bs4 ms':>8} {'lxml ms':>8}")
+    totals = {'bs4': 0.0, 'lxml': 0.0}
+    for path in fixtures:
+        html = path.read_text(encoding='utf-8')
+        for name, extractor in (('generic', extract_generic_content), ('diplomes', extract_diplomes_content)):
+            times = {backend: time_extractor(extractor, html, backend, runs) for backend in totals}
+            for backend, ms in times.items():
+                totals[backend] += ms
+            print(f"{path.name:35} {name:9} {len(extractor(html, 'lxml')):>6} "
+                  f"{times['bs4']:>8.1f} {times['lxml']:>8.1f}")
+    print(f"\nTotal: bs4 {totals['bs4']:.0f}ms, lxml {totals['lxml']:.0f}ms "
+          f"({totals['bs4'] / totals['lxml'] if totals['lxml'] else 0:.1f}x)")
+
+
+def run_child(settings):
+    """--child: apply the settings to config, then run the scraper"""
+    for name, value in settings.items():
+        setattr(config, name, value)
+
+    import parallel_scraper
+    parallel_scraper.main()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark parallel_scraper against the local mock site')
+    parser.add_argument('--engine', choices=sorted(WORKER_SETTINGS), default=config.ENGINE)
+    parser.add_argument('--workers', type=int, nargs='+', default=[4, 8, 16],
+                        help='worker counts to compare (detail workers/sessions for pipeline/async)')
+    parser.add_argument('--harvest-workers', type=int, default=config.HARVEST_WORKERS)
+    parser.add_argument('--prefixes', default='abcdefghijklmnopqrstuvwxyz', help='initial prefixes (one letter each)')
+    parser.add_argument('--doctors', type=int, default=2000, help='size of the synthetic directory')
+    parser.add_argument('--latency', type=float, default=0.02, help='mean mock response latency (seconds)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of mock responses that are 503')
+    parser.add_argument('--session-ttl', type=float, default=0.0,
+                        help='mock session lifetime in seconds, to exercise p_auth refreshes (default: never expire)')
+    parser.add_argument('--rate-limit', type=float, default=0,
+                        help='fixed global rate limit in req/s (default: unthrottled)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--extractors', action='store_true',
+                        help='time the bs4 and lxml tab extractors on the HTML fixtures instead')
+    parser.add_argument('--runs', type=int, default=5, help='extractions per fixture with --extractors')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(json.loads(args.child))
+        return
+    if args.extractors:
+        benchmark_extractors(args.runs)
+        return
+
+    print("="*100)
+    print(f"BENCHMARK - engine {args.engine}, {args.doctors} doctors, latency {args.latency}s, "
+          f"error rate {args.error_rate:.1%}, rate limit {args.rate_limit or 'none'}")
+    print("="*100)
+
+    mock, base_url = start_mock(args)
+    results = []
+    try:
+        with tempfile.TemporaryDirectory(prefix='bench_') as workdir:
+            for workers in args.workers:
+                print(f"\n▶ {workers} workers...", flush=True)
+                result = run_once(args, base_url, workers, workdir)
+                results.append(result)
+                if result['returncode']:
+                    print(f"  ✗ scraper exited with {result['returncode']}, last lines of its log:")
+                    print(''.join(Path(result['log']).read_text(encoding='utf-8').splitlines(True)[-15:]))
+                print(f"  {result['doctors']} doctors in {result['elapsed_seconds']:.1f}s")
+    finally:
+        mock.terminate()
+
+    print(f"\n{'workers':>8} {'doctors':>8} {'complete':>8} {'time s':>8} {'doc/s':>8} {'req/s':>8} "
+          f"{'CPU s':>8} {'CPU %':>7} {'RSS MB':>8} {'max proc':>9}")
+    for r in results:
+        print(f"{r['workers']:>8} {r['doctors']:>8} {r['details_complete']:>8} {r['elapsed_seconds']:>8.1f} "
+              f"{r['doctors_per_second']:>8.1f} {r['requests_per_second']:>8.1f} {r['cpu_seconds']:>8.1f} "
+              f"{r['cpu_percent']:>7.0f} {r['peak_rss_mb']:>8.0f} {r['max_process_rss_mb']:>9.0f}")
+
+    Path(config.LOGS_DIR).mkdir(exist_ok=True)
+    output = Path(config.LOGS_DIR) / f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{args.engine}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'timestamp': datetime.now().isoformat(), 'settings': vars(args), 'results': results}, f, indent=2)
+    print(f"\nResults saved to: {output}")
+
+
+if __name__ == '__main__':
+    main()
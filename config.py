@@ -12,6 +12,36 @@ QUICK START:
 See TESTING_GUIDE.md for detailed testing methodology
 """
 
+# ============================================================================
+# ENGINE
+# ============================================================================
+
+# Scraping engine
+#   'process'  → one OS process per prefix doing everything (NUM_WORKERS processes)
+#   'pipeline' → two process pools: HARVEST_WORKERS do search + pagination only,
+#                DETAIL_WORKERS fetch the detail tabs of every harvested doctor
+#   'async'    → one asyncio event loop, same two stages with ASYNC_CONCURRENCY
+#                harvest sessions and ASYNC_DETAIL_CONCURRENCY detail sessions
+#                (each with its own cookie jar and p_auth). Requires aiohttp.
+ENGINE = 'process'
+
+# Pipeline stage sizes (ENGINE = 'pipeline')
+# Harvesting is cheap (~10 requests per prefix), details are ~5 requests per doctor
+HARVEST_WORKERS = 4
+DETAIL_WORKERS = 30
+
+# Sessions in flight at once when ENGINE = 'async'
+# Sessions are mostly idle (sleeps, socket waits), so these can be 10x the process counts
+ASYNC_CONCURRENCY = 40
+ASYNC_DETAIL_CONCURRENCY = 300
+
+# Extract the detail tabs (BeautifulSoup, CPU-bound) in a separate pool of
+# EXTRACT_WORKERS processes instead of in the worker that fetched them, so
+# fetching workers go straight back to the network (pipeline and async engines)
+# 0 = one process per CPU core
+OFFLOAD_EXTRACTION = True
+EXTRACT_WORKERS = 0
+
 # ============================================================================
 # WORKER CONFIGURATION
 # ============================================================================
@@ -62,6 +92,28 @@ else:
 # Example: If 'a' gets 100 results (10 pages), expands to 'aa', 'ab', ..., 'az'
 SMART_EXPANSION = True  # Set to True for 100% coverage
 
+# Predictive expansion: the first results page shows the total number of results,
+# a prefix with more than the site can list (100) is expanded right away,
+# without paginating through its 10 pages
+PREDICTIVE_EXPANSION = True
+
+# Skip children whose last two letters never occur in the names already in the
+# database ('qx', 'zq', ...), learned as a letter-bigram model of those names.
+# Only once the database holds EXPANSION_MODEL_MIN_NAMES names; pruned children
+# are kept in the frontier (state 'pruned') and are harvested again on a resumed
+# run with PRUNE_EXPANSION = False
+PRUNE_EXPANSION = True
+EXPANSION_MODEL_MIN_NAMES = 5000
+EXPANSION_MIN_BIGRAM_COUNT = 1
+
+# Harvest the pending prefixes with the most expected new doctors first
+# (parent's results count × share of its names continuing with the prefix's
+# letter, learned from the database × parent's fraction of new doctors).
+# Initial prefixes are scored by their estimated share of the directory, from
+# the names already saved. Coverage grows fastest early on; every prefix is
+# still harvested
+PRIORITIZE_FRONTIER = True
+
 # Maximum number of doctors to scrape per prefix (0 = unlimited)
 # Useful for quick tests
 MAX_DOCTORS_PER_PREFIX = 0
@@ -69,24 +121,96 @@ MAX_DOCTORS_PER_PREFIX = 0
 # Maximum pages to paginate through (website limit is ~10)
 MAX_PAGES = 10
 
+# Results page parser: 'auto' (lxml if installed), 'lxml' or 'bs4'
+CARD_PARSER = 'auto'
+
+# ============================================================================
+# DEDUPLICATION
+# ============================================================================
+
+# Skip the detail requests of doctors already in the database with all 4 tabs
+# Prefixes overlap a lot ('ma', 'mar', 'mart', ...), most cards are repeats
+SKIP_SEEN_DOCTORS = True
+
+# Freshness: re-fetch a known doctor if its record is older than this (days)
+# 0 = a complete record never expires
+SEEN_MAX_AGE_DAYS = 30
+
+# Refresh mode (or `python parallel_scraper.py --refresh`): walk the search
+# results again (cheap) and fetch details only for new doctors, doctors whose
+# card changed (name, profession, address, phone, email vs the fingerprint
+# stored with the row) and records older than SEEN_MAX_AGE_DAYS.
+# Turns SKIP_SEEN_DOCTORS on; a finished crawl is started over, an interrupted
+# refresh resumes
+REFRESH = False
+
+# ============================================================================
+# CHECKPOINT / RESUME
+# ============================================================================
+
+# The prefix frontier and pending detail work are saved in the database
+# True  = a restarted run continues where the previous one stopped
+# False = forget the saved frontier and start from PREFIXES again
+RESUME = True
+
+# Stop retrying a prefix after this many failed harvest attempts (across restarts)
+MAX_PREFIX_ATTEMPTS = 3
+
 # ============================================================================
-# TIMING & DELAYS
+# RATE LIMITING
 # ============================================================================
 
-# Delay between scraping individual doctors (seconds)
+# ONE request budget shared by all workers (requests/second, whole scraper)
+# Adaptive (AIMD): grows while responses are fast and OK, is cut on 429/403/5xx/timeouts
 # CRITICAL: Too fast will trigger anti-scraping
-# Recommended: 0.5 - 2.0 seconds
-DELAY_BETWEEN_DOCTORS = 1.0
+RATE_LIMIT_INITIAL = 10.0
+RATE_LIMIT_MIN = 1.0
+RATE_LIMIT_MAX = 60.0
+
+# Requests that can go out back-to-back after an idle moment
+RATE_LIMIT_BURST = 5
+
+# Additive increase: req/s gained per second of healthy responses
+RATE_LIMIT_INCREASE = 0.5
+
+# Multiplicative decrease: rate factor applied on 429/403/5xx/timeouts
+RATE_LIMIT_DECREASE = 0.5
 
-# Delay between detail tab requests (seconds)
-DELAY_BETWEEN_TABS = 0.5
+# Responses slower than this (seconds) stop the increase
+RATE_LIMIT_LATENCY_TARGET = 2.0
 
-# Delay between pagination requests (seconds)
-DELAY_BETWEEN_PAGES = 0.2
+# Retries per request on timeouts, connection errors, 429/403/5xx
+# Backoff before retry n: random(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2^(n-1))) seconds
+RETRY_ATTEMPTS = 4
+RETRY_BACKOFF_BASE = 1.0
+RETRY_BACKOFF_MAX = 30.0
 
 # Request timeout (seconds)
 REQUEST_TIMEOUT = 30
 
+# Site to scrape (point at mock_annuaire.py, e.g. 'http://localhost:8765', for offline runs)
+BASE_URL = 'https://annuaire.sante.fr'
+
+# ============================================================================
+# TRANSPORT
+# ============================================================================
+
+# HTTP client of the worker sessions (process and pipeline engines, see transport.py)
+#   'requests' → HTTP/1.1 keep-alive
+#   'httpx'    → HTTP/2 multiplexing when the server negotiates it (https only),
+#                HTTP/1.1 keep-alive otherwise. Requires httpx[http2], falls
+#                back to 'requests' when it is not installed
+# The async engine always uses aiohttp (HTTP/1.1)
+TRANSPORT = 'requests'
+
+# Keep-alive connections kept per host by each worker session
+# A worker sends one request at a time, so 1-2 is enough
+HTTP_POOL_SIZE = 2
+
+# Seconds an idle keep-alive connection stays open (httpx and aiohttp;
+# requests keeps them until the server closes them)
+HTTP_KEEPALIVE_EXPIRY = 30.0
+
 # ============================================================================
 # DATABASE
 # ============================================================================
@@ -97,6 +221,35 @@ DATABASE_PATH = 'db/health_professionals.db'
 # Higher = better for high concurrency
 DB_TIMEOUT = 30.0
 
+# Every engine saves doctors through ONE writer thread (scheduler process), in batches
+# A batch is committed when it has DB_BATCH_SIZE doctors or after DB_FLUSH_INTERVAL seconds
+DB_BATCH_SIZE = 50
+DB_FLUSH_INTERVAL = 1.0
+
+# SQLite page size for a NEW database (bytes)
+DB_PAGE_SIZE = 8192
+
+# Storage encoding of the 4 detail JSON columns (see detail_codec.py)
+#   'pretty' → indented JSON, as the extractors return it
+#   'json'   → minified JSON
+#   'zstd'   → minified JSON compressed with a dictionary of the site's section
+#              and label names (BLOB, smallest; requires zstandard)
+# Readers decode all three, a database can mix them
+DETAIL_ENCODING = 'json'
+
+# Also store the detail tabs in indexed child tables (practice_situations,
+# diplomas, authorizations, attributes), queryable in SQL without json.loads,
+# see detail_tables.py
+NORMALIZE_DETAILS = True
+
+# Keep the raw HTML of every detail tab, zstd-compressed in RESPONSE_STORE_DIR
+# (one file per distinct page, indexed by rpps + tab in the responses table),
+# so `python parallel_scraper.py --reextract` can re-run the extractors after
+# a fix without requesting anything again. Requires zstandard
+STORE_RESPONSES = False
+RESPONSE_STORE_DIR = 'db/responses'
+RESPONSE_STORE_LEVEL = 3
+
 # ============================================================================
 # LOGGING
 # ============================================================================
@@ -113,6 +266,21 @@ LOG_LEVEL = 'INFO'
 # Save failed doctors for retry
 SAVE_FAILED_DOCTORS = True
 
+# Progress telemetry (see telemetry.py): every process sends its counters at
+# most every TELEMETRY_INTERVAL seconds, the main process logs one progress
+# line (totals, rates, prefixes in flight) every TELEMETRY_RENDER_INTERVAL seconds
+TELEMETRY_INTERVAL = 0.5
+TELEMETRY_RENDER_INTERVAL = 5.0
+# Prefixes listed on a progress line at most
+TELEMETRY_MAX_PREFIXES = 8
+
+# Live metrics in the Prometheus text format on http://METRICS_HOST:METRICS_PORT/metrics
+# for the whole run: requests by endpoint and status, latency, bytes, extraction
+# and DB write times, queue depths, worker utilization (see metrics.py)
+# 0 = no endpoint
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9464
+
 # ============================================================================
 # PERFORMANCE TESTING
 # ============================================================================
@@ -124,3 +292,11 @@ AUTO_LOG_FILENAME = True
 # Track detailed metrics for performance analysis
 TRACK_METRICS = True
 
+# Time every stage of every doctor (parse, rate-limit sleeps, each detail
+# request, extraction, DB save; wall and CPU) and write a profile report,
+# percentiles per stage and a stacked breakdown, next to the metrics JSON
+# (profile_*.json in LOGS_DIR, see profiler.py). Adds a few clock reads per request
+PROFILE_STAGES = False
+# Per-doctor times kept for the percentiles (uniform sample), per stage
+PROFILE_SAMPLE_SIZE = 10000
+
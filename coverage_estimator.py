@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Coverage estimator: how close is a run to the full directory?
+
+Reads the frontier tables (see frontier.py) and answers, without touching
+the site:
+
+    prefix trie   which prefixes were capped (expanded), exhausted (their
+                  whole result list was seen), are still pending, failed,
+                  or were pruned by the expansion planner
+    size          estimated number of doctors in the directory, from the
+                  trie: the results count the site showed for capped
+                  prefixes, the cards of exhausted ones, and for pending
+                  prefixes their share of what their parent has left
+    capture-      second estimate from the overlap between prefixes: a
+    recapture     doctor listed by unrelated prefixes (different branches,
+                  e.g. surname and first name) is a recapture. Chao's Mh
+                  estimator on those capture counts. Needs overlaps, so
+                  n/a when the site only matches surnames.
+    ETA           remaining doctors / rate of new doctors in the last window
+
+Per top-level branch it also shows what is left, to see where more workers
+would still find new doctors.
+
+Usage:
+    python coverage_estimator.py                 report
+    python coverage_estimator.py --tree ma       trie under 'ma' (2 levels)
+    python coverage_estimator.py --json          report as JSON
+"""
+
+import argparse
+import json
+import sqlite3
+from collections import defaultdict
+
+import config
+
+
+# Seconds of history used for the new-doctor rate of the ETA
+RATE_WINDOW = 600
+
+# Frontier states that mean "harvested"
+HARVESTED = ('harvested', 'done')
+
+
+def load_trie(conn):
+    """{prefix: {'parent', 'state', 'total_cards', 'total_results', 'children'}} from the frontier table"""
+    nodes = {}
+    for prefix, parent, state, total_cards, total_results in conn.execute(
+            'SELECT prefix, parent, state, total_cards, total_results FROM frontier'):
+        nodes[prefix] = {'parent': parent, 'state': state, 'total_cards': total_cards,
+                         'total_results': total_results, 'children': []}
+    for prefix, node in nodes.items():
+        if node['parent'] in nodes:
+            nodes[node['parent']]['children'].append(prefix)
+    return nodes
+
+
+def classify(node):
+    """capped / exhausted / pending / failed / pruned"""
+    state = node['state']
+    if state == 'pruned':
+        return 'pruned'
+    if state == 'failed':
+        return 'failed'
+    if state not in HARVESTED:
+        return 'pending'
+    if node['children'] or (node['total_results'] or 0) > config.MAX_PAGES * 10:
+        return 'capped'
+    return 'exhausted'
+
+
+def estimate_sizes(nodes):
+    """
+    Estimated result-set size of every prefix of the trie ({prefix: size}).
+    Harvested: the site's count, else the cards seen (exhausted) or the sum of
+    its children (capped). Pending: an equal share of what its parent has
+    left, or the mean of its harvested siblings when the parent has no count.
+    """
+    sizes = {}
+
+    def size_of(prefix):
+        node = nodes[prefix]
+        if node['state'] == 'pruned':
+            sizes[prefix] = 0
+            return 0
+
+        children = [child for child in node['children'] if nodes[child]['state'] != 'pruned']
+        known = {child: size_of(child) for child in children if nodes[child]['state'] in HARVESTED}
+        unknown = [child for child in children if child not in known]
+
+        if node['total_results'] is not None:
+            total = node['total_results']
+            share = max(0, total - sum(known.values())) / len(unknown) if unknown else 0
+        else:
+            share = sum(known.values()) / len(known) if known else (node['total_cards'] or 0) / max(1, len(children))
+            total = max(node['total_cards'] or 0, sum(known.values()) + share * len(unknown))
+
+        for child in unknown:
+            sizes[child] = share
+            # Pending subtrees below (resumed runs) get their part of the share
+            fill_pending(child, share)
+
+        sizes[prefix] = total
+        return total
+
+    def fill_pending(prefix, size):
+        children = [child for child in nodes[prefix]['children'] if nodes[child]['state'] != 'pruned']
+        for child in children:
+            sizes[child] = size / len(children)
+            fill_pending(child, sizes[child])
+
+    roots = [prefix for prefix, node in nodes.items() if node['parent'] not in nodes]
+    harvested_roots = [size_of(prefix) for prefix in roots if nodes[prefix]['state'] in HARVESTED]
+    mean_root = sum(harvested_roots) / len(harvested_roots) if harvested_roots else 0
+    for prefix in roots:
+        if nodes[prefix]['state'] not in HARVESTED:
+            sizes[prefix] = 0 if nodes[prefix]['state'] == 'pruned' else mean_root
+            fill_pending(prefix, sizes[prefix])
+
+    return sizes, roots
+
+
+def independent_captures(prefixes):
+    """Number of unrelated prefixes in a capture history (ancestors of another capture don't count)"""
+    prefixes = sorted(prefixes)
+    leaves = [prefix for i, prefix in enumerate(prefixes)
+              if not (i + 1 < len(prefixes) and prefixes[i + 1].startswith(prefix))]
+    return len(leaves)
+
+
+def capture_recapture(conn):
+    """
+    Chao (Mh) estimate of the directory size from the capture histories:
+    S_obs + (t-1)/t * f1(f1-1) / (2(f2+1)), with f1/f2 the doctors listed by
+    exactly one/two unrelated prefixes and t the most captures of a doctor
+    (the number of capture occasions, at least 2).
+    None without recaptures (f2 = 0).
+    """
+    counts = defaultdict(int)
+    rows = conn.execute("SELECT rpps, GROUP_CONCAT(prefix, ' ') FROM captures GROUP BY rpps")
+    for _, prefixes in rows:
+        counts[independent_captures(prefixes.split(' '))] += 1
+
+    observed = sum(counts.values())
+    f1, f2 = counts.get(1, 0), counts.get(2, 0)
+    if not observed or not f2:
+        return None, f1, f2
+    occasions = max(2, max(counts))
+    return round(observed + (occasions - 1) / occasions * f1 * (f1 - 1) / (2 * (f2 + 1))), f1, f2
+
+
+def saved_doctors(conn):
+    """Doctors in professionals: the running count of scrape_stats.py, COUNT(*) on older databases"""
+    try:
+        row = conn.execute('SELECT doctors FROM scrape_stats').fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    return row[0] if row else conn.execute('SELECT COUNT(*) FROM professionals').fetchone()[0]
+
+
+def coverage_report(db_path=None, conn=None, captures=True):
+    """
+    Coverage of the run in the database, as a dict (see print_report).
+    captures=False skips everything that reads the capture history (listed
+    doctors, capture-recapture, per-branch listing), whose cost grows with
+    the database: coverage is then saved doctors / trie estimate, from the
+    frontier and scrape_stats only (monitor_parallel.py).
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(f'file:{db_path or config.DATABASE_PATH}?mode=ro', uri=True,
+                               timeout=config.DB_TIMEOUT)
+    try:
+        nodes = load_trie(conn)
+        sizes, roots = estimate_sizes(nodes)
+
+        states = defaultdict(int)
+        for node in nodes.values():
+            states[classify(node)] += 1
+
+        saved = saved_doctors(conn)
+        new_recently = conn.execute("SELECT COUNT(*) FROM professionals WHERE created_at >= datetime('now', ?)",
+                                    (f'-{RATE_WINDOW} seconds',)).fetchone()[0]
+        listed, cr_estimate, f1, f2 = None, None, 0, 0
+        if captures:
+            listed = conn.execute('SELECT COUNT(DISTINCT rpps) FROM captures').fetchone()[0]
+            cr_estimate, f1, f2 = capture_recapture(conn)
+
+        # Listed doctors per top-level branch
+        branch_listed = defaultdict(int)
+        if captures and roots:
+            lengths = sorted({len(root) for root in roots})
+            for length in lengths:
+                for head, count in conn.execute(
+                        'SELECT head, COUNT(DISTINCT rpps) FROM (SELECT SUBSTR(prefix, 1, ?) AS head, rpps FROM captures) '
+                        'GROUP BY head', (length,)):
+                    branch_listed[head] += count
+    finally:
+        if own_conn:
+            conn.close()
+
+    trie_estimate = round(sum(sizes[root] for root in roots)) if roots else None
+    estimate = trie_estimate or cr_estimate
+    found = listed if captures else saved
+    remaining = max(0, estimate - found) if estimate else None
+    rate = new_recently / RATE_WINDOW
+
+    branches = []
+    for root in roots if captures else ():
+        subtree = [prefix for prefix in nodes if prefix.startswith(root)]
+        branch_estimate = round(sizes.get(root, 0))
+        branches.append({
+            'prefix': root,
+            'estimate': branch_estimate,
+            'listed': branch_listed.get(root, 0),
+            'remaining': max(0, branch_estimate - branch_listed.get(root, 0)),
+            'pending_prefixes': sum(1 for prefix in subtree if classify(nodes[prefix]) in ('pending', 'failed')),
+        })
+    branches.sort(key=lambda branch: branch['remaining'], reverse=True)
+
+    return {
+        'prefixes': dict(states),
+        'listed': listed,
+        'saved': saved,
+        'estimate_trie': trie_estimate,
+        'estimate_capture_recapture': cr_estimate,
+        'recaptures': {'f1': f1, 'f2': f2},
+        'estimate': estimate,
+        'remaining': remaining,
+        'coverage': min(1.0, found / estimate) if estimate else None,
+        'new_doctors_per_second': rate,
+        'eta_seconds': remaining / rate if remaining is not None and rate else None,
+        'branches': branches,
+    }
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return 'n/a'
+    hours, rest = divmod(int(seconds), 3600)
+    return f"{hours}h{rest // 60:02d}m" if hours else f"{rest // 60}m{rest % 60:02d}s"
+
+
+def print_report(report, top=10):
+    prefixes = report['prefixes']
+    print("="*80)
+    print(" "*28 + "COVERAGE REPORT")
+    print("="*80)
+    print(f"Prefixes: {prefixes.get('capped', 0)} capped, {prefixes.get('exhausted', 0)} exhausted, "
+          f"{prefixes.get('pending', 0)} pending, {prefixes.get('failed', 0)} failed, {prefixes.get('pruned', 0)} pruned")
+    print(f"Doctors listed: {report['listed']}   saved: {report['saved']}")
+
+    cr = report['estimate_capture_recapture']
+    print(f"Estimated directory size: {report['estimate_trie'] or 'n/a'} (prefix trie), "
+          f"{cr or 'n/a'} (capture-recapture, f1={report['recaptures']['f1']} f2={report['recaptures']['f2']})")
+    if report['coverage'] is not None:
+        print(f"Coverage: {report['coverage']:.1%} - about {report['remaining']} doctors left")
+    print(f"New doctors: {report['new_doctors_per_second'] * 60:.1f}/min → ETA {format_duration(report['eta_seconds'])}")
+
+    if report['branches']:
+        print(f"\n{'Branch':<8} {'Estimate':>9} {'Listed':>8} {'Left':>8} {'Pending':>8}")
+        print("-"*45)
+        for branch in report['branches'][:top]:
+            print(f"{branch['prefix']:<8} {branch['estimate']:>9} {branch['listed']:>8} "
+                  f"{branch['remaining']:>8} {branch['pending_prefixes']:>8}")
+
+
+def print_tree(db_path, prefix, depth=2):
+    """Trie below a prefix: state, results count and cards of every node"""
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, timeout=config.DB_TIMEOUT)
+    nodes = load_trie(conn)
+    conn.close()
+    sizes, _ = estimate_sizes(nodes)
+
+    def show(node_prefix, level):
+        node = nodes[node_prefix]
+        results = node['total_results'] if node['total_results'] is not None else '?'
+        print(f"{'  ' * level}{node_prefix:<12} {classify(node):<10} results {results:<6} "
+              f"cards {node['total_cards'] or 0:<4} est. {sizes.get(node_prefix, 0):.0f}")
+        if level < depth:
+            for child in sorted(node['children']):
+                show(child, level + 1)
+
+    if prefix not in nodes:
+        print(f"Prefix '{prefix}' is not in the frontier")
+        return
+    show(prefix, 0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Coverage of the prefix tree')
+    parser.add_argument('--db', default=config.DATABASE_PATH)
+    parser.add_argument('--tree', metavar='PREFIX', help='show the trie below PREFIX')
+    parser.add_argument('--depth', type=int, default=2, help='levels shown with --tree')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    if args.tree:
+        print_tree(args.db, args.tree, args.depth)
+    elif args.json:
+        print(json.dumps(coverage_report(args.db), indent=2))
+    else:
+        print_report(coverage_report(args.db))
@@ -0,0 +1,144 @@
+"""
+Single-writer, batched persistence for scraped doctors.
+
+save_doctor opens a connection, SELECTs, upserts and commits for every
+doctor, from every worker process at once: each row costs an fsync and the
+workers fight over the write lock ("database is locked" stalls bounded only
+by DB_TIMEOUT). Here one thread in the scheduler process owns the only
+write connection; doctors arrive over a queue and are committed in batches:
+
+    - one transaction per batch (up to DB_BATCH_SIZE doctors, or whatever
+      arrived within DB_FLUSH_INTERVAL seconds)
+    - duplicate status of the whole batch in one SELECT ... IN (...), then
+      one executemany upsert (Python's executemany cannot return rows, so
+      this replaces a per-row INSERT ... RETURNING); an RPPS saved twice in
+      one batch is a duplicate the second time
+    - WAL journal with synchronous=NORMAL: no fsync per commit, readers
+      (monitor_parallel.py) never block the writer
+
+Used by every engine and by --replay-failed: the pipeline and async
+engines save the records their detail stage returns, the process engine's
+workers hand theirs to smart_scrape over its events queue.
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+
+import config
+import telemetry
+import profiler
+from parallel_scraper import UPSERT_DOCTOR_SQL, doctor_row
+from retries import record_failures
+from response_store import record_responses
+from detail_tables import record_details
+
+
+class DbWriter(threading.Thread):
+    """
+    Writer thread. Call save(data, on_saved) from any thread;
+    on_saved(is_duplicate, error) is called from the writer thread once
+    the batch holding the doctor is committed (error is None on success).
+    Every on_saved is called, whatever goes wrong with its batch.
+    """
+
+    def __init__(self, db_path=None, batch_size=None, flush_interval=None):
+        super().__init__(name='DbWriter', daemon=True)
+        self.db_path = db_path or config.DATABASE_PATH
+        self.batch_size = batch_size or config.DB_BATCH_SIZE
+        self.flush_interval = config.DB_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.rows = 0
+
+    def save(self, data, on_saved=None):
+        self.queue.put((data, on_saved))
+
+    def close(self):
+        """Flush everything queued so far and stop the thread"""
+        self.queue.put(None)
+        self.join()
+
+    def run(self):
+        conn = sqlite3.connect(self.db_path, timeout=config.DB_TIMEOUT)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+
+        stop = False
+        while not stop:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            # Collect a batch: up to batch_size, or what arrives before the deadline
+            batch = [item]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=max(0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            try:
+                self.write_batch(conn, batch)
+            except Exception as e:
+                # Callbacks already ran; keep the thread alive for the next batches
+                print(f"    DB WRITER: bookkeeping of a batch of {len(batch)} failed ({e!r})")
+
+        conn.close()
+
+    def write_batch(self, conn, batch):
+        existing = set()
+        error = None
+
+        for attempt in range(3):
+            start = profiler.clock()
+            try:
+                with conn:
+                    rpps_list = [data['rpps'] for data, _ in batch]
+                    existing = {rpps for (rpps,) in conn.execute(
+                        f"SELECT rpps FROM professionals WHERE rpps IN ({', '.join('?' * len(rpps_list))})",
+                        rpps_list
+                    )}
+                    conn.executemany(UPSERT_DOCTOR_SQL, [doctor_row(data) for data, _ in batch])
+                    record_failures(conn, [data for data, _ in batch])
+                    record_responses(conn, [data for data, _ in batch])
+                    record_details(conn, [data for data, _ in batch])
+                wall, cpu = time.perf_counter() - start[0], time.thread_time() - start[1]
+                telemetry.reporter().observe('scraper_db_write_seconds', wall)
+                error = None
+                break
+            except sqlite3.Error as e:
+                error = str(e)
+                print(f"    DB WRITER: batch of {len(batch)} failed ({e}), attempt {attempt + 1}/3")
+                time.sleep(1)
+            except Exception as e:
+                # Malformed record or the like: another attempt would fail the same way
+                error = repr(e)
+                print(f"    DB WRITER: batch of {len(batch)} failed ({e!r})")
+                break
+
+        try:
+            if error is None:
+                self.batches += 1
+                self.rows += len(batch)
+                telemetry.reporter().count('scraper_db_rows_total', len(batch))
+                for data, _ in batch:
+                    profiler.finish(data, wall / len(batch), cpu / len(batch))
+        finally:
+            # The scheduler waits for every doctor it handed over
+            in_batch = set()
+            for data, on_saved in batch:
+                rpps = data.get('rpps')
+                is_duplicate = error is None and (rpps in existing or rpps in in_batch)
+                in_batch.add(rpps)
+                if on_saved:
+                    try:
+                        on_saved(is_duplicate, error)
+                    except Exception as e:
+                        print(f"    DB WRITER: on_saved callback failed ({e!r})")
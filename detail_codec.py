@@ -0,0 +1,104 @@
+"""
+Storage encoding of the four detail JSON columns.
+
+The extractors return indented JSON and it used to be stored verbatim, so a
+large part of the database was whitespace and the same French section and
+label names repeated in every row. DETAIL_ENCODING picks what doctor_row
+writes:
+
+    'pretty'  the extractor output as is
+    'json'    minified JSON (TEXT)
+    'zstd'    minified JSON compressed with zstd and DICTIONARY_V1, a
+              dictionary of the section and label names of the four tabs
+              (BLOB: ZSTD_HEADER + zstd frame, requires zstandard)
+
+Every reader goes through decode_tab / load_tab, which accept all three,
+so a database written with different settings over time reads fine.
+Empty and near-empty tabs (10 bytes or less) are always kept as text, so
+`LENGTH(column) > 10` still tells a fetched tab from a missing one.
+"""
+
+import json
+
+import config
+
+
+TAB_COLUMNS = ('situation_data', 'dossier_data', 'diplomes_data', 'personne_data')
+
+# Header of a value compressed with DICTIONARY_V1
+ZSTD_HEADER = b'zd\x01'
+ZSTD_LEVEL = 9
+
+# Raw-content zstd dictionary: minified skeletons of the four tabs with their
+# most common values. Stored values need it byte for byte to decode, so it
+# must never change; add a DICTIONARY_V2 with its own header instead.
+DICTIONARY_V1 = ''.join([
+    '{"ACTIVITÉ":{"Genre d\'activité":"Activité standard de soin ou de pharmacien","Mode d\'exercice ":"",'
+    '"Fonction":""},"STRUCTURE D\'EXERCICE":{"Raison sociale":"","Numéro SIRET":"","Numéro  SIREN":"",'
+    '"Numéro FINESS Etablissement":"","Numéro  FINESS EJ":"","Code NAF":"","Secteur d\'activité":"",'
+    '"Adresse de la structure":"","Téléphone":"","Télécopie":"","Adresse e-mail":""},'
+    '"SITUATION DU PRATICIEN HOSPITALIER":{},"POSITION STATUTAIRE":{},"ATTRIBUTION PARTICULIÈRE":{}}',
+    '{"EXERCICE PROFESSIONNEL":{"Identifiant RPPS":"","Nom d\'exercice":"","Profession":"","Prénom d\'exercice":"",'
+    '"Catégorie du PS":"Civil"},"SAVOIR-FAIRE":{},"RÉFÉRENCEMENT AUPRÈS DE L\'AUTORITÉ D\'ENREGISTREMENT":{},'
+    '"PREMIÈRE INSCRIPTION":{},"INSCRIPTIONS":{},"CARTES CPS":{},"SANCTIONS":{},"ADELI":{}}',
+    '{"diplomes":[{"Code":"","Type":"Diplôme d\'État français","Numéro":"","Libellé":"","Lieud\'obtention":"",'
+    '"Paysd\'obtention":"","Dated\'obtention":"","Validation par le guichet principal":""}],'
+    '"autres_diplomes":[{"Code":"","Type":"Autre type de diplôme","Numéro":"","Libellé":"","Lieud\'obtention":"",'
+    '"Paysd\'obtention":"","Dated\'obtention":"","Validation par le guichet principal":""}],'
+    '"autorisations":[{"Profession":"","Discipline":"","Type":"","Lieu":"","Date d\'effet":"","Date de fin":""}]}',
+    '{"INFORMATIONS GÉNÉRALES":{"Civilité ":"Madame"},"ÉTAT-CIVIL":{"Civilité ":"Monsieur"},'
+    '"COORDONNÉES DE CORRESPONDANCE":{"Civilité ":"Docteur"},"LANGUES PARLÉES":{}}',
+    '"Salarié","Libéral","Salarié en poste fixe","Titulaire de cabinet","Médecin","Pharmacien",'
+    '"Infirmier","Chirurgien-dentiste","Masseur-kinésithérapeute","Sage-femme","Assistant dentaire"',
+]).encode('utf-8')
+
+_compressor = None
+_decompressor = None
+
+
+def _zstd():
+    """(compressor, decompressor) with DICTIONARY_V1, created once per process"""
+    global _compressor, _decompressor
+    if _compressor is None:
+        import zstandard
+        dictionary = zstandard.ZstdCompressionDict(DICTIONARY_V1, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+        _compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary,
+                                               write_checksum=False, write_dict_id=False)
+        _decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+    return _compressor, _decompressor
+
+
+def encode_tab(value, encoding=None):
+    """Storage form of an extracted tab (JSON text) under DETAIL_ENCODING"""
+    encoding = encoding or config.DETAIL_ENCODING
+    if encoding == 'pretty' or not isinstance(value, str) or len(value) <= 10:
+        return value
+    try:
+        compact = json.dumps(json.loads(value), ensure_ascii=False, separators=(',', ':'))
+    except ValueError:
+        return value
+    if len(compact) <= 10:
+        return value
+    if encoding == 'zstd':
+        return ZSTD_HEADER + _zstd()[0].compress(compact.encode('utf-8'))
+    return compact
+
+
+def decode_tab(value):
+    """JSON text of a stored tab, whatever its encoding (None stays None)"""
+    if isinstance(value, bytes):
+        if value.startswith(ZSTD_HEADER):
+            return _zstd()[1].decompress(value[len(ZSTD_HEADER):]).decode('utf-8')
+        return value.decode('utf-8')
+    return value
+
+
+def load_tab(value):
+    """Parsed content of a stored tab, {} if missing or unreadable"""
+    text = decode_tab(value)
+    if not text:
+        return {}
+    try:
+        return json.loads(text)
+    except ValueError:
+        return {}
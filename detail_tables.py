@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Normalized child tables of the detail tabs.
+
+professionals keeps each tab as one JSON document, so every analytical
+query had to json.loads every row in Python. With NORMALIZE_DETAILS the
+writer (DbWriter / save_doctor) also spreads each saved tab over indexed
+tables keyed by rpps, in the same transaction:
+
+    practice_situations  one row per doctor from the situation tab
+                         (activity, structure, SIRET, FINESS, ...) and the
+                         département of the doctor's address
+    diplomas             diplomas and other diplomas (kind 'diplome'/'autre')
+    authorizations       ministerial authorizations
+    attributes           every label/value pair (and table cell) of the
+                         situation, dossier and personne tabs
+
+A tab's rows are replaced only when the tab itself was saved, so a doctor
+saved with a failed tab keeps its previous rows. For example, every doctor
+with a given diploma in a département:
+
+    SELECT s.rpps FROM diplomas d JOIN practice_situations s USING (rpps)
+    WHERE d.code = 'DIP319' AND s.departement = '71'
+
+`python detail_tables.py` (re)builds the tables from the JSON columns of an
+existing database.
+"""
+
+import json
+import re
+import sqlite3
+import time
+import unicodedata
+
+import config
+from detail_codec import decode_tab
+
+
+# Normalized label (see label_key) → column, per table
+SITUATION_COLUMNS = {
+    'genredactivite': 'activity',
+    'modedexercice': 'practice_mode',
+    'fonction': 'function',
+    'raisonsociale': 'structure',
+    'numerosiret': 'siret',
+    'numerosiren': 'siren',
+    'numerofinessetablissement': 'finess',
+    'numerofinessej': 'finess_ej',
+    'codenaf': 'naf',
+    'secteurdactivite': 'sector',
+    'adressedelastructure': 'structure_address',
+    'telephone': 'structure_phone',
+}
+DIPLOMA_COLUMNS = {
+    'code': 'code',
+    'type': 'type',
+    'numero': 'number',
+    'libelle': 'label',
+    'lieudobtention': 'place',
+    'paysdobtention': 'country',
+    'datedobtention': 'obtained',
+    'validationparleguichetprincipal': 'validation',
+}
+AUTHORIZATION_COLUMNS = {
+    'profession': 'profession',
+    'discipline': 'discipline',
+    'type': 'type',
+    'lieu': 'place',
+    'datedeffet': 'start_date',
+    'datedefin': 'end_date',
+}
+
+# professionals column → tab name in the attributes table
+ATTRIBUTE_TABS = {'situation_data': 'situation', 'dossier_data': 'dossier', 'personne_data': 'personne'}
+
+_POSTAL_CODE = re.compile(r'\b(\d{5})\b')
+
+
+def create_detail_tables(conn):
+    """Create the child tables and their indexes if missing"""
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS practice_situations (
+            rpps TEXT PRIMARY KEY,
+            departement TEXT,
+            {', '.join(f'{column} TEXT' for column in SITUATION_COLUMNS.values())}
+        )
+    ''')
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS diplomas (
+            rpps TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            {', '.join(f'{column} TEXT' for column in DIPLOMA_COLUMNS.values())}
+        )
+    ''')
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS authorizations (
+            rpps TEXT NOT NULL,
+            {', '.join(f'{column} TEXT' for column in AUTHORIZATION_COLUMNS.values())}
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attributes (
+            rpps TEXT NOT NULL,
+            tab TEXT NOT NULL,
+            section TEXT NOT NULL,
+            position INTEGER,
+            label TEXT NOT NULL,
+            value TEXT
+        )
+    ''')
+    for index in ('practice_situations(departement)', 'practice_situations(siret)', 'practice_situations(finess)',
+                  'diplomas(rpps)', 'diplomas(code)', 'diplomas(label)',
+                  'authorizations(rpps)', 'authorizations(profession)',
+                  'attributes(rpps, tab)', 'attributes(label, value)'):
+        name = 'idx_' + re.sub(r'\W+', '_', index).strip('_')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {index}')
+    conn.commit()
+
+
+def label_key(label):
+    """'Numéro  FINESS EJ' → 'numerofinessej' (accents, case, spaces and punctuation dropped)"""
+    folded = unicodedata.normalize('NFKD', label).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]', '', folded.lower())
+
+
+def departement(address):
+    """Département code of the last postal code in an address ('75', '2A', '971'), or None"""
+    codes = _POSTAL_CODE.findall(address or '')
+    if not codes:
+        return None
+    code = codes[-1]
+    if code.startswith(('97', '98')):
+        return code[:3]
+    if code.startswith('20'):
+        return '2A' if code < '20200' else '2B'
+    return code[:2]
+
+
+def typed_row(values, columns):
+    """Row of `columns` values from a {label: value} dict (first match of each column)"""
+    row = {}
+    for label, value in values.items():
+        column = columns.get(label_key(label))
+        if column and column not in row:
+            row[column] = value
+    return [row.get(column) for column in columns.values()]
+
+
+def tab_content(data, field):
+    """Parsed JSON of a saved tab (any DETAIL_ENCODING), or None if the tab is missing or empty"""
+    text = decode_tab(data.get(field))
+    if not text or len(text) <= 10:
+        return None
+    try:
+        return json.loads(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def record_details(conn, doctors):
+    """
+    Replace the child-table rows of every tab saved for these doctors,
+    with bulk inserts, inside the caller's transaction
+    """
+    if not config.NORMALIZE_DETAILS:
+        return
+
+    deletes = {'practice_situations': [], 'diplomas': [], 'authorizations': [], 'attributes': []}
+    situations, diplomas, authorizations, attributes = [], [], [], []
+
+    # Deletes run before inserts: a doctor saved twice in one batch keeps its last record
+    for data in {data['rpps']: data for data in doctors}.values():
+        rpps = data['rpps']
+
+        situation = tab_content(data, 'situation_data')
+        if situation is not None:
+            deletes['practice_situations'].append((rpps,))
+            values = {}
+            for section in situation.values():
+                for label, value in section.items():
+                    if label != 'items':
+                        values.setdefault(label, value)
+            situations.append([rpps, departement(data.get('address'))] + typed_row(values, SITUATION_COLUMNS))
+
+        diplomes = tab_content(data, 'diplomes_data')
+        if diplomes is not None:
+            deletes['diplomas'].append((rpps,))
+            deletes['authorizations'].append((rpps,))
+            for kind, key in (('diplome', 'diplomes'), ('autre', 'autres_diplomes')):
+                diplomas.extend([rpps, kind] + typed_row(item, DIPLOMA_COLUMNS) for item in diplomes.get(key, []))
+            authorizations.extend([rpps] + typed_row(item, AUTHORIZATION_COLUMNS)
+                                  for item in diplomes.get('autorisations', []))
+
+        for field, tab in ATTRIBUTE_TABS.items():
+            content = situation if field == 'situation_data' else tab_content(data, field)
+            if content is None:
+                continue
+            deletes['attributes'].append((rpps, tab))
+            for section, values in content.items():
+                for label, value in values.items():
+                    if label != 'items':
+                        attributes.append((rpps, tab, section, None, label.strip(), value))
+                        continue
+                    for position, item in enumerate(value):
+                        attributes.extend((rpps, tab, section, position, column.strip(), cell)
+                                          for column, cell in item.items())
+
+    for table, keys in deletes.items():
+        where = 'rpps = ? AND tab = ?' if table == 'attributes' else 'rpps = ?'
+        conn.executemany(f'DELETE FROM {table} WHERE {where}', keys)
+    conn.executemany(f'INSERT INTO practice_situations VALUES ({", ".join("?" * (2 + len(SITUATION_COLUMNS)))})',
+                     situations)
+    conn.executemany(f'INSERT INTO diplomas VALUES ({", ".join("?" * (2 + len(DIPLOMA_COLUMNS)))})', diplomas)
+    conn.executemany(f'INSERT INTO authorizations VALUES ({", ".join("?" * (1 + len(AUTHORIZATION_COLUMNS)))})',
+                     authorizations)
+    conn.executemany('INSERT INTO attributes VALUES (?, ?, ?, ?, ?, ?)', attributes)
+
+
+def rebuild_details(conn, rpps_list=None, batch_size=500):
+    """
+    Rebuild the child tables from the JSON columns of professionals
+    (of the doctors in rpps_list, or every doctor). Returns the doctor count.
+    """
+    create_detail_tables(conn)
+    query = 'SELECT rpps, address, situation_data, dossier_data, diplomes_data, personne_data FROM professionals'
+    fields = ('rpps', 'address', 'situation_data', 'dossier_data', 'diplomes_data', 'personne_data')
+
+    if rpps_list is None:
+        rows = conn.execute(query).fetchall()
+    else:
+        rpps_list = list(rpps_list)
+        rows = []
+        for start in range(0, len(rpps_list), 500):
+            chunk = rpps_list[start:start + 500]
+            rows += conn.execute(f"{query} WHERE rpps IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+
+    for start in range(0, len(rows), batch_size):
+        with conn:
+            record_details(conn, [dict(zip(fields, row)) for row in rows[start:start + batch_size]])
+    return len(rows)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Rebuild the normalized detail tables from professionals')
+    parser.add_argument('--db', default=config.DATABASE_PATH)
+    args = parser.parse_args()
+
+    config.NORMALIZE_DETAILS = True
+    start = time.time()
+    conn = sqlite3.connect(args.db, timeout=config.DB_TIMEOUT)
+    count = rebuild_details(conn)
+    tables = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+              for table in ('practice_situations', 'diplomas', 'authorizations', 'attributes')}
+    conn.close()
+    print(f"Rebuilt the detail tables of {count} doctors in {time.time() - start:.1f}s: {tables}")
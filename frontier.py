@@ -0,0 +1,257 @@
+"""
+Durable prefix frontier: checkpoint and resume for long runs.
+
+A full run with SMART_EXPANSION takes hours. Without this, a crash or
+Ctrl+C loses the list of prefixes still to scrape and every harvested card
+whose details were not fetched yet. Both live in the database instead:
+
+    frontier      one row per prefix: pending → harvesting → harvested → done
+                  (or failed), with pages_seen, total_cards, total_results
+                  (count shown by the site), last_error, attempts and priority
+                  (expected new doctors, highest harvested first). Children
+                  skipped by the expansion planner are stored as 'pruned'.
+    detail_queue  harvested cards whose details are not complete yet
+    captures      (rpps, prefix) for every card a prefix listed, the capture
+                  history used by coverage_estimator.py
+
+Only the scheduler (main process) writes these tables. Marking a prefix
+harvested, inserting its children and queueing its cards is one transaction,
+so a restarted run picks up exactly where the previous one stopped and never
+re-requests a harvested prefix.
+"""
+
+import heapq
+import itertools
+import json
+import sqlite3
+
+import config
+
+
+def create_frontier_tables(conn):
+    """Create the frontier and detail_queue tables if missing"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS frontier (
+            prefix TEXT PRIMARY KEY,
+            parent TEXT,
+            state TEXT NOT NULL DEFAULT 'pending',
+            pages_seen INTEGER DEFAULT 0,
+            total_cards INTEGER,
+            total_results INTEGER,
+            priority REAL,
+            last_error TEXT,
+            attempts INTEGER DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Databases created before total_results / priority were recorded
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(frontier)')}
+    for column, column_type in (('total_results', 'INTEGER'), ('priority', 'REAL')):
+        if column not in columns:
+            conn.execute(f'ALTER TABLE frontier ADD COLUMN {column} {column_type}')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_frontier_state ON frontier(state)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_frontier_parent ON frontier(parent)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS detail_queue (
+            rpps TEXT PRIMARY KEY,
+            prefix TEXT,
+            card TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS captures (
+            rpps TEXT NOT NULL,
+            prefix TEXT NOT NULL,
+            PRIMARY KEY (rpps, prefix)
+        ) WITHOUT ROWID
+    ''')
+    conn.commit()
+
+
+class Frontier:
+    """Scheduler-side view of the frontier tables (single connection, main process)"""
+
+    def __init__(self, db_path=None, resume=None):
+        self.conn = sqlite3.connect(db_path or config.DATABASE_PATH, timeout=config.DB_TIMEOUT)
+        create_frontier_tables(self.conn)
+
+        resume = config.RESUME if resume is None else resume
+        # REFRESH walks a finished crawl again; an interrupted refresh resumes like any run
+        if not resume or (config.REFRESH and self.finished()):
+            self.reset()
+
+    def reset(self):
+        """Forget the saved frontier, pending cards and capture history"""
+        with self.conn:
+            self.conn.execute('DELETE FROM frontier')
+            self.conn.execute('DELETE FROM detail_queue')
+            self.conn.execute('DELETE FROM captures')
+
+    def finished(self):
+        """True when no prefix is left to harvest and no card is waiting for its details"""
+        return (not self.resumable_prefixes(include_harvested=True)
+                and not self.conn.execute('SELECT 1 FROM detail_queue LIMIT 1').fetchone())
+
+    def close(self):
+        self.conn.close()
+
+    def seed(self, prefixes, priorities=None):
+        """
+        Add the initial prefixes (already known prefixes keep their state),
+        with their priority ({prefix: priority}) unless they already have one
+        """
+        priorities = priorities or {}
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO frontier (prefix) VALUES (?)",
+                                  [(prefix,) for prefix in prefixes])
+            self.conn.executemany("UPDATE frontier SET priority = ? WHERE prefix = ? AND priority IS NULL",
+                                  [(priorities[prefix], prefix) for prefix in prefixes if prefix in priorities])
+
+    def resumable_prefixes(self, include_harvested=False):
+        """
+        Prefixes that still need harvesting: pending, interrupted while
+        harvesting, or failed fewer than MAX_PREFIX_ATTEMPTS times.
+        include_harvested=True also returns harvested prefixes that are not
+        done, for engines that don't checkpoint their cards.
+        Pruned prefixes come back when PRUNE_EXPANSION is turned off.
+        Highest priority first, then in insertion order.
+        """
+        states = ('pending', 'harvesting', 'harvested') if include_harvested else ('pending', 'harvesting')
+        if not config.PRUNE_EXPANSION:
+            states += ('pruned',)
+        rows = self.conn.execute(f'''
+            SELECT prefix FROM frontier
+            WHERE state IN ({', '.join('?' * len(states))})
+               OR (state = 'failed' AND attempts < ?)
+            ORDER BY priority IS NULL, priority DESC, rowid
+        ''', states + (config.MAX_PREFIX_ATTEMPTS,))
+        return [prefix for (prefix,) in rows]
+
+    def pending_cards(self):
+        """Harvested cards whose details are not complete yet, as (data, ids)"""
+        rows = self.conn.execute('SELECT card FROM detail_queue ORDER BY rowid')
+        return [tuple(json.loads(card)) for (card,) in rows]
+
+    def priorities(self):
+        """{prefix: priority} of every prefix that has one"""
+        return dict(self.conn.execute('SELECT prefix, priority FROM frontier WHERE priority IS NOT NULL'))
+
+    def new_fraction(self, prefix, captured):
+        """
+        Fraction of the RPPS a prefix listed (captured) that no other prefix,
+        apart from its own ancestors, had listed yet. 1.0 when it listed none.
+        """
+        captured = list(set(captured))
+        if not captured:
+            return 1.0
+        ancestors = [prefix[:i] for i in range(1, len(prefix) + 1)]
+        seen = 0
+        for start in range(0, len(captured), 500):
+            chunk = captured[start:start + 500]
+            seen += self.conn.execute(f'''
+                SELECT COUNT(DISTINCT rpps) FROM captures
+                WHERE rpps IN ({', '.join('?' * len(chunk))})
+                  AND prefix NOT IN ({', '.join('?' * len(ancestors))})
+            ''', chunk + ancestors).fetchone()[0]
+        return 1 - seen / len(captured)
+
+    def children(self, prefix):
+        """Prefixes already recorded under a prefix (expanded or pruned by a previous harvest)"""
+        return [child for (child,) in self.conn.execute('SELECT prefix FROM frontier WHERE parent = ?', (prefix,))]
+
+    def prefix_info(self, prefix):
+        """(state, total_cards) of a prefix, or None"""
+        return self.conn.execute('SELECT state, total_cards FROM frontier WHERE prefix = ?',
+                                 (prefix,)).fetchone()
+
+    def counts(self):
+        """Number of prefixes per state"""
+        return dict(self.conn.execute('SELECT state, COUNT(*) FROM frontier GROUP BY state'))
+
+    def mark_harvesting(self, prefix):
+        with self.conn:
+            self.conn.execute('''
+                UPDATE frontier SET state = 'harvesting', attempts = attempts + 1,
+                                    updated_at = CURRENT_TIMESTAMP
+                WHERE prefix = ?
+            ''', (prefix,))
+
+    def mark_failed(self, prefix, error):
+        with self.conn:
+            self.conn.execute('''
+                UPDATE frontier SET state = 'failed', last_error = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE prefix = ?
+            ''', (error, prefix))
+
+    def mark_harvested(self, prefix, total_cards, pages_seen, children=(), cards=(), total_results=None, pruned=(),
+                       captured=(), priorities=None):
+        """
+        Atomically record a harvested prefix, its expanded (and pruned)
+        children with their priorities ({child: priority}), the cards that
+        still need their details fetched and the RPPS of every card it
+        listed (captured).
+        Returns the children that were not in the frontier yet.
+        """
+        priorities = priorities or {}
+        with self.conn:
+            self.conn.execute('''
+                UPDATE frontier SET state = 'harvested', total_cards = ?, total_results = ?, pages_seen = ?,
+                                    last_error = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE prefix = ?
+            ''', (total_cards, total_results, pages_seen, prefix))
+            inserted = [child for child in children if self.conn.execute(
+                "INSERT OR IGNORE INTO frontier (prefix, parent, priority) VALUES (?, ?, ?)",
+                (child, prefix, priorities.get(child))).rowcount]
+            self.conn.executemany("INSERT OR IGNORE INTO frontier (prefix, parent, state) VALUES (?, ?, 'pruned')",
+                                  [(child, prefix) for child in pruned])
+            self.conn.executemany("INSERT OR IGNORE INTO captures (rpps, prefix) VALUES (?, ?)",
+                                  [(rpps, prefix) for rpps in captured])
+            self.conn.executemany("INSERT OR REPLACE INTO detail_queue (rpps, prefix, card) VALUES (?, ?, ?)",
+                                  [(data['rpps'], prefix, json.dumps([data, ids], ensure_ascii=False))
+                                   for data, ids in cards])
+        return inserted
+
+    def mark_done(self, prefix):
+        """All cards of the prefix went through the detail stage"""
+        with self.conn:
+            self.conn.execute('''
+                UPDATE frontier SET state = 'done', updated_at = CURRENT_TIMESTAMP
+                WHERE prefix = ?
+            ''', (prefix,))
+
+    def finish_harvested(self):
+        """
+        Mark done the harvested prefixes with no card left in the detail queue
+        (interrupted before mark_done, or every card skipped on resume)
+        """
+        with self.conn:
+            self.conn.execute('''
+                UPDATE frontier SET state = 'done', updated_at = CURRENT_TIMESTAMP
+                WHERE state = 'harvested'
+                  AND NOT EXISTS (SELECT 1 FROM detail_queue WHERE detail_queue.prefix = frontier.prefix)
+            ''')
+
+    def card_done(self, rpps):
+        """Details of a card are complete, drop it from the detail queue"""
+        with self.conn:
+            self.conn.execute('DELETE FROM detail_queue WHERE rpps = ?', (rpps,))
+
+
+class PrefixQueue:
+    """Prefixes waiting to be dispatched, highest priority first (FIFO among equals)"""
+
+    def __init__(self, prefixes=(), priorities=None):
+        self.heap = []
+        self.counter = itertools.count()
+        for prefix in prefixes:
+            self.push(prefix, (priorities or {}).get(prefix, 0.0))
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, prefix, priority=0.0):
+        heapq.heappush(self.heap, (-(priority or 0.0), next(self.counter), prefix))
+
+    def pop(self):
+        return heapq.heappop(self.heap)[2]
@@ -0,0 +1,181 @@
+"""
+Shared extraction of search result cards (div.contenant_resultat).
+
+parallel_scraper, parser.parse_search_results and HealthSpider all parse
+results pages the same way; this is the one hot path they share.
+
+Backends:
+    'lxml' - lxml.html with precompiled XPath expressions (fast, default if installed)
+    'bs4'  - BeautifulSoup with html.parser (fallback, no extra dependency)
+
+Every backend returns the same compact card records:
+    {'rpps', 'name', 'href', 'params', 'profession', 'organization',
+     'address', 'phone', 'email', 'mssante'}
+where params holds the query parameters of the detail link (first value),
+email is the span.mssante_txt text and mssante the whole div.mssante text.
+address, phone, email and mssante are None when the element is missing.
+Cards without an RPPS in their detail link are dropped.
+"""
+
+from urllib.parse import urlparse, parse_qs
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+
+DEFAULT_BACKEND = 'lxml' if lxml_html is not None else 'bs4'
+
+
+def _params(href):
+    """Query parameters of a link, first value of each"""
+    return {k: v[0] if v else '' for k, v in parse_qs(urlparse(href).query).items()}
+
+
+def _record(name, href, professions, address, phone, email, mssante):
+    """Build a card record, or None without an RPPS"""
+    params = _params(href)
+    rpps = params.get('_mapportlet_idRpps', '')
+    if not rpps:
+        return None
+
+    record = {
+        'rpps': rpps,
+        'name': name,
+        'href': href,
+        'params': params,
+        'profession': '',
+        'organization': '',
+        'address': address,
+        'phone': phone,
+        'email': email,
+        'mssante': mssante
+    }
+    texts = [p for p in professions if p]
+    if texts:
+        record['profession'] = texts[0]
+    if len(texts) > 1:
+        record['organization'] = ' | '.join(texts[1:])
+    return record
+
+
+# ----------------------------------------------------------------------------
+# bs4 backend
+# ----------------------------------------------------------------------------
+
+def _extract_cards_bs4(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    cards = []
+
+    for card in soup.find_all('div', class_='contenant_resultat'):
+        nom_prenom = card.find('div', class_='nom_prenom')
+        if not nom_prenom:
+            continue
+        link = nom_prenom.find('a', href=True)
+        if not link:
+            continue
+
+        address_div = card.find('div', class_='adresse')
+        tel_div = card.find('div', class_='tel')
+        email = mssante = None
+        mssante_div = card.find('div', class_='mssante')
+        if mssante_div:
+            mssante = mssante_div.get_text(strip=True)
+            email_span = mssante_div.find('span', class_='mssante_txt')
+            if email_span:
+                email = email_span.get_text(strip=True)
+
+        record = _record(
+            link.get_text(strip=True),
+            link['href'],
+            [p.get_text(strip=True) for p in card.find_all('div', class_='profession')],
+            address_div.get_text(' ', strip=True) if address_div else None,
+            tel_div.get_text(strip=True) if tel_div else None,
+            email,
+            mssante
+        )
+        if record:
+            cards.append(record)
+
+    return cards
+
+
+# ----------------------------------------------------------------------------
+# lxml backend
+# ----------------------------------------------------------------------------
+
+def _has_class(name):
+    """XPath predicate matching one token of the class attribute (like bs4 class_=)"""
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+
+if lxml_html is not None:
+    _XP_CARDS = etree.XPath(f'//div[{_has_class("contenant_resultat")}]')
+    _XP_LINK = etree.XPath(f'(.//div[{_has_class("nom_prenom")}])[1]//a[@href]')
+    _XP_PROFESSIONS = etree.XPath(f'.//div[{_has_class("profession")}]')
+    _XP_ADDRESS = etree.XPath(f'(.//div[{_has_class("adresse")}])[1]')
+    _XP_TEL = etree.XPath(f'(.//div[{_has_class("tel")}])[1]')
+    _XP_MSSANTE = etree.XPath(f'(.//div[{_has_class("mssante")}])[1]')
+    _XP_MSSANTE_TXT = etree.XPath(f'(.//span[{_has_class("mssante_txt")}])[1]')
+    _XP_TEXTS = etree.XPath('.//text()')
+
+
+def _text(element, separator=''):
+    """Same as bs4 get_text(separator, strip=True)"""
+    return separator.join(t.strip() for t in _XP_TEXTS(element) if t.strip())
+
+
+def _first_text(nodes, separator=''):
+    return _text(nodes[0], separator) if nodes else None
+
+
+def _extract_cards_lxml(html):
+    if not html or not html.strip():
+        return []
+    root = lxml_html.document_fromstring(html)
+    cards = []
+
+    for card in _XP_CARDS(root):
+        links = _XP_LINK(card)
+        if not links:
+            continue
+        link = links[0]
+
+        mssante_div = _XP_MSSANTE(card)
+        email = _first_text(_XP_MSSANTE_TXT(mssante_div[0])) if mssante_div else None
+
+        record = _record(
+            _text(link),
+            link.get('href'),
+            [_text(p) for p in _XP_PROFESSIONS(card)],
+            _first_text(_XP_ADDRESS(card), ' '),
+            _first_text(_XP_TEL(card)),
+            email,
+            _first_text(mssante_div)
+        )
+        if record:
+            cards.append(record)
+
+    return cards
+
+
+BACKENDS = {
+    'bs4': _extract_cards_bs4,
+    'lxml': _extract_cards_lxml,
+}
+
+
+def extract_cards(html, backend=None):
+    """
+    Extract all result cards of a search/pagination page.
+    backend: 'lxml', 'bs4', or None/'auto' for the fastest one installed.
+    """
+    if not backend or backend == 'auto':
+        backend = DEFAULT_BACKEND
+    if backend == 'lxml' and lxml_html is None:
+        backend = 'bs4'
+    return BACKENDS[backend](html)
@@ -1,8 +1,166 @@
 from bs4 import BeautifulSoup
+from bisect import bisect_left, bisect_right
 import json
+import re
 
-def extract_generic_content(html):
-    """Unified extractor for all tabs"""
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# Content divs of the 4 tabs (class token containing one of these)
+CONTENT_CLASSES = ['contenu_situation', 'contenu_dossier', 'contenu_personne', 'contenu_diplome']
+
+# Text inside these tags is not part of get_text() in BeautifulSoup
+_HIDDEN_TEXT_TAGS = {'script', 'style', 'template', 'rt', 'rp'}
+
+# The site writes "&nbsp" without semicolon: html.parser decodes it, libxml2 keeps it literal
+_BARE_ENTITY = re.compile(r'&(nbsp|amp|lt|gt|quot|copy|reg)(?!;)')
+
+
+def _use_lxml(backend):
+    if backend == 'bs4' or etree is None:
+        return False
+    return True
+
+
+class _DocumentIndex:
+    """
+    Single pass over an lxml tree that records, in document order, every
+    element the tab extractors look for and every text node. Subtree and
+    "next/previous in document" lookups then become bisects on sorted
+    index lists instead of repeated tree searches, and text() reproduces
+    BeautifulSoup's get_text(strip=True).
+    """
+    
+    def __init__(self, html):
+        root = etree.HTML(_BARE_ENTITY.sub(r'&\1;', html))
+        if root is None:
+            raise etree.ParserError('Document is empty')
+        
+        self.elements = []      # document order
+        self.position = {}      # element -> index in self.elements
+        self.subtree_end = []   # index past the last descendant
+        self.text_start = []    # first text node inside the element
+        self.text_end = []      # past the last text node inside the element
+        self.texts = []         # stripped, non-empty text nodes in document order
+        
+        self.content_divs = []
+        self.h2s = []
+        self.label_spans = []
+        self.txt_spans = []
+        self.tables = []
+        self.diplome_tables = []
+        self.trs = []
+        self.ths = []
+        self.tds = []
+        
+        hidden = 0
+        for event, el in etree.iterwalk(root, events=('start', 'end')):
+            tag = el.tag
+            if not isinstance(tag, str):
+                # Comments and processing instructions: only their tail is text
+                if event == 'end' and el.tail and not hidden:
+                    self._add_text(el.tail)
+                continue
+            
+            if event == 'start':
+                i = len(self.elements)
+                self.elements.append(el)
+                self.position[el] = i
+                self.subtree_end.append(None)
+                self.text_start.append(len(self.texts))
+                self.text_end.append(None)
+                self._classify(i, tag, el.get('class'))
+                if tag in _HIDDEN_TEXT_TAGS:
+                    hidden += 1
+                if el.text and not hidden:
+                    self._add_text(el.text)
+            else:
+                i = self.position[el]
+                if tag in _HIDDEN_TEXT_TAGS:
+                    hidden -= 1
+                self.subtree_end[i] = len(self.elements)
+                self.text_end[i] = len(self.texts)
+                if el.tail and not hidden:
+                    self._add_text(el.tail)
+    
+    def _add_text(self, text):
+        text = text.strip()
+        if text:
+            self.texts.append(text)
+    
+    def _classify(self, i, tag, class_attr):
+        classes = class_attr.split() if class_attr else []
+        if tag == 'div':
+            if any(k in c for c in classes for k in CONTENT_CLASSES):
+                self.content_divs.append(i)
+        elif tag == 'span':
+            if any('label' in c.lower() for c in classes):
+                self.label_spans.append(i)
+            if any('txt' in c.lower() for c in classes):
+                self.txt_spans.append(i)
+        elif tag == 'table':
+            self.tables.append(i)
+            if 'cellspacingNone' in classes:
+                self.diplome_tables.append(i)
+        elif tag in ('h2', 'tr', 'th', 'td'):
+            getattr(self, tag + 's').append(i)
+    
+    def text(self, i):
+        """get_text(strip=True) of element i"""
+        return ''.join(self.texts[self.text_start[i]:self.text_end[i]])
+    
+    def within(self, indexes, i):
+        """Entries of a sorted index list that are descendants of element i"""
+        return indexes[bisect_right(indexes, i):bisect_left(indexes, self.subtree_end[i])]
+    
+    def after(self, indexes, i):
+        """Entries that come after element i in document order (find_next)"""
+        return indexes[bisect_right(indexes, i):]
+    
+    def before(self, indexes, i):
+        """Entries that come before element i in document order (find_previous)"""
+        return indexes[:bisect_left(indexes, i)]
+    
+    @staticmethod
+    def first(indexes):
+        return indexes[0] if indexes else None
+    
+    @staticmethod
+    def last(indexes):
+        return indexes[-1] if indexes else None
+    
+    def parent(self, i):
+        parent = self.elements[i].getparent()
+        return self.position[parent] if parent is not None else None
+    
+    def next_sibling(self, i, tag):
+        sibling = self.elements[i].getnext()
+        while sibling is not None and sibling.tag != tag:
+            sibling = sibling.getnext()
+        return self.position[sibling] if sibling is not None else None
+    
+    def table_rows(self, table, min_rows=2):
+        """
+        Rows of a table as header → cell dicts, skipping empty and
+        "Pas d'information" rows. None if the table has fewer than min_rows rows.
+        """
+        rows = self.within(self.trs, table)
+        if len(rows) < min_rows:
+            return None
+        
+        headers = [self.text(th) for th in self.within(self.ths, rows[0])]
+        table_data = []
+        for row in rows[1:]:
+            cells = [self.text(td) for td in self.within(self.tds, row)]
+            if cells and any(cells) and "Pas d'information" not in ' '.join(cells):
+                table_data.append(dict(zip(headers, cells)))
+        return table_data
+
+
+def _extract_generic_content_bs4(html):
+    """Unified extractor for all tabs (BeautifulSoup reference implementation)"""
     soup = BeautifulSoup(html, 'html.parser')
     data = {}
     
@@ -76,13 +234,73 @@ def extract_generic_content(html):
     
     return json.dumps(data, ensure_ascii=False, indent=2)
 
+def _extract_generic_content_lxml(html):
+    """Same output as _extract_generic_content_bs4, from one indexed pass over the document"""
+    doc = _DocumentIndex(html)
+    data = {}
+    
+    content = doc.first(doc.content_divs)
+    if content is None:
+        return json.dumps(data)
+    
+    for section in doc.within(doc.h2s, content):
+        section_name = doc.text(section)
+        data[section_name] = {}
+        
+        container = doc.parent(section)
+        if container is None:
+            continue
+        
+        for label_span in doc.within(doc.label_spans, container):
+            label_text = doc.text(label_span)
+            
+            if not label_text or ':' not in label_text:
+                continue
+            
+            if label_text.endswith(':'):
+                label_text = label_text[:-1]
+            
+            # Same three strategies as the bs4 extractor
+            value_span = doc.next_sibling(label_span, 'span')
+            
+            if value_span is None or not doc.text(value_span):
+                parent_div = doc.parent(label_span)
+                if parent_div is not None:
+                    next_div = doc.next_sibling(parent_div, 'div')
+                    if next_div is not None:
+                        value_span = doc.first(doc.within(doc.txt_spans, next_div))
+            
+            if value_span is None or not doc.text(value_span):
+                value_span = doc.first(doc.after(doc.txt_spans, label_span))
+            
+            if value_span is not None:
+                value = doc.text(value_span)
+                if value and value not in ['&nbsp;', ' ', '']:
+                    data[section_name][label_text] = value
+        
+        for table in doc.within(doc.tables, container):
+            table_data = doc.table_rows(table)
+            if table_data:
+                data[section_name]['items'] = table_data
+    
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+def extract_generic_content(html, backend=None):
+    """Unified extractor for all tabs ('lxml' when installed, else 'bs4')"""
+    if _use_lxml(backend):
+        try:
+            return _extract_generic_content_lxml(html)
+        except (etree.ParserError, ValueError):
+            pass
+    return _extract_generic_content_bs4(html)
+
 def extract_situation_content(html):
     return extract_generic_content(html)
 
 def extract_dossier_content(html):
     return extract_generic_content(html)
 
-def extract_diplomes_content(html):
+def _extract_diplomes_content_bs4(html):
     soup = BeautifulSoup(html, 'html.parser')
     data = {'diplomes': [], 'autres_diplomes': [], 'autorisations': []}
     
@@ -115,6 +333,35 @@ def extract_diplomes_content(html):
     
     return json.dumps(data, ensure_ascii=False, indent=2)
 
+def _extract_diplomes_content_lxml(html):
+    doc = _DocumentIndex(html)
+    data = {'diplomes': [], 'autres_diplomes': [], 'autorisations': []}
+    
+    for table in doc.diplome_tables:
+        prev_h2 = doc.last(doc.before(doc.h2s, table))
+        section_name = doc.text(prev_h2) if prev_h2 is not None else 'unknown'
+        
+        table_data = doc.table_rows(table, min_rows=1)
+        if table_data is None:
+            continue
+        
+        if 'DIPLÔMES' in section_name or 'DIPLOM' in section_name:
+            data['diplomes'].extend(table_data)
+        elif 'AUTRES' in section_name:
+            data['autres_diplomes'].extend(table_data)
+        elif 'AUTORISATION' in section_name:
+            data['autorisations'].extend(table_data)
+    
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+def extract_diplomes_content(html, backend=None):
+    if _use_lxml(backend):
+        try:
+            return _extract_diplomes_content_lxml(html)
+        except (etree.ParserError, ValueError):
+            pass
+    return _extract_diplomes_content_bs4(html)
+
 def extract_personne_content(html):
     return extract_generic_content(html)
 
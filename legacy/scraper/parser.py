@@ -2,6 +2,8 @@ from bs4 import BeautifulSoup
 from urllib.parse import urlparse, parse_qs
 import re
 
+from scraper.card_extractor import extract_cards
+
 def extract_search_form_names(html):
     soup = BeautifulSoup(html, 'html.parser')
     form = soup.find('form')
@@ -78,60 +80,26 @@ def extract_params_from_url(url):
     return result
 
 def parse_search_results(html):
-    soup = BeautifulSoup(html, 'html.parser')
     results = []
     
-    cards = soup.find_all('div', class_='contenant_resultat')
-    
-    for card in cards:
-        nom_prenom = card.find('div', class_='nom_prenom')
-        if not nom_prenom:
-            continue
-            
-        link = nom_prenom.find('a', href=True)
-        if not link or 'DetailsPPAction' not in link.get('href', ''):
+    for card in extract_cards(html):
+        if 'DetailsPPAction' not in card['href']:
             continue
         
-        href = link['href']
-        params = extract_params_from_url(href)
-        
-        if not params.get('_mapportlet_idRpps'):
-            continue
+        params = card['params']
         
         info = {
-            'rpps': params.get('_mapportlet_idRpps', ''),
-            'name': link.get_text(strip=True),
-            'profession': '',
-            'organization': '',
-            'address': '',
-            'phone': '',
-            'email': '',
+            'rpps': card['rpps'],
+            'name': card['name'],
+            'profession': card['profession'],
+            'organization': card['organization'],
+            'address': (card['address'] or '').replace('<br>', ' '),
+            'phone': card['phone'] or '',
+            'email': card['email'] or '',
             'finess': '',
             'siret': ''
         }
         
-        profession_divs = card.find_all('div', class_='profession')
-        if profession_divs:
-            texts = [p.get_text(strip=True) for p in profession_divs if p.get_text(strip=True)]
-            if texts:
-                info['profession'] = texts[0]
-            if len(texts) > 1:
-                info['organization'] = ' | '.join(texts[1:])
-        
-        address_div = card.find('div', class_='adresse')
-        if address_div:
-            info['address'] = address_div.get_text(' ', strip=True).replace('<br>', ' ')
-        
-        tel_div = card.find('div', class_='tel')
-        if tel_div:
-            info['phone'] = tel_div.get_text(strip=True)
-        
-        mssante_div = card.find('div', class_='mssante')
-        if mssante_div:
-            email_span = mssante_div.find('span', class_='mssante_txt')
-            if email_span:
-                info['email'] = email_span.get_text(strip=True)
-        
         info['_ids'] = {
             'idRpps': params.get('_mapportlet_idRpps', ''),
             'idExePro': params.get('_mapportlet_idExePro', ''),
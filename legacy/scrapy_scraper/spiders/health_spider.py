@@ -3,8 +3,15 @@ from scrapy import Request, FormRequest
 from bs4 import BeautifulSoup
 import re
 import string
+import sys
+from pathlib import Path
 from items import ProfessionalItem
 
+# Add legacy directory to path for importing the shared card extractor
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from scraper.card_extractor import extract_cards
+
 class HealthSpider(scrapy.Spider):
     name = 'health_professionals'
     allowed_domains = ['annuaire.sante.fr']
@@ -71,8 +78,7 @@ class HealthSpider(scrapy.Spider):
     
     def parse_results(self, response):
         """Parse search results and extract doctor cards"""
-        soup = BeautifulSoup(response.text, 'html.parser')
-        cards = soup.find_all('div', class_='contenant_resultat')
+        cards = extract_cards(response.text)
         
         self.logger.info(f"Prefix {response.meta['prefix']} page {response.meta['page']}: {len(cards)} doctors")
         
@@ -148,57 +154,20 @@ class HealthSpider(scrapy.Spider):
                     yield self.make_search_request(new_prefix, p_auth)
     
     def extract_card_data(self, card):
-        """Extract data from a result card"""
-        data = {
-            'rpps': '',
-            'name': '',
-            'profession': '',
-            'organization': '',
-            'address': '',
-            'phone': '',
-            'email': ''
-        }
-        
-        nom_prenom = card.find('div', class_='nom_prenom')
-        if not nom_prenom:
-            return None
-        
-        link = nom_prenom.find('a', href=True)
-        if not link or 'DetailsPPAction' not in link.get('href', ''):
+        """Build item data from a result card record (see scraper.card_extractor)"""
+        if 'DetailsPPAction' not in card['href']:
             return None
         
-        # Extract IDs from URL
-        href = link['href']
-        params = self.extract_params_from_url(href)
-        
-        data['rpps'] = params.get('_mapportlet_idRpps', '')
-        data['name'] = link.get_text(strip=True)
-        
-        # Profession and organization
-        profession_divs = card.find_all('div', class_='profession')
-        if profession_divs:
-            texts = [p.get_text(strip=True) for p in profession_divs if p.get_text(strip=True)]
-            if texts:
-                data['profession'] = texts[0]
-            if len(texts) > 1:
-                data['organization'] = ' | '.join(texts[1:])
-        
-        # Address
-        address_div = card.find('div', class_='adresse')
-        if address_div:
-            data['address'] = address_div.get_text(' ', strip=True)
-        
-        # Phone
-        tel_div = card.find('div', class_='tel')
-        if tel_div:
-            data['phone'] = tel_div.get_text(strip=True)
-        
-        # Email
-        mssante_div = card.find('div', class_='mssante')
-        if mssante_div:
-            email_span = mssante_div.find('span', class_='mssante_txt')
-            if email_span:
-                data['email'] = email_span.get_text(strip=True)
+        params = card['params']
+        data = {
+            'rpps': card['rpps'],
+            'name': card['name'],
+            'profession': card['profession'],
+            'organization': card['organization'],
+            'address': card['address'] or '',
+            'phone': card['phone'] or '',
+            'email': card['email'] or ''
+        }
         
         # Store IDs for detail requests
         data['_ids'] = {
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Compatibility check: the lxml single-pass tab extractors must produce
+byte-identical JSON to the BeautifulSoup ones on every saved HTML fixture.
+Timings of both backends: python benchmark.py --extractors
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from scraper.content_extractor import extract_generic_content, extract_diplomes_content
+
+FIXTURES = sorted(Path(__file__).parent.glob('*.html'))
+
+EXTRACTORS = [
+    ('generic', extract_generic_content),
+    ('diplomes', extract_diplomes_content),
+]
+
+
+def test_content_extractor_compat():
+    mismatches = []
+
+    for path in FIXTURES:
+        html = path.read_text(encoding='utf-8')
+
+        for name, extractor in EXTRACTORS:
+            if extractor(html, 'lxml') != extractor(html, 'bs4'):
+                mismatches.append((path.name, name))
+
+    assert not mismatches, f"lxml output differs from bs4: {mismatches}"
+
+
+if __name__ == '__main__':
+    print("="*100)
+    print(f"CONTENT EXTRACTOR COMPATIBILITY ({len(FIXTURES)} fixtures)")
+    print("="*100)
+
+    try:
+        test_content_extractor_compat()
+    except AssertionError as e:
+        print(f"\n✗ {e}")
+        sys.exit(1)
+
+    print("\n✓ lxml and bs4 extractors produce identical JSON")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Coverage estimator check: trie size estimate and Chao's Mh capture-recapture
+estimate on a small hand-built frontier and captures table with known answers.
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import pytest
+
+import config
+import parallel_scraper
+from coverage_estimator import (capture_recapture, classify, coverage_report, estimate_sizes,
+                                independent_captures, load_trie)
+from frontier import create_frontier_tables
+
+# prefix: (parent, state, total_cards, total_results)
+FRONTIER = {
+    'a': (None, 'done', 100, 250),      # capped: 250 results, 100 listed
+    'aa': ('a', 'done', 60, 60),
+    'ab': ('a', 'done', 40, 40),
+    'ac': ('a', 'pending', None, None),
+    'aca': ('ac', 'pending', None, None),
+    'ad': ('a', 'failed', None, None),
+    'ae': ('a', 'pruned', None, None),
+    'b': (None, 'done', 30, None),      # exhausted, no count shown by the site
+    'c': (None, 'pending', None, None),
+}
+
+# rpps: prefixes that listed it
+CAPTURES = {
+    # f1: one independent capture ('a' is an ancestor of 'aa')
+    '1': ['aa'], '2': ['aa', 'a'], '3': ['ab'], '4': ['ab', 'a'], '5': ['b'], '6': ['a'],
+    # f2
+    '7': ['aa', 'b'], '8': ['ab', 'b'],
+    # three occasions
+    '9': ['aa', 'b', 'c'],
+}
+
+
+@pytest.fixture
+def conn(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, 'DATABASE_PATH', str(tmp_path / 'coverage.db'))
+    monkeypatch.setattr(config, 'MAX_PAGES', 10)
+    parallel_scraper.create_database()
+    conn = sqlite3.connect(config.DATABASE_PATH)
+    create_frontier_tables(conn)
+    with conn:
+        conn.executemany('INSERT INTO frontier (prefix, parent, state, total_cards, total_results) '
+                         'VALUES (?, ?, ?, ?, ?)', [(prefix,) + row for prefix, row in FRONTIER.items()])
+        conn.executemany('INSERT INTO captures (rpps, prefix) VALUES (?, ?)',
+                         [(rpps, prefix) for rpps, prefixes in CAPTURES.items() for prefix in prefixes])
+    yield conn
+    conn.close()
+
+
+def test_classify(conn):
+    nodes = load_trie(conn)
+    assert {prefix: classify(node) for prefix, node in nodes.items()} == {
+        'a': 'capped', 'aa': 'exhausted', 'ab': 'exhausted', 'ac': 'pending', 'aca': 'pending',
+        'ad': 'failed', 'ae': 'pruned', 'b': 'exhausted', 'c': 'pending'}
+
+
+def test_trie_estimate(conn):
+    sizes, roots = estimate_sizes(load_trie(conn))
+    assert sorted(roots) == ['a', 'b', 'c']
+    # 'a' has 250 - 60 - 40 left for its two unharvested children, 'ae' is pruned
+    assert sizes['ac'] == sizes['ad'] == 75
+    assert sizes['aca'] == 75
+    assert sizes.get('ae', 0) == 0
+    assert sizes['b'] == 30
+    # A pending root counts as the mean harvested root
+    assert sizes['c'] == (250 + 30) / 2
+    assert sum(sizes[root] for root in roots) == 420
+
+
+@pytest.mark.parametrize('prefixes, count', [(['aa'], 1), (['a', 'aa'], 1), (['a', 'aa', 'ab'], 2),
+                                             (['aa', 'b', 'c'], 3), (['b', 'ba', 'bac'], 1)])
+def test_independent_captures(prefixes, count):
+    assert independent_captures(prefixes) == count
+
+
+def test_chao_mh(conn):
+    # S_obs = 9, f1 = 6, f2 = 2, t = 3: 9 + 2/3 * 6 * 5 / (2 * 3) = 12.33
+    assert capture_recapture(conn) == (12, 6, 2)
+
+
+def test_chao_mh_needs_recaptures(conn):
+    with conn:
+        conn.execute("DELETE FROM captures WHERE rpps IN ('7', '8')")
+    estimate, f1, f2 = capture_recapture(conn)
+    assert (estimate, f1, f2) == (None, 6, 0)
+
+
+def test_coverage_report(conn):
+    report = coverage_report(conn=conn)
+    assert report['estimate_trie'] == 420
+    assert report['estimate_capture_recapture'] == 12
+    assert report['listed'] == 9
+    assert report['remaining'] == 411
+    assert report['prefixes'] == {'capped': 1, 'exhausted': 3, 'pending': 3, 'failed': 1, 'pruned': 1}
+
+    # The monitor's report reads neither the capture history nor professionals rows
+    light = coverage_report(conn=conn, captures=False)
+    assert light['listed'] is None and light['estimate_capture_recapture'] is None
+    assert light['estimate'] == 420 and light['saved'] == 0
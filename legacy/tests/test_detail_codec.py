@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Detail codec check: every DETAIL_ENCODING round-trips the four extracted
+tabs of the recorded doctor through encode_tab / decode_tab / load_tab.
+"""
+
+import importlib.util
+import json
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import pytest
+
+from detail_codec import ZSTD_HEADER, decode_tab, encode_tab, load_tab
+from response_store import TAB_EXTRACTORS
+
+FIXTURES = Path(__file__).parent
+TAB_FIXTURES = {
+    'situation_data': 'captured_situation.html',
+    'dossier_data': 'captured_dossier.html',
+    'diplomes_data': 'captured_diplomes.html',
+    'personne_data': 'captured_personne.html',
+}
+
+
+ENCODINGS = ['pretty', 'json',
+             pytest.param('zstd', marks=pytest.mark.skipif(importlib.util.find_spec('zstandard') is None,
+                                                           reason='zstandard is not installed'))]
+
+
+@pytest.fixture(scope='module')
+def tabs():
+    """Extractor output (indented JSON) of the four recorded tabs"""
+    return {field: TAB_EXTRACTORS[field]((FIXTURES / name).read_text(encoding='utf-8'))
+            for field, name in TAB_FIXTURES.items()}
+
+
+@pytest.mark.parametrize('encoding', ENCODINGS)
+def test_round_trip(tabs, encoding):
+    for field, text in tabs.items():
+        stored = encode_tab(text, encoding)
+        assert json.loads(decode_tab(stored)) == json.loads(text), field
+        assert load_tab(stored) == json.loads(text), field
+        if encoding == 'pretty':
+            assert stored == text
+        elif encoding == 'json':
+            assert isinstance(stored, str) and len(stored) < len(text) and '\n' not in stored
+        else:
+            assert isinstance(stored, bytes) and stored.startswith(ZSTD_HEADER)
+            assert len(stored) < len(encode_tab(text, 'json').encode('utf-8'))
+
+
+@pytest.mark.parametrize('encoding', ENCODINGS)
+def test_missing_and_short_tabs_stay_text(encoding):
+    # LENGTH(column) > 10 must still tell a fetched tab from a missing one
+    for value in (None, '', '{}', '{"a": 1}'):
+        assert encode_tab(value, encoding) == value
+        assert decode_tab(encode_tab(value, encoding)) == value
+    assert load_tab(None) == {}
+    assert load_tab('not json') == {}
+
+
+def test_invalid_json_kept_verbatim():
+    text = '<html>not a tab</html>'
+    assert encode_tab(text, 'json') == text
+    assert decode_tab(text.encode('utf-8')) == text
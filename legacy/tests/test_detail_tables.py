@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Detail tables check: record_details spreads the recorded doctor's tabs over
+the normalized tables, and rebuild_details gives the same rows from the JSON
+columns of professionals.
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import pytest
+
+import config
+import parallel_scraper
+from detail_codec import encode_tab
+from detail_tables import departement, rebuild_details, record_details
+from response_store import TAB_EXTRACTORS
+
+FIXTURES = Path(__file__).parent
+TAB_FIXTURES = {
+    'situation_data': 'captured_situation.html',
+    'dossier_data': 'captured_dossier.html',
+    'diplomes_data': 'captured_diplomes.html',
+    'personne_data': 'captured_personne.html',
+}
+RPPS = '10006415128'
+TABLES = ('practice_situations', 'diplomas', 'authorizations', 'attributes')
+
+
+@pytest.fixture
+def doctor():
+    data = {'rpps': RPPS, 'name': 'FEVRE CATHERINE', 'address': '2 RUE DE LA GARE 71100 CHALON-SUR-SAONE'}
+    data.update({field: TAB_EXTRACTORS[field]((FIXTURES / name).read_text(encoding='utf-8'))
+                 for field, name in TAB_FIXTURES.items()})
+    return data
+
+
+@pytest.fixture
+def conn(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, 'DATABASE_PATH', str(tmp_path / 'details.db'))
+    monkeypatch.setattr(config, 'NORMALIZE_DETAILS', True)
+    parallel_scraper.create_database()
+    conn = sqlite3.connect(config.DATABASE_PATH)
+    yield conn
+    conn.close()
+
+
+def table_rows(conn):
+    return {table: sorted(conn.execute(f'SELECT * FROM {table}'), key=repr) for table in TABLES}
+
+
+def test_record_details(conn, doctor):
+    with conn:
+        record_details(conn, [doctor])
+
+    situation = conn.execute('SELECT departement, activity, siret, finess, naf FROM practice_situations').fetchall()
+    assert situation == [('71', 'Activité standard de soin ou de pharmacien', '77856436900198', '710009325', '88.10A')]
+    assert conn.execute('SELECT rpps, kind, code, label FROM diplomas').fetchall() == [
+        (RPPS, 'diplome', 'DIP319', "Titre d'Assistant Dentaire")]
+    assert not conn.execute('SELECT COUNT(*) FROM authorizations').fetchone()[0]
+    assert conn.execute('''SELECT value FROM attributes
+                           WHERE rpps = ? AND tab = 'dossier' AND label = 'Identifiant RPPS' ''',
+                        (RPPS,)).fetchall() == [(RPPS,)]
+    tabs = {tab for (tab,) in conn.execute('SELECT DISTINCT tab FROM attributes')}
+    assert tabs == {'situation', 'dossier', 'personne'}
+
+
+def test_failed_tab_keeps_previous_rows(conn, doctor):
+    with conn:
+        record_details(conn, [doctor])
+    before = table_rows(conn)
+
+    # Saved again, twice in one batch, without the diplomas tab: the last record wins for the others
+    resaved = dict(doctor, diplomes_data='', address='1 PLACE DU MARCHE 20000 AJACCIO')
+    with conn:
+        record_details(conn, [doctor, resaved])
+    after = table_rows(conn)
+
+    assert after['diplomas'] == before['diplomas']
+    assert after['attributes'] == before['attributes']
+    assert conn.execute('SELECT departement FROM practice_situations').fetchall() == [('2A',)]
+
+
+@pytest.mark.parametrize('encoding', ['pretty', 'json'])
+def test_rebuild_matches_record(conn, doctor, encoding):
+    with conn:
+        record_details(conn, [doctor])
+    expected = table_rows(conn)
+
+    stored = {field: encode_tab(doctor[field], encoding) for field in TAB_FIXTURES}
+    with conn:
+        conn.execute(f'''INSERT INTO professionals (rpps, name, address, {', '.join(stored)})
+                         VALUES (?, ?, ?, {', '.join('?' * len(stored))})''',
+                     (RPPS, doctor['name'], doctor['address'], *stored.values()))
+        for table in TABLES:
+            conn.execute(f'DELETE FROM {table}')
+
+    assert rebuild_details(conn) == 1
+    assert table_rows(conn) == expected
+    assert rebuild_details(conn, [RPPS]) == 1
+    assert table_rows(conn) == expected
+
+
+@pytest.mark.parametrize('address, code', [('75001 PARIS', '75'), ('20000 AJACCIO', '2A'), ('20200 BASTIA', '2B'),
+                                           ('97100 BASSE-TERRE', '971'), ('no postal code', None), (None, None)])
+def test_departement(address, code):
+    assert departement(address) == code
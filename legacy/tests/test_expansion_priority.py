@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Expansion planner check: pending prefixes are ranked by expected new
+doctors, and unlikely initial prefixes are not dispatched first once the
+database holds names.
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import pytest
+
+import config
+from smart_expansion import ExpansionPlanner
+
+NAMES = ['MARTIN Jean', 'MARCHAND Paul', 'MASSON Anne', 'DUPONT Marie', 'DURAND Luc', 'BERNARD Max']
+
+
+@pytest.fixture
+def planner(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'PRIORITIZE_FRONTIER', True)
+    db_path = tmp_path / 'names.db'
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE professionals (rpps TEXT PRIMARY KEY, name TEXT)')
+    conn.commit()
+    conn.close()
+    return ExpansionPlanner(str(db_path)), db_path
+
+
+def add_names(db_path, names):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany('INSERT INTO professionals VALUES (?, ?)', [(str(i), name) for i, name in enumerate(names)])
+    conn.close()
+
+
+def test_unscored_only_without_names(planner):
+    planner, _ = planner
+    assert set(planner.priorities(['ma', 'qx']).values()) == {ExpansionPlanner.UNSCORED}
+
+
+def test_initial_prefixes_by_expected_share(planner):
+    planner, db_path = planner
+    add_names(db_path, NAMES)
+    priorities = planner.priorities(['ma', 'du', 'qx', 'zz'])
+    assert priorities['ma'] > priorities['du'] > priorities['qx'] >= priorities['zz'] >= 0
+    assert max(priorities.values()) < ExpansionPlanner.UNSCORED
+    # Fewer new doctors expected, lower priority
+    assert planner.priority('ma', new_fraction=0.5) == pytest.approx(priorities['ma'] / 2)
+
+
+def test_children_by_parent_size(planner):
+    planner, db_path = planner
+    add_names(db_path, NAMES)
+    priorities = planner.priorities(['maa', 'mar', 'mas'], parent_size=300, new_fraction=0.5)
+    # 5 words start with 'ma' (first names too): martin, marchand, marie continue with 'r', masson with 's'
+    assert priorities['mar'] == pytest.approx(300 * 3 / 5 * 0.5)
+    assert priorities['mas'] == pytest.approx(300 * 1 / 5 * 0.5)
+    assert priorities['maa'] == 0
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Checkpoint/resume check: a pipeline run against the local mock site is
+interrupted right after a prefix is checkpointed, then resumed. The resumed
+run must not search a harvested prefix again, and must fetch every card left
+in detail_queue exactly once (SKIP_SEEN_DOCTORS on, so the same doctor listed
+again by a child prefix is not fetched twice).
+"""
+
+import collections
+import sqlite3
+import sys
+from pathlib import Path
+from urllib.parse import urlparse, parse_qsl
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import pytest
+
+import config
+import frontier
+import mock_annuaire
+import parallel_scraper
+import pipeline
+import rate_limiter
+import telemetry
+
+
+@pytest.fixture
+def mock_site(monkeypatch, tmp_path):
+    server = mock_annuaire.start(port=0, doctors=4000, seed=3)
+    base = f'http://127.0.0.1:{server.server_port}'
+    for name in ('HOME_URL', 'SEARCH_URL', 'RESULTS_URL', 'DETAILS_URL'):
+        monkeypatch.setattr(parallel_scraper, name,
+                            getattr(parallel_scraper, name).replace(parallel_scraper.BASE_URL, base))
+    for name, value in dict(DATABASE_PATH=str(tmp_path / 'resume.db'), ENGINE='pipeline', SMART_EXPANSION=True,
+                            MAX_DOCTORS_PER_PREFIX=0, SKIP_SEEN_DOCTORS=True, REFRESH=False,
+                            PRUNE_EXPANSION=False, RATE_LIMIT_INITIAL=1e6, RATE_LIMIT_MIN=1e6,
+                            RATE_LIMIT_MAX=1e6, RATE_LIMIT_BURST=1e6).items():
+        monkeypatch.setattr(config, name, value)
+    monkeypatch.setattr(telemetry, '_reporter', None)
+    monkeypatch.setattr(rate_limiter, '_limiter', None)
+
+    # Every search text and every detail RPPS the site is asked for
+    server.searches = collections.Counter()
+    server.details = collections.Counter()
+    handler = server.RequestHandlerClass
+    search = handler.state.directory.search
+    prepare = handler.prepare
+
+    def logged_search(text):
+        if text:
+            server.searches[text] += 1
+        return search(text)
+
+    def logged_prepare(self, kind):
+        if kind == 'detail':
+            query = dict(parse_qsl(urlparse(self.path).query))
+            server.details[query.get('_mapportlet_idRpps') or query.get('_resultatsportlet_idRpps')] += 1
+        return prepare(self, kind)
+
+    monkeypatch.setattr(handler.state.directory, 'search', logged_search)
+    monkeypatch.setattr(handler, 'prepare', logged_prepare)
+    parallel_scraper.create_database()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def interrupt_after(monkeypatch, harvests):
+    """Ctrl+C in the scheduler right after the given number of prefixes are checkpointed"""
+    mark_harvested = frontier.Frontier.mark_harvested
+    calls = []
+
+    def interrupted(self, prefix, *args, **kwargs):
+        result = mark_harvested(self, prefix, *args, **kwargs)
+        calls.append(prefix)
+        if len(calls) == harvests:
+            raise KeyboardInterrupt
+        return result
+
+    monkeypatch.setattr(frontier.Frontier, 'mark_harvested', interrupted)
+    return mark_harvested
+
+
+def test_resume_after_interrupt(mock_site, monkeypatch):
+    mark_harvested = interrupt_after(monkeypatch, 3)
+    monkeypatch.setattr(config, 'RESUME', False)
+    with pytest.raises(KeyboardInterrupt):
+        pipeline.pipeline_scrape(['b', 'c'], 2, 3)
+    monkeypatch.setattr(frontier.Frontier, 'mark_harvested', mark_harvested)
+
+    with sqlite3.connect(config.DATABASE_PATH) as conn:
+        harvested = {prefix for (prefix,) in conn.execute(
+            "SELECT prefix FROM frontier WHERE state IN ('harvested', 'done')")}
+        queued = {rpps for (rpps,) in conn.execute('SELECT rpps FROM detail_queue')}
+        remaining = {prefix for (prefix,) in conn.execute(
+            "SELECT prefix FROM frontier WHERE state IN ('pending', 'harvesting')")}
+        # Saved by the writer before the interrupt, but not yet marked done in detail_queue
+        saved = {rpps for (rpps,) in conn.execute(
+            'SELECT rpps FROM professionals WHERE LENGTH(personne_data) > 10')}
+    # The interrupted prefix's cards were queued but never dispatched, its children never harvested
+    assert len(harvested) == 3 and queued and remaining
+
+    mock_site.searches.clear()
+    mock_site.details.clear()
+    monkeypatch.setattr(config, 'RESUME', True)
+    pipeline.pipeline_scrape(['b', 'c'], 2, 3)
+
+    assert not harvested & set(mock_site.searches)
+    assert remaining <= set(mock_site.searches)
+    assert all(mock_site.details[rpps] == 1 for rpps in queued - saved)
+    assert not any(mock_site.details[rpps] for rpps in queued & saved)
+
+    resumed = frontier.Frontier(resume=True)
+    assert resumed.finished()
+    resumed.close()
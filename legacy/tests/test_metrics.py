@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Metrics check: two Registries (two worker processes) are merged and served
+in the Prometheus text format: summed counters, last gauge, cumulative
+histogram buckets with _sum and _count, escaped label values.
+"""
+
+import sys
+import urllib.error
+import urllib.request
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import pytest
+
+import metrics
+from metrics import LATENCY_BUCKETS, Registry
+
+
+@pytest.fixture
+def merged():
+    first, second = Registry(), Registry()
+    first.count('scraper_requests_total', endpoint='search', status=200)
+    first.count('scraper_requests_total', 2, endpoint='search', status=200)
+    second.count('scraper_requests_total', endpoint='search', status=503)
+    second.count('scraper_requests_total', status=200, endpoint='search')
+    first.set('scraper_queue_depth', 7, queue='doctors')
+    second.set('scraper_queue_depth', 3, queue='doctors')
+    first.observe('scraper_request_seconds', 0.03, endpoint='search')
+    first.observe('scraper_request_seconds', 0.2, endpoint='search')
+    second.observe('scraper_request_seconds', 0.1, endpoint='search')
+    second.observe('scraper_request_seconds', 60.0, endpoint='search')
+    second.count('scraper_http_responses_total', transport='requests', protocol='HTTP/1.1 "keep-alive"\\\n')
+
+    registry = Registry()
+    registry.merge(first)
+    registry.merge(second)
+    return registry
+
+
+def test_merge(merged):
+    assert merged.counters[('scraper_requests_total', (('endpoint', 'search'), ('status', 200)))] == 4
+    assert merged.total('scraper_requests_total') == 5
+    assert merged.gauges[('scraper_queue_depth', (('queue', 'doctors'),))] == 3
+    histogram = merged.histograms[('scraper_request_seconds', (('endpoint', 'search'),))]
+    # One count per bucket (le 0.1 is inclusive), the last one +Inf, then the sum
+    assert histogram == [1, 1, 1, 0, 0, 0, 0, 0, 0, 1, pytest.approx(60.33)]
+    assert len(histogram) == len(LATENCY_BUCKETS) + 2
+
+
+def test_exposition(merged):
+    lines = merged.exposition().splitlines()
+
+    assert '# TYPE scraper_requests_total counter' in lines
+    assert 'scraper_requests_total{endpoint="search",status="200"} 4' in lines
+    assert 'scraper_requests_total{endpoint="search",status="503"} 1' in lines
+    assert 'scraper_queue_depth{queue="doctors"} 3' in lines
+
+    assert '# TYPE scraper_request_seconds histogram' in lines
+    buckets = [line for line in lines if line.startswith('scraper_request_seconds_bucket')]
+    assert buckets == [f'scraper_request_seconds_bucket{{endpoint="search",le="{bound}"}} {count}'
+                       for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), (1, 2, 3, 3, 3, 3, 3, 3, 3, 4))]
+    assert 'scraper_request_seconds_count{endpoint="search"} 4' in lines
+    assert any(line.startswith('scraper_request_seconds_sum{endpoint="search"} 60.33') for line in lines)
+
+    # Backslash, double quote and newline are escaped in label values
+    assert ('scraper_http_responses_total{protocol="HTTP/1.1 \\"keep-alive\\"\\\\\\n",transport="requests"} 1'
+            in lines)
+    assert merged.exposition().endswith('\n')
+
+
+def test_serve(merged):
+    server = metrics.serve(merged.exposition, '127.0.0.1', 0)
+    try:
+        url = f'http://127.0.0.1:{server.server_port}'
+        with urllib.request.urlopen(f'{url}/metrics') as response:
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            assert response.read().decode('utf-8') == merged.exposition()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f'{url}/other')
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Rate limiter check: the AIMD controller of rate_limiter.RateLimiter
+(additive increase, multiplicative decrease with a cooldown, bucket drain).
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import pytest
+
+import config
+import rate_limiter
+from rate_limiter import RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake time.monotonic for the limiter, advanced by hand"""
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def limiter(monkeypatch, clock):
+    monkeypatch.setattr(config, 'RATE_LIMIT_DECREASE', 0.5)
+    monkeypatch.setattr(config, 'RATE_LIMIT_INCREASE', 0.5)
+    monkeypatch.setattr(config, 'RATE_LIMIT_LATENCY_TARGET', 2.0)
+    return RateLimiter(rate=10.0, min_rate=1.0, max_rate=60.0, burst=5)
+
+
+@pytest.mark.parametrize('status', [429, 403, 503, None])
+def test_decrease_on_backoff_status(limiter, status):
+    limiter.record(status, 0.1)
+    assert limiter.rate == 5.0
+    assert limiter.backoffs == 1
+    # The bucket is drained: the next request waits for a token at the new rate
+    assert limiter._take() == pytest.approx(1 / 5.0)
+
+
+def test_decrease_cooldown(limiter, clock):
+    # A burst of in-flight failures counts once
+    for _ in range(5):
+        limiter.record(503, 0.1)
+    assert limiter.rate == 5.0
+    assert limiter.backoffs == 1
+
+    clock[0] += rate_limiter.DECREASE_COOLDOWN
+    limiter.record(429, 0.1)
+    assert limiter.rate == 2.5
+    assert limiter.backoffs == 2
+
+
+def test_decrease_floor(limiter, clock):
+    for _ in range(10):
+        limiter.record(None, 0.1)
+        clock[0] += rate_limiter.DECREASE_COOLDOWN
+    assert limiter.rate == 1.0
+
+
+def test_increase_and_hold(limiter):
+    limiter.record(200, 0.1)
+    assert limiter.rate == pytest.approx(10.0 + 0.5 / 10.0)
+
+    # Slow responses and other 4xx hold the rate
+    rate = limiter.rate
+    limiter.record(200, 5.0)
+    limiter.record(404, 0.1)
+    assert limiter.rate == rate
+    assert limiter.backoffs == 0
+
+
+def test_increase_ceiling(monkeypatch, limiter):
+    monkeypatch.setattr(config, 'RATE_LIMIT_INCREASE', 1000.0)
+    limiter.record(200, 0.1)
+    assert limiter.rate == 60.0
+
+
+def test_token_bucket(limiter, clock):
+    # The burst goes through at once, then one token per 1/rate seconds
+    assert [limiter._take() for _ in range(5)] == [0] * 5
+    assert limiter._take() == pytest.approx(0.1)
+    clock[0] += 0.1
+    assert limiter._take() == 0
+    assert limiter.requests == 6
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Retry check: backoff_delay bounds, and a pipeline run against the local mock
+site with failing detail tabs. Tabs failing once are retried, tabs failing
+every attempt go to failed_requests, and --replay-failed fetches them later.
+"""
+
+import random
+import sqlite3
+import sys
+from pathlib import Path
+from urllib.parse import urlparse, parse_qsl
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import pytest
+
+import config
+import mock_annuaire
+import parallel_scraper
+import pipeline
+import rate_limiter
+import telemetry
+from retries import backoff_delay
+
+
+@pytest.fixture
+def backoff_config(monkeypatch):
+    monkeypatch.setattr(config, 'RETRY_BACKOFF_BASE', 1.0)
+    monkeypatch.setattr(config, 'RETRY_BACKOFF_MAX', 30.0)
+
+
+@pytest.mark.parametrize('attempt, ceiling', [(1, 1.0), (2, 2.0), (3, 4.0), (5, 16.0), (6, 30.0), (10, 30.0)])
+def test_backoff_delay_bounds(backoff_config, attempt, ceiling):
+    delays = [backoff_delay(attempt) for _ in range(200)]
+    assert all(0 <= delay <= ceiling for delay in delays)
+    # Full jitter: spread over the whole window, not pinned to the ceiling
+    assert min(delays) < ceiling / 4 and max(delays) > ceiling * 3 / 4
+
+
+def test_backoff_delay_retry_after(backoff_config, monkeypatch):
+    monkeypatch.setattr(random, 'uniform', lambda low, high: low)
+    assert backoff_delay(1, '7') == 7
+    assert backoff_delay(1, 7) == 7
+    # Capped at RETRY_BACKOFF_MAX, HTTP-date values ignored
+    assert backoff_delay(1, '120') == 30.0
+    assert backoff_delay(1, 'Wed, 21 Oct 2026 07:28:00 GMT') == 0
+
+
+# Tab action of the mock → column of the professionals table
+BROKEN_TAB = ('detailsPPDiplomes', 'diplomes_data')
+FLAKY_TAB = 'detailsPPPersonne'
+
+
+@pytest.fixture
+def flaky_site(monkeypatch, tmp_path):
+    """
+    Mock site where the diplomas tab of every RPPS ending in 0 or 5 fails
+    until server.broken is cleared, and the personne tab of every RPPS
+    ending in 1 fails once
+    """
+    server = mock_annuaire.start(port=0, doctors=1500, seed=3)
+    base = f'http://127.0.0.1:{server.server_port}'
+    for name in ('HOME_URL', 'SEARCH_URL', 'RESULTS_URL', 'DETAILS_URL'):
+        monkeypatch.setattr(parallel_scraper, name,
+                            getattr(parallel_scraper, name).replace(parallel_scraper.BASE_URL, base))
+    for name, value in dict(DATABASE_PATH=str(tmp_path / 'retries.db'), SKIP_SEEN_DOCTORS=False, REFRESH=False,
+                            RESUME=False, MAX_DOCTORS_PER_PREFIX=0, RETRY_ATTEMPTS=2, RETRY_BACKOFF_BASE=0.01,
+                            RATE_LIMIT_INITIAL=1e6, RATE_LIMIT_MIN=1e6, RATE_LIMIT_MAX=1e6,
+                            RATE_LIMIT_BURST=1e6).items():
+        monkeypatch.setattr(config, name, value)
+    monkeypatch.setattr(telemetry, '_reporter', None)
+    monkeypatch.setattr(rate_limiter, '_limiter', None)
+
+    server.broken = True
+    server.flaky = set()
+    handler = server.RequestHandlerClass
+    prepare = handler.prepare
+
+    def failing_prepare(self, kind):
+        if not prepare(self, kind):
+            return False
+        if kind != 'tab':
+            return True
+        query = dict(parse_qsl(urlparse(self.path).query))
+        action = query.get('_mapportlet_javax.portlet.action') or query.get('_resultatsportlet_javax.portlet.action')
+        rpps = query.get('_mapportlet_idRpps') or query.get('_resultatsportlet_idRpps', '')
+        broken = action == BROKEN_TAB[0] and rpps[-1] in '05' and server.broken
+        flaky = action == FLAKY_TAB and rpps[-1] == '1' and rpps not in server.flaky
+        if flaky:
+            server.flaky.add(rpps)
+        if broken or flaky:
+            self.send('Service Unavailable', 503)
+            return False
+        return True
+
+    monkeypatch.setattr(handler, 'prepare', failing_prepare)
+    parallel_scraper.create_database()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_dead_letter_and_replay(flaky_site):
+    pipeline.pipeline_scrape(['b', 'c'], 2, 3, expand=False)
+
+    with sqlite3.connect(config.DATABASE_PATH) as conn:
+        saved = {rpps for (rpps,) in conn.execute('SELECT rpps FROM professionals')}
+        failed = set(conn.execute('SELECT rpps, tab FROM failed_requests'))
+        complete = {rpps for (rpps,) in conn.execute('''
+            SELECT rpps FROM professionals
+            WHERE LENGTH(personne_data) > 10 AND LENGTH(diplomes_data) > 10''')}
+    broken = {rpps for rpps in saved if rpps[-1] in '05'}
+    assert broken and flaky_site.flaky
+    # Only the tab failing on every attempt is dead-lettered, the doctor is saved without it
+    assert failed == {(rpps, BROKEN_TAB[1]) for rpps in broken}
+    assert complete == saved - broken
+
+    flaky_site.broken = False
+    parallel_scraper.replay_failed(2)
+
+    with sqlite3.connect(config.DATABASE_PATH) as conn:
+        assert not conn.execute('SELECT COUNT(*) FROM failed_requests').fetchone()[0]
+        complete = {rpps for (rpps,) in conn.execute('''
+            SELECT rpps FROM professionals
+            WHERE LENGTH(personne_data) > 10 AND LENGTH(diplomes_data) > 10''')}
+    assert complete == saved
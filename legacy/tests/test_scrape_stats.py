@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Stats triggers check: after upserts, a change of search prefix, a completed
+situation tab and deletes, scrape_stats and prefix_stats hold what recount()
+computes from professionals.
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import pytest
+
+import config
+import parallel_scraper
+from parallel_scraper import UPSERT_DOCTOR_SQL, doctor_row
+from scrape_stats import recount
+
+SITUATION = '{"ACTIVITÉ": {"Genre d\'activité": "Activité standard de soin ou de pharmacien"}}'
+
+
+@pytest.fixture
+def conn(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, 'DATABASE_PATH', str(tmp_path / 'stats.db'))
+    parallel_scraper.create_database()
+    conn = sqlite3.connect(config.DATABASE_PATH)
+    yield conn
+    conn.close()
+
+
+def doctor(rpps, prefix, complete=True):
+    return {'rpps': rpps, 'name': f'DOCTOR {rpps}', 'prefix': prefix,
+            'situation_data': SITUATION if complete else '{}'}
+
+
+def upsert(conn, *doctors):
+    with conn:
+        conn.executemany(UPSERT_DOCTOR_SQL, [doctor_row(data) for data in doctors])
+
+
+def stats(conn):
+    """Both stats tables, without the prefixes left at zero (recount does not list them)"""
+    return (conn.execute('SELECT doctors, complete FROM scrape_stats').fetchall(),
+            conn.execute('SELECT search_prefix, doctors, complete FROM prefix_stats '
+                         'WHERE doctors > 0 ORDER BY search_prefix').fetchall())
+
+
+def assert_recounted(conn):
+    triggered = stats(conn)
+    recount(conn)
+    assert triggered == stats(conn)
+    return triggered
+
+
+def test_triggers_match_recount(conn):
+    upsert(conn, doctor('1', 'ba'), doctor('2', 'ba', complete=False), doctor('3', 'be'), doctor('4', 'bo'))
+    assert assert_recounted(conn) == ([(4, 3)], [('ba', 2, 1), ('be', 1, 1), ('bo', 1, 1)])
+
+    # Upsert of a known doctor: its situation tab is now fetched
+    upsert(conn, doctor('2', 'ba'))
+    assert assert_recounted(conn) == ([(4, 4)], [('ba', 2, 2), ('be', 1, 1), ('bo', 1, 1)])
+
+    # Listed again under another prefix, this time without its situation tab
+    upsert(conn, doctor('1', 'bel', complete=False))
+    assert assert_recounted(conn) == ([(4, 3)], [('ba', 1, 1), ('be', 1, 1), ('bel', 1, 0), ('bo', 1, 1)])
+
+    with conn:
+        conn.execute("DELETE FROM professionals WHERE rpps IN ('3', '1')")
+    assert assert_recounted(conn) == ([(2, 2)], [('ba', 1, 1), ('bo', 1, 1)])
+
+
+def test_counted_when_created(conn):
+    # A database filled before the stats tables existed is counted when they are created
+    upsert(conn, doctor('1', 'ba'), doctor('2', 'be', complete=False))
+    with conn:
+        conn.execute('DROP TABLE scrape_stats')
+        conn.execute('DROP TABLE prefix_stats')
+        for trigger in ('insert', 'update', 'delete'):
+            conn.execute(f'DROP TRIGGER professionals_stats_{trigger}')
+    parallel_scraper.create_database()
+    assert assert_recounted(conn) == ([(2, 1)], [('ba', 1, 1), ('be', 1, 0)])
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Telemetry check: a Reporter sends its counts as one batch per
+TELEMETRY_INTERVAL (or when a prefix is done), and the Monitor merges the
+batches of pool workers into the totals of its progress line.
+"""
+
+import queue
+import sys
+from multiprocessing import Pool
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import pytest
+
+import config
+import telemetry
+from rate_limiter import pool_options
+
+DOCTORS_PER_PREFIX = 50
+
+
+def report_prefix(prefix):
+    """Worker task: report every doctor of a prefix, then the prefix as done"""
+    progress = telemetry.reporter()
+    for idx in range(1, DOCTORS_PER_PREFIX + 1):
+        progress.doctor(prefix, idx, DOCTORS_PER_PREFIX, has_details=idx % 2 == 0, is_duplicate=idx % 10 == 0)
+        progress.count('scraper_requests_total', endpoint='search', status=200)
+    progress.done(prefix)
+
+
+@pytest.fixture(autouse=True)
+def no_channel(monkeypatch):
+    monkeypatch.setattr(telemetry, '_channel', None)
+    monkeypatch.setattr(telemetry, '_reporter', None)
+    monkeypatch.setattr(config, 'METRICS_PORT', 0)
+
+
+def test_reporter_batches():
+    channel = queue.Queue()
+    progress = telemetry.Reporter(channel, interval=3600)
+    for idx in range(1, 11):
+        progress.doctor('ba', idx, 20, has_details=True)
+    # Nothing is sent before the interval
+    assert channel.empty()
+
+    progress.flush()
+    registry, prefixes, profiles = channel.get_nowait()
+    assert registry.total('scraper_doctors_total') == 10
+    assert registry.total('scraper_doctors_with_details_total') == 10
+    assert prefixes == {'ba': (10, 20)} and profiles == []
+
+    # An empty batch is not sent, a done prefix is sent right away
+    progress.flush()
+    assert channel.empty()
+    progress.done('ba')
+    assert channel.get_nowait()[1] == {'ba': None}
+    assert channel.empty()
+
+
+def test_reporter_interval_elapsed():
+    channel = queue.Queue()
+    progress = telemetry.Reporter(channel, interval=0)
+    progress.count('scraper_db_rows_total')
+    progress.count('scraper_db_rows_total')
+    assert channel.qsize() == 2
+
+
+def test_monitor_merges_worker_batches(monkeypatch):
+    monkeypatch.setattr(config, 'TELEMETRY_INTERVAL', 3600)
+    prefixes = ['ba', 'be', 'bi', 'bo']
+    lines = []
+    batches = []
+    merge = telemetry.Monitor.merge
+
+    def counted_merge(self, batch):
+        batches.append(batch)
+        merge(self, batch)
+
+    monkeypatch.setattr(telemetry.Monitor, 'merge', counted_merge)
+    with telemetry.Monitor(lines.append, interval=3600) as monitor:
+        with Pool(processes=2, **pool_options()) as pool:
+            pool.map(report_prefix, prefixes)
+
+    # One batch per prefix for 2 × 50 reports each, not one message per report
+    assert len(batches) == len(prefixes)
+    total = DOCTORS_PER_PREFIX * len(prefixes)
+    assert monitor.metrics.total('scraper_doctors_total') == total
+    assert monitor.metrics.total('scraper_requests_total') == total
+    assert monitor.prefixes == {}
+    assert lines[-1].startswith(f"   Progress: {total} doctors (")
+    assert lines[-1].endswith(f"{total // 2} with details, {total // 10} duplicates")
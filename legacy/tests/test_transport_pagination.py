@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Transport check: a prefix with several result pages is paginated through
+every worker transport (transport.py) against the local mock site.
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import pytest
+
+import config
+import mock_annuaire
+import parallel_scraper
+import telemetry
+import transport
+
+
+@pytest.fixture
+def mock_site(monkeypatch):
+    server = mock_annuaire.start(port=0, doctors=300, seed=3)
+    base = f'http://127.0.0.1:{server.server_port}'
+    for name in ('HOME_URL', 'SEARCH_URL', 'RESULTS_URL', 'DETAILS_URL'):
+        monkeypatch.setattr(parallel_scraper, name,
+                            getattr(parallel_scraper, name).replace(parallel_scraper.BASE_URL, base))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize('name', ['requests', 'httpx'])
+def test_paginate_prefix(mock_site, monkeypatch, name):
+    if name == 'httpx' and transport.httpx is None:
+        pytest.skip('httpx[http2] is not installed')
+    monkeypatch.setattr(config, 'TRANSPORT', name)
+    monkeypatch.setattr(telemetry, '_reporter', None)
+
+    worker = parallel_scraper.WorkerSession(parallel_scraper.create_session())
+    assert worker.ensure_p_auth()
+    cards, total_results = parallel_scraper.harvest_cards(worker, 'b')
+
+    # More than one page: the pagination requests (with PAGINATION_HEADERS) went through
+    assert len(cards) > 10
+    assert len(cards) == min(total_results, 10 * config.MAX_PAGES)
+    responses = telemetry.reporter().metrics.counters
+    assert any(metric == 'scraper_http_responses_total' and dict(labels)['transport'] == name
+               for metric, labels in responses)
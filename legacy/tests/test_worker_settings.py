@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Worker settings check: config values set at run time by the scheduler
+(--refresh, --profile) reach pool workers through the pool initializer, also when
+they are started with spawn and import config afresh.
+"""
+
+import multiprocessing as mp
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import config
+import rate_limiter
+import telemetry
+from rate_limiter import WORKER_SETTINGS, pool_options
+
+
+def worker_settings(_):
+    return {name: getattr(config, name) for name in WORKER_SETTINGS}
+
+
+def test_settings_reach_spawned_workers(monkeypatch):
+    monkeypatch.setattr(telemetry, '_channel', None)
+    # The shared limiter must come from the spawn context too
+    monkeypatch.setattr(rate_limiter, '_limiter', None)
+    for name in WORKER_SETTINGS:
+        monkeypatch.setattr(config, name, not getattr(config, name))
+    expected = {name: getattr(config, name) for name in WORKER_SETTINGS}
+
+    start_method = mp.get_start_method()
+    mp.set_start_method('spawn', force=True)
+    try:
+        with mp.Pool(processes=1, **pool_options()) as pool:
+            assert pool.map(worker_settings, [0]) == [expected]
+    finally:
+        mp.set_start_method(start_method, force=True)
@@ -4,6 +4,10 @@
 import sqlite3
 import json
 import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from detail_codec import decode_tab
 
 db_path = sys.argv[1] if len(sys.argv) > 1 else "db/test_single_doctor.db"
 
@@ -19,7 +23,8 @@ cur.execute('''SELECT rpps, name, profession, organization, address, phone, emai
                situation_data, dossier_data, diplomes_data, personne_data
                FROM professionals''')
 
-rows = cur.fetchall()
+# Detail columns may be minified or zstd-compressed (DETAIL_ENCODING), back to JSON text
+rows = [row[:7] + tuple(decode_tab(value) for value in row[7:]) for row in cur.fetchall()]
 
 print(f"Total doctors in database: {len(rows)}\n")
 
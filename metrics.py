@@ -0,0 +1,168 @@
+"""
+Live metrics of a run, served in the Prometheus text format.
+
+Every process records counters, gauges and histograms in the Registry of
+its telemetry.Reporter; the registries travel with the progress batches
+and are merged by the Monitor of the main process, which serves them on
+http://METRICS_HOST:METRICS_PORT/metrics for the whole run:
+
+    scraper_requests_total{endpoint,status}   every request attempt; endpoint is
+                                              home, search, pagination or the
+                                              portlet action (DetailsPPAction,
+                                              infoDetailPP, detailsPP...)
+    scraper_request_seconds{endpoint}         latency histogram
+    scraper_response_bytes_total{endpoint}    response body sizes
+    scraper_connections_opened_total{transport}       connection reuse =
+    scraper_http_responses_total{transport,protocol}  1 - opened / responses
+    scraper_extraction_seconds{tab}           extractor time per detail tab
+    scraper_db_write_seconds                  commit of a batch (or of one doctor)
+    scraper_queue_depth{queue}                work waiting in the scheduler
+    scraper_pool_workers{pool}                pool sizes, with
+    scraper_worker_busy_seconds_total{pool}   utilization = rate(busy) / workers
+
+Values of worker processes are at most TELEMETRY_INTERVAL seconds behind.
+"""
+
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+EXTRACTION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+DB_WRITE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+# name → (type, help, histogram buckets)
+METRICS = {
+    'scraper_requests_total': ('counter', 'HTTP request attempts by endpoint and status', None),
+    'scraper_request_seconds': ('histogram', 'HTTP request latency by endpoint', LATENCY_BUCKETS),
+    'scraper_response_bytes_total': ('counter', 'Response body bytes by endpoint', None),
+    'scraper_connections_opened_total': ('counter', 'HTTP connections opened by transport', None),
+    'scraper_http_responses_total': ('counter', 'HTTP responses by transport and protocol version', None),
+    'scraper_extraction_seconds': ('histogram', 'Extraction time of a detail tab', EXTRACTION_BUCKETS),
+    'scraper_db_write_seconds': ('histogram', 'Duration of a database write transaction', DB_WRITE_BUCKETS),
+    'scraper_db_rows_total': ('counter', 'Doctors written to the database', None),
+    'scraper_doctors_total': ('counter', 'Doctors saved', None),
+    'scraper_doctors_with_details_total': ('counter', 'Doctors saved with all 4 detail tabs', None),
+    'scraper_doctors_duplicate_total': ('counter', 'Doctors saved that were already in the database', None),
+    'scraper_queue_depth': ('gauge', 'Work items waiting in the scheduler by queue', None),
+    'scraper_pool_workers': ('gauge', 'Workers (processes or sessions) by pool', None),
+    'scraper_worker_busy_seconds_total': ('counter', 'Seconds spent on tasks by the workers of a pool', None),
+    'scraper_rate_limit_rps': ('gauge', 'Current global request rate limit', None),
+    'scraper_rate_limit_backoffs_total': ('counter', 'Multiplicative decreases of the rate limit', None),
+    'scraper_uptime_seconds': ('gauge', 'Seconds since the run started', None),
+}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Registry:
+    """Counters, gauges and histograms keyed by (name, labels)"""
+
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def __bool__(self):
+        return bool(self.counters or self.gauges or self.histograms)
+
+    def count(self, name, value=1, **labels):
+        key = _key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        self.gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        buckets = METRICS[name][2]
+        entry = self.histograms.get(key)
+        if entry is None:
+            # Count per bucket (the last one is +Inf), then the sum
+            entry = self.histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        entry[bisect.bisect_left(buckets, value)] += 1
+        entry[-1] += value
+
+    def total(self, name):
+        """Sum of a counter over all its labels"""
+        return sum(value for (metric, _), value in self.counters.items() if metric == name)
+
+    def merge(self, other):
+        """Add the counters and histograms of another registry, take its gauges"""
+        for key, value in other.counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        self.gauges.update(other.gauges)
+        for key, entry in other.histograms.items():
+            mine = self.histograms.get(key)
+            if mine is None:
+                self.histograms[key] = list(entry)
+            else:
+                for i, value in enumerate(entry):
+                    mine[i] += value
+
+    def exposition(self):
+        """The registry in the Prometheus text format (version 0.0.4)"""
+        series = {}
+        for values in (self.counters, self.gauges, self.histograms):
+            for (name, labels), value in values.items():
+                series.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            if name not in series:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(series[name]):
+                if kind != 'histogram':
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), value):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", str(bound)),))} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(value[-1])}')
+                lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(render, host, port):
+    """
+    Serve render() (exposition text) on http://host:port/metrics from a
+    daemon thread. Returns the server (call shutdown() to stop it).
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.render = render
+    threading.Thread(target=server.serve_forever, name='MetricsServer', daemon=True).start()
+    return server
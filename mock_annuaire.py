@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for annuaire.sante.fr, for benchmarks and offline runs.
+
+Replays the responses recorded in legacy/tests (home/search page, detail
+tabs) over a synthetic directory of N doctors, with the same URLs, session
+cookie, p_auth token and 10-cards-per-page pagination as the real site:
+
+    GET  /web/site-pro                       home page (search form with p_auth)
+    POST /web/site-pro/home                  search → page 1 of the results
+    GET  /web/site-pro/recherche/resultats   pagination (_resultatportlet_cur)
+    POST /web/site-pro/recherche/resultats   DetailsPPAction / infoDetailPP (situation tab)
+    POST /web/site-pro/information-detaillees  detailsPPDossierPro / Diplomes / Personne
+    GET  /__stats                            request counters (JSON)
+
+A search matches doctors whose surname starts with the text; like the real
+site only the first 100 are listed, but span.nombre shows the full count.
+Search and DetailsPPAction with a p_auth that is not the session's are
+rejected with the home page, and --session-ttl expires sessions (new
+JSESSIONID and p_auth) to exercise the scrapers' p_auth refresh.
+
+Usage:
+    python mock_annuaire.py --doctors 20000 --latency 0.05 --error-rate 0.01
+then set BASE_URL = 'http://localhost:8765' in config.py.
+"""
+
+import argparse
+import bisect
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qsl
+
+FIXTURES = Path(__file__).parent / 'legacy' / 'tests'
+
+# Recorded responses: page template for search/pagination, one page per detail tab
+SEARCH_TEMPLATE = 'page1_actual.html'
+TAB_FIXTURES = {
+    'infoDetailPP': 'captured_situation.html',
+    'detailsPPDossierPro': 'captured_dossier.html',
+    'detailsPPDiplomes': 'captured_diplomes.html',
+    'detailsPPPersonne': 'captured_personne.html',
+}
+RECORDED_RPPS = '10006415128'
+
+MAX_RESULTS = 100
+PAGE_SIZE = 10
+
+SYLLABLES = ['ba', 'be', 'bou', 'ca', 'char', 'chau', 'da', 'de', 'du', 'fa', 'fon', 'ga', 'gi', 'gre',
+             'la', 'le', 'lou', 'ma', 'mar', 'mi', 'mo', 'na', 'ne', 'pa', 'pe', 'pi', 'ra', 're', 'ri',
+             'ro', 'sa', 'se', 'si', 'ta', 'te', 'ti', 'tou', 'va', 've', 'vi', 'gue', 'lin', 'net', 'ard',
+             'ier', 'ot', 'on', 'in', 'et', 'and', 'eau', 'ez', 'y']
+FIRST_NAMES = ['Jean', 'Marie', 'Pierre', 'Anne', 'Michel', 'Sophie', 'Nicolas', 'Claire', 'Luc',
+               'Camille', 'Thomas', 'Julie', 'Philippe', 'Isabelle', 'Paul', 'Catherine']
+PROFESSIONS = ['Médecin', 'Infirmier', 'Pharmacien', 'Chirurgien-Dentiste', 'Masseur-Kinésithérapeute',
+               'Sage-Femme', 'Pédicure-Podologue', 'Orthophoniste']
+CITIES = ['75001 PARIS', '69002 LYON', '13001 MARSEILLE', '31000 TOULOUSE', '33000 BORDEAUX', '59000 LILLE']
+
+
+class Directory:
+    """Synthetic doctors, sorted by surname for prefix searches"""
+
+    def __init__(self, size, seed=0):
+        rng = random.Random(seed)
+        doctors = []
+        for i in range(size):
+            surname = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).upper()
+            doctors.append({
+                'rpps': f'1{i:010d}',
+                'surname': surname,
+                'first_name': rng.choice(FIRST_NAMES),
+                'profession': rng.choice(PROFESSIONS),
+                'city': rng.choice(CITIES),
+                'street': f'{rng.randint(1, 200)} rue {rng.choice(SYLLABLES).capitalize()}',
+                'phone': f'0{rng.randint(1, 5)} {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)}',
+                'index': i,
+            })
+        doctors.sort(key=lambda d: (d['surname'], d['rpps']))
+        self.doctors = doctors
+        self.keys = [d['surname'].lower() for d in doctors]
+
+    def search(self, text):
+        """All doctors whose surname starts with text (case-insensitive)"""
+        text = text.lower().strip()
+        if not text:
+            return []
+        start = bisect.bisect_left(self.keys, text)
+        end = bisect.bisect_left(self.keys, text + '\uffff')
+        return self.doctors[start:end]
+
+
+def render_card(doctor, p_auth, result_index):
+    i = doctor['index']
+    href = ('/web/site-pro/recherche/resultats?p_p_id=mapportlet&amp;p_p_lifecycle=1&amp;p_p_state=normal'
+            '&amp;p_p_mode=view&amp;_mapportlet_javax.portlet.action=DetailsPPAction'
+            f'&amp;_mapportlet_idSituExe={i}&amp;_mapportlet_idExePro={i}&amp;_mapportlet_resultatIndex={result_index}'
+            f'&amp;_mapportlet_idRpps={doctor["rpps"]}&amp;_mapportlet_siteId={i % 997}'
+            f'&amp;_mapportlet_coordonneesId={i}&amp;_mapportlet_etatPP=OUVERT&amp;p_auth={p_auth}')
+    email = f'{doctor["first_name"].lower()}.{doctor["surname"].lower()}@medecin.mssante.fr'
+    return f'''
+    <div class="contenant_resultat">
+        <div class="nom_prenom"><a href="{href}" title="Voir la fiche">{doctor["surname"]} {doctor["first_name"]}</a></div>
+        <div class="profession">{doctor["profession"]}</div>
+        <div class="adresse">{doctor["street"]}<br />{doctor["city"]}</div>
+        <div class="tel">{doctor["phone"]}</div>
+        <div class="mssante"><span class="mssante_txt">{email}</span></div>
+    </div>'''
+
+
+class MockState:
+    """Everything the request handler needs, shared by all its threads"""
+
+    def __init__(self, doctors, latency=0.0, error_rate=0.0, seed=0, session_ttl=0.0):
+        self.directory = Directory(doctors, seed)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.session_ttl = session_ttl
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'home': 0, 'search': 0, 'page': 0, 'detail': 0, 'tab': 0,
+                      'sessions': 0, 'rejected': 0}
+
+        template = (FIXTURES / SEARCH_TEMPLATE).read_text(encoding='utf-8')
+        # Cards go between the two column separators of the results block
+        head, marker, tail = re.split(r'(<div class="separateur_col"></div>\s*<div class="separateur_col"></div>)',
+                                      template, maxsplit=1)
+        self.search_head = re.sub(r'p_auth=\w+', 'p_auth=__P_AUTH__', head)
+        self.search_tail = tail
+        self.search_marker = marker
+        self.tabs = {action: (FIXTURES / name).read_text(encoding='utf-8') for action, name in TAB_FIXTURES.items()}
+
+    def count(self, kind):
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats[kind] += 1
+
+    def session(self, session_id):
+        with self.lock:
+            if session_id not in self.sessions:
+                self.stats['sessions'] += 1
+                self.sessions[session_id] = {'p_auth': uuid.uuid4().hex[:8], 'text': '', 'created': time.monotonic()}
+            return self.sessions[session_id]
+
+    def is_live(self, session_id):
+        """False for unknown or expired sessions (the server hands out a new one)"""
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return False
+            if self.session_ttl and time.monotonic() - session['created'] > self.session_ttl:
+                del self.sessions[session_id]
+                return False
+            return True
+
+    def reject(self, session):
+        """Response to an action with a wrong p_auth: the home page of the session"""
+        with self.lock:
+            self.stats['rejected'] += 1
+        return self.results_page(dict(session, text=''), 1)
+
+    def results_page(self, session, page):
+        matches = self.directory.search(session['text'])
+        listed = matches[:MAX_RESULTS]
+        start = (page - 1) * PAGE_SIZE
+        cards = ''.join(render_card(doctor, session['p_auth'], start + n)
+                        for n, doctor in enumerate(listed[start:start + PAGE_SIZE]))
+        head = self.search_head.replace('__P_AUTH__', session['p_auth'])
+        head = head.replace('<span class="nombre">00</span>', f'<span class="nombre">{len(matches)}</span>')
+        tail = self.search_tail
+        if len(matches) > MAX_RESULTS:
+            tail = tail.replace('if(false){', 'if(true){')
+        return head + self.search_marker + cards + tail
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, body, status=200, content_type='text/html; charset=utf-8'):
+        payload = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        if self.new_session:
+            self.send_header('Set-Cookie', f'JSESSIONID={self.session_id}; Path=/; HttpOnly')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def prepare(self, kind):
+        """Session lookup, counters, simulated latency and errors. False if an error was sent."""
+        cookies = dict(part.strip().split('=', 1) for part in (self.headers.get('Cookie') or '').split(';') if '=' in part)
+        self.session_id = cookies.get('JSESSIONID')
+        self.new_session = not self.state.is_live(self.session_id)
+        if self.new_session:
+            self.session_id = uuid.uuid4().hex
+        self.state.count(kind)
+
+        if self.state.latency:
+            time.sleep(random.uniform(0.5, 1.5) * self.state.latency)
+        if self.state.error_rate and random.random() < self.state.error_rate:
+            with self.state.lock:
+                self.state.stats['errors'] += 1
+            self.send('Service Unavailable', 503)
+            return False
+        return True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = dict(parse_qsl(url.query))
+
+        if url.path == '/__stats':
+            self.new_session = False
+            with self.state.lock:
+                stats = dict(self.state.stats)
+            return self.send(json.dumps(stats), content_type='application/json')
+
+        if url.path == '/web/site-pro':
+            if self.prepare('home'):
+                session = self.state.session(self.session_id)
+                self.send(self.state.results_page(dict(session, text=''), 1))
+            return
+
+        if url.path == '/web/site-pro/recherche/resultats':
+            if self.prepare('page'):
+                page = int(query.get('_resultatportlet_cur', '1') or 1)
+                self.send(self.state.results_page(self.state.session(self.session_id), page))
+            return
+
+        self.new_session = False
+        self.send('Not Found', 404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = dict(parse_qsl(url.query))
+        length = int(self.headers.get('Content-Length') or 0)
+        form = dict(parse_qsl(self.rfile.read(length).decode('utf-8'))) if length else {}
+
+        if url.path == '/web/site-pro/home':
+            if self.prepare('search'):
+                session = self.state.session(self.session_id)
+                if form.get('p_auth') != session['p_auth']:
+                    return self.send(self.state.reject(session))
+                text = next((v for k, v in form.items() if k.endswith('_texttofind')), '')
+                session['text'] = text
+                self.send(self.state.results_page(session, 1))
+            return
+
+        action = query.get('_mapportlet_javax.portlet.action') or query.get('_resultatsportlet_javax.portlet.action')
+        rpps = query.get('_mapportlet_idRpps') or query.get('_resultatsportlet_idRpps', '')
+
+        if action == 'DetailsPPAction':
+            if self.prepare('detail'):
+                session = self.state.session(self.session_id)
+                if query.get('p_auth') != session['p_auth']:
+                    return self.send(self.state.reject(session))
+                session['rpps'] = rpps
+                self.send(self.state.results_page(dict(session, text=''), 1))
+            return
+
+        if action in self.state.tabs:
+            if self.prepare('tab'):
+                session = self.state.session(self.session_id)
+                page = self.state.tabs[action].replace(RECORDED_RPPS, rpps)
+                self.send(re.sub(r'p_auth=\w+', f"p_auth={session['p_auth']}", page))
+            return
+
+        self.new_session = False
+        self.send('Not Found', 404)
+
+
+def start(port=8765, doctors=1000, latency=0.0, error_rate=0.0, seed=0, session_ttl=0.0):
+    """Start the mock in a background thread, returns the server (server.shutdown() to stop)"""
+    handler = type('MockHandler', (Handler,), {'state': MockState(doctors, latency, error_rate, seed, session_ttl)})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def serve(port=8765, doctors=1000, latency=0.0, error_rate=0.0, seed=0, session_ttl=0.0):
+    """Run the mock in the foreground (blocking)"""
+    server = start(port, doctors, latency, error_rate, seed, session_ttl)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local mock of annuaire.sante.fr')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--doctors', type=int, default=1000, help='size of the synthetic directory')
+    parser.add_argument('--latency', type=float, default=0.0, help='mean response latency (seconds)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    parser.add_argument('--session-ttl', type=float, default=0.0, help='session lifetime in seconds (0: never expire)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"Mock annuaire on http://localhost:{args.port} - {args.doctors} doctors, "
+          f"latency {args.latency}s, error rate {args.error_rate:.1%}")
+    serve(args.port, args.doctors, args.latency, args.error_rate, args.seed, args.session_ttl)
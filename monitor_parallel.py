@@ -2,6 +2,13 @@
 """
 Real-time monitor for parallel_scraper.py
 Shows live progress and statistics
+
+Reads the running counts of scrape_stats.py (kept by triggers) over one
+read-only connection, so a refresh costs the same on a database of 1,000
+or 1,000,000 doctors and never takes a lock the writer waits for (WAL).
+The coverage line comes from the frontier and those counts only; the
+capture-recapture estimate, which reads every capture, is left to
+`python coverage_estimator.py`.
 """
 
 import sqlite3
@@ -9,58 +16,60 @@ import time
 import os
 import sys
 
+import config
+from coverage_estimator import coverage_report, format_duration
+from scrape_stats import totals, top_prefixes, recent_doctors
+
+# Seconds between two coverage estimates (they read the whole frontier)
+COVERAGE_INTERVAL = 30
+
+# Prefixes shown, the ones with the most doctors
+TOP_PREFIXES = 20
+
 def clear_screen():
     os.system('cls' if os.name == 'nt' else 'clear')
 
 def monitor():
-    db_path = 'db/health_professionals.db'
+    db_path = config.DATABASE_PATH
     
     if not os.path.exists(db_path):
         print(f"Database not found: {db_path}")
         print("Run: python parallel_scraper.py")
         return
     
+    # One read-only connection for the whole session: each query is a short WAL read
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, timeout=config.DB_TIMEOUT)
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'scrape_stats'").fetchone():
+        print("No scrape_stats table yet: start parallel_scraper.py (or run python scrape_stats.py) once")
+        conn.close()
+        return
+    
     start_time = time.time()
-    prev_count = 0
+    total = elapsed = 0
+    first_count = prev_count = None
+    coverage = None
+    coverage_at = 0
     
     try:
         while True:
             clear_screen()
             
-            conn = sqlite3.connect(db_path)
-            c = conn.cursor()
-            
-            # Total count
-            c.execute('SELECT COUNT(*) FROM professionals')
-            total = c.fetchone()[0]
-            
-            # By prefix
-            c.execute('''
-                SELECT search_prefix, COUNT(*) 
-                FROM professionals 
-                GROUP BY search_prefix 
-                ORDER BY search_prefix
-            ''')
-            prefixes = c.fetchall()
-            
-            # Data quality
-            c.execute('SELECT COUNT(*) FROM professionals WHERE LENGTH(situation_data) > 100')
-            complete = c.fetchone()[0]
-            
-            # Recent additions
-            c.execute('''
-                SELECT name, search_prefix, created_at 
-                FROM professionals 
-                ORDER BY created_at DESC 
-                LIMIT 5
-            ''')
-            recent = c.fetchall()
+            total, complete = totals(conn)
+            prefixes = top_prefixes(conn, TOP_PREFIXES)
+            recent = recent_doctors(conn)
             
-            conn.close()
+            if time.time() - coverage_at >= COVERAGE_INTERVAL:
+                coverage_at = time.time()
+                try:
+                    coverage = coverage_report(conn=conn, captures=False)
+                except sqlite3.Error:
+                    coverage = None  # no frontier tables yet
             
-            # Calculate stats
+            # Calculate stats (doctors added since the monitor started)
             elapsed = time.time() - start_time
-            rate = total / elapsed if elapsed > 0 else 0
+            if first_count is None:
+                first_count = prev_count = total
+            rate = (total - first_count) / elapsed if elapsed > 0 else 0
             new_since_last = total - prev_count
             prev_count = total
             
@@ -70,21 +79,26 @@ def monitor():
             print("="*80)
             print(f"\nTime Elapsed: {elapsed:.0f}s ({elapsed/60:.1f} min)")
             print(f"Total Doctors: {total}")
-            print(f"Speed: {rate:.2f} doctors/second")
+            print(f"Speed: {rate:.2f} doctors/second (+{new_since_last} since last refresh)")
             print(f"Data Quality: {complete}/{total} ({100*complete/total if total > 0 else 0:.0f}%) complete")
+            if coverage and coverage['coverage'] is not None:
+                frontier = coverage['prefixes']
+                print(f"Coverage: {coverage['coverage']:.1%} of ~{coverage['estimate']} doctors saved, "
+                      f"ETA {format_duration(coverage['eta_seconds'])} "
+                      f"({frontier.get('pending', 0)} prefixes pending, {frontier.get('capped', 0)} capped)")
             
-            print(f"\n{'Prefix':<8} {'Count':<10} {'Bar'}")
+            print(f"\n{'Prefix':<8} {'Count':<10} {'Bar'}  (top {TOP_PREFIXES})")
             print("-"*40)
             max_count = max([p[1] for p in prefixes], default=1)
-            for prefix, count in prefixes:
+            for prefix, count, _ in prefixes:
                 bar_len = int(30 * count / max_count) if max_count > 0 else 0
                 bar = '█' * bar_len
                 print(f"{prefix:<8} {count:<10} {bar}")
             
             print(f"\n{'Recently Added:':<25} {'Prefix'}")
             print("-"*40)
-            for name, prefix, created in recent[:5]:
-                print(f"{name[:23]:<25} {prefix}")
+            for name, prefix in recent:
+                print(f"{(name or '')[:23]:<25} {prefix}")
             
             print("\n" + "="*80)
             print("Press Ctrl+C to stop monitoring")
@@ -96,6 +110,8 @@ def monitor():
         print(f"Final count: {total} doctors in {elapsed/60:.1f} minutes")
     except Exception as e:
         print(f"Error: {e}")
+    finally:
+        conn.close()
 
 if __name__ == '__main__':
     monitor()
@@ -13,13 +13,11 @@ SOTA Approach:
 """
 
 import multiprocessing as mp
-from multiprocessing import Pool, Manager
+import asyncio
+from multiprocessing import Pool
 import time
-import requests
-from bs4 import BeautifulSoup
 import re
 import sqlite3
-from functools import partial
 import sys
 import os
 import json
@@ -30,9 +28,28 @@ from pathlib import Path
 import config
 
 # Import smart expansion
-from smart_expansion import smart_scrape
+from smart_expansion import smart_scrape, will_expand
+from seen_index import SeenIndex, card_fingerprint, FINGERPRINT_FIELDS
+from rate_limiter import get_rate_limiter, pool_options
+import telemetry
+import transport
+from transport import RETRYABLE_ERRORS
+import profiler
+from retries import (
+    RequestFailed,
+    is_retryable_status,
+    backoff_delay,
+    create_dead_letter_table,
+    record_failures,
+    pending_failures,
+)
+from response_store import create_response_index, record_responses, extract_raw
+from detail_tables import create_detail_tables, record_details
+from scrape_stats import create_stats_tables
+from detail_codec import TAB_COLUMNS, encode_tab, decode_tab
 
 # Import from our working scraper
+from legacy.scraper.card_extractor import extract_cards
 from legacy.scraper.content_extractor import (
     extract_situation_content,
     extract_dossier_content,
@@ -47,6 +64,9 @@ def create_database():
     Path('db').mkdir(exist_ok=True)
     conn = sqlite3.connect(config.DATABASE_PATH, check_same_thread=False)
     c = conn.cursor()
+    # page_size only applies to a new database, WAL lets the monitor read while we write
+    c.execute(f'PRAGMA page_size = {config.DB_PAGE_SIZE}')
+    c.execute('PRAGMA journal_mode = WAL')
     c.execute('''
         CREATE TABLE IF NOT EXISTS professionals (
             rpps TEXT PRIMARY KEY,
@@ -63,18 +83,78 @@ def create_database():
             diplomes_data TEXT,
             personne_data TEXT,
             search_prefix TEXT,
+            card_fingerprint TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    # Databases created before card fingerprints: add and fill the column
+    if 'card_fingerprint' not in {row[1] for row in c.execute('PRAGMA table_info(professionals)')}:
+        c.execute('ALTER TABLE professionals ADD COLUMN card_fingerprint TEXT')
+        fields = ('rpps',) + FINGERPRINT_FIELDS
+        rows = c.execute(f"SELECT {', '.join(fields)} FROM professionals").fetchall()
+        c.executemany('UPDATE professionals SET card_fingerprint = ? WHERE rpps = ?',
+                      [(card_fingerprint(dict(zip(fields, row))), row[0]) for row in rows])
     conn.commit()
+    create_dead_letter_table(conn)
+    create_response_index(conn)
+    create_detail_tables(conn)
+    create_stats_tables(conn)
     conn.close()
 
 
+# Insert a doctor, or refresh every scraped column of an existing one
+# (created_at is kept, so it stays the first time we saw the doctor)
+UPSERT_DOCTOR_SQL = '''
+    INSERT INTO professionals
+    (rpps, name, profession, organization, address, phone, email,
+     situation_data, dossier_data, diplomes_data, personne_data, 
+     search_prefix, card_fingerprint, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(rpps) DO UPDATE SET
+        name = excluded.name,
+        profession = excluded.profession,
+        organization = excluded.organization,
+        address = excluded.address,
+        phone = excluded.phone,
+        email = excluded.email,
+        situation_data = excluded.situation_data,
+        dossier_data = excluded.dossier_data,
+        diplomes_data = excluded.diplomes_data,
+        personne_data = excluded.personne_data,
+        search_prefix = excluded.search_prefix,
+        card_fingerprint = excluded.card_fingerprint,
+        updated_at = CURRENT_TIMESTAMP
+'''
+
+
+def doctor_row(data):
+    """Parameters of UPSERT_DOCTOR_SQL for one doctor"""
+    return (
+        data['rpps'],
+        data.get('name'),
+        data.get('profession'),
+        data.get('organization'),
+        data.get('address'),
+        data.get('phone'),
+        data.get('email'),
+        encode_tab(data.get('situation_data', '{}')),
+        encode_tab(data.get('dossier_data', '{}')),
+        encode_tab(data.get('diplomes_data', '{}')),
+        encode_tab(data.get('personne_data', '{}')),
+        data.get('prefix', ''),
+        card_fingerprint(data)
+    )
+
+
 def save_doctor(data, db_path=None):
-    """Thread-safe database save with proper locking"""
+    """
+    Save one doctor on its own connection and commit. Only for scrape_prefix
+    called on its own: the engines save through db_writer.DbWriter.
+    """
     if db_path is None:
         db_path = config.DATABASE_PATH
+    start = profiler.clock()
     conn = sqlite3.connect(db_path, timeout=config.DB_TIMEOUT)
     c = conn.cursor()
     
@@ -82,295 +162,540 @@ def save_doctor(data, db_path=None):
     c.execute('SELECT rpps FROM professionals WHERE rpps = ?', (data['rpps'],))
     is_duplicate = c.fetchone() is not None
     
-    c.execute('''
-        INSERT OR REPLACE INTO professionals
-        (rpps, name, profession, organization, address, phone, email,
-         situation_data, dossier_data, diplomes_data, personne_data, 
-         search_prefix, updated_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-    ''', (
-        data['rpps'],
-        data.get('name'),
-        data.get('profession'),
-        data.get('organization'),
-        data.get('address'),
-        data.get('phone'),
-        data.get('email'),
-        data.get('situation_data', '{}'),
-        data.get('dossier_data', '{}'),
-        data.get('diplomes_data', '{}'),
-        data.get('personne_data', '{}'),
-        data.get('prefix', '')
-    ))
+    c.execute(UPSERT_DOCTOR_SQL, doctor_row(data))
+    record_failures(conn, [data])
+    record_responses(conn, [data])
+    record_details(conn, [data])
     conn.commit()
     conn.close()
+    telemetry.reporter().observe('scraper_db_write_seconds', time.perf_counter() - start[0])
+    telemetry.reporter().count('scraper_db_rows_total')
+    profiler.finish(data, time.perf_counter() - start[0], time.thread_time() - start[1])
     
     return is_duplicate
 
 
-def scrape_one_doctor(session, card, p_auth, prefix):
-    """Scrape one doctor (same as simple_scraper.py)"""
-    nom_prenom = card.find('div', class_='nom_prenom')
-    if not nom_prenom:
-        return None
+BASE_URL = config.BASE_URL
+HOME_URL = f'{BASE_URL}/web/site-pro'
+SEARCH_URL = f'{BASE_URL}/web/site-pro/home'
+RESULTS_URL = f'{BASE_URL}/web/site-pro/recherche/resultats'
+DETAILS_URL = f'{BASE_URL}/web/site-pro/information-detaillees'
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36'
+
+PAGINATION_HEADERS = {
+    'Referer': RESULTS_URL,
+    'Upgrade-Insecure-Requests': '1'
+}
+
+
+# Search form of every page and the p_auth token in its action URL
+_SEARCH_FORM = re.compile(r'<form\b[^>]*\bname=["\']fmRecherche["\'][^>]*>', re.IGNORECASE)
+_P_AUTH = re.compile(r'[?&;]p_auth=([^&"\'\s]+)')
+
+
+def extract_p_auth(html):
+    """Extract the p_auth token from the search form of a page ('' if missing)"""
+    form = _SEARCH_FORM.search(html)
+    if form:
+        match = _P_AUTH.search(form.group(0))
+        if match:
+            return match.group(1)
+    return ''
+
+
+# Number of results above the first results page: <span class="nombre">1 234</span>
+_TOTAL_RESULTS = re.compile(r'<span\b[^>]*\bclass=["\']nombre["\'][^>]*>((?:[\d\s.\u00a0\u202f]|&nbsp;)+)</span>')
+
+
+def extract_total_results(html):
+    """Total number of results of a search (span.nombre), None if the page doesn't show it"""
+    match = _TOTAL_RESULTS.search(html)
+    if match:
+        digits = re.sub(r'\D', '', match.group(1).replace('&nbsp;', ''))
+        if digits:
+            return int(digits)
+    return None
+
+
+def build_search_data(prefix, p_auth):
+    """Form data for the free-text search of a prefix"""
+    return {
+        'p_p_id': 'rechercheportlet_INSTANCE_blk14HrIzEMS',
+        'p_p_lifecycle': '1',
+        'p_p_state': 'normal',
+        'p_p_mode': 'view',
+        '_rechercheportlet_INSTANCE_blk14HrIzEMS_javax.portlet.action': 'rechercheAction',
+        'p_auth': p_auth,
+        '_rechercheportlet_INSTANCE_blk14HrIzEMS_texttofind': prefix,
+        '_rechercheportlet_INSTANCE_blk14HrIzEMS_adresse': '',
+        '_rechercheportlet_INSTANCE_blk14HrIzEMS_cordonneesGeo': '',
+        '_rechercheportlet_INSTANCE_blk14HrIzEMS_integralite': 'active_only',
+        '_rechercheportlet_INSTANCE_blk14HrIzEMS_typeRecherche': 'textLibre'
+    }
+
+
+def build_pagination_params(page):
+    """Query params for a results page (resultatportlet with ONE 't')"""
+    return {
+        'p_p_id': 'resultatportlet',
+        'p_p_lifecycle': '0',
+        'p_p_state': 'normal',
+        'p_p_mode': 'view',
+        '_resultatportlet_delta': '10',
+        '_resultatportlet_resetCur': 'false',
+        '_resultatportlet_cur': str(page)
+    }
+
+
+def parse_cards(html):
+    """Return the result cards of a search/pagination page as compact records"""
+    if not config.PROFILE_STAGES:
+        return extract_cards(html, config.CARD_PARSER)
     
-    link = nom_prenom.find('a', href=True)
-    if not link:
-        return None
+    # Each card carries its share of the page parse into its doctor's profile
+    start = profiler.clock()
+    cards = extract_cards(html, config.CARD_PARSER)
+    share = {}
+    profiler.add(share, 'parse', start)
+    for card in cards:
+        card['parse_time'] = [value / len(cards) for value in share['parse']]
+    return cards
+
+
+def parse_card(card, prefix):
+    """
+    Basic fields and detail ids of a card record (see parse_cards).
+    Returns (data, ids) or (None, None) if the card has no RPPS link.
+    """
+    if not card or not card.get('rpps'):
+        return None, None
+    
+    start = profiler.clock() if config.PROFILE_STAGES else None
+    data = {'rpps': card['rpps'], 'name': card['name'], 'prefix': prefix}
+    
+    # Basic fields
+    for field in ('profession', 'organization'):
+        if card[field]:
+            data[field] = card[field]
+    for field in ('address', 'phone'):
+        if card[field] is not None:
+            data[field] = card[field]
+    if card['mssante'] is not None:
+        data['email'] = card['mssante']
+    
+    if start is not None:
+        data['profile'] = {'parse': list(card.get('parse_time', (0.0, 0.0)))}
+        profiler.add(data['profile'], 'parse', start)
+    
+    return data, dict(card['params'])
+
+
+def build_detail_requests(rpps, ids, p_auth):
+    """
+    The 5-request detail chain for one doctor, in the order the site expects:
+    DetailsPPAction -> infoDetailPP -> detailsPPDossierPro -> detailsPPDiplomes -> detailsPPPersonne.
+    Returns a list of (field, url, params, extractor); field/extractor are None
+    for the popup request whose response is not stored.
+    """
+    # Step 1: Open detail popup
+    detail_params = {
+        'p_p_id': 'mapportlet',
+        'p_p_lifecycle': '1',
+        'p_p_state': 'normal',
+        'p_p_mode': 'view',
+        '_mapportlet_javax.portlet.action': 'DetailsPPAction',
+        '_mapportlet_idSituExe': ids.get('_mapportlet_idSituExe', ''),
+        '_mapportlet_idExePro': ids.get('_mapportlet_idExePro', ''),
+        '_mapportlet_resultatIndex': ids.get('_mapportlet_resultatIndex', ''),
+        '_mapportlet_idRpps': rpps,
+        '_mapportlet_siteId': ids.get('_mapportlet_siteId', ''),
+        '_mapportlet_coordonneesId': ids.get('_mapportlet_coordonneesId', ''),
+        '_mapportlet_etatPP': ids.get('_mapportlet_etatPP', 'OUVERT'),
+        'p_auth': p_auth
+    }
+    
+    # Step 2: Navigate to situation tab
+    situation_params = {
+        'p_p_id': 'mapportlet',
+        'p_p_lifecycle': '1',
+        'p_p_state': 'normal',
+        'p_p_mode': 'view',
+        '_mapportlet_javax.portlet.action': 'infoDetailPP',
+        '_mapportlet_idSituExePourDetail': ids.get('_mapportlet_idSituExe', ''),
+        '_mapportlet_idNat': '8' + rpps,
+        '_mapportlet_idExeProPourDetail': ids.get('_mapportlet_idExePro', ''),
+        '_mapportlet_coordonneIdPourDetail': ids.get('_mapportlet_coordonneesId', ''),
+        '_mapportlet_resultatIndex': ids.get('_mapportlet_resultatIndex', ''),
+        '_mapportlet_idRpps': rpps,
+        '_mapportlet_etat': ids.get('_mapportlet_etatPP', 'OUVERT'),
+        '_mapportlet_siteIdPourDetail': ids.get('_mapportlet_siteId', ''),
+        'p_auth': p_auth
+    }
     
-    name = link.get_text(strip=True)
+    # Step 3: Other tabs
+    base_params = {
+        'p_p_id': 'resultatsportlet',
+        'p_p_lifecycle': '1',
+        'p_p_state': 'normal',
+        'p_p_mode': 'view',
+        '_resultatsportlet_idNat': '8' + rpps,
+        '_resultatsportlet_resultatIndex': ids.get('_mapportlet_resultatIndex', ''),
+        '_resultatsportlet_idRpps': rpps,
+        '_resultatsportlet_siteId': ids.get('_mapportlet_siteId', ''),
+        '_resultatsportlet_coordonneId': ids.get('_mapportlet_coordonneesId', ''),
+        '_resultatsportlet_etat': ids.get('_mapportlet_etatPP', 'OUVERT'),
+        'p_auth': p_auth,
+        '_resultatsportlet_idExePro': ids.get('_mapportlet_idExePro', '')
+    }
     
-    from urllib.parse import urlparse, parse_qs
-    parsed = urlparse(link['href'])
-    params = parse_qs(parsed.query)
-    ids = {k: v[0] if v else '' for k, v in params.items()}
-    rpps = ids.get('_mapportlet_idRpps', '')
+    dossier_params = base_params.copy()
+    dossier_params['_resultatsportlet_javax.portlet.action'] = 'detailsPPDossierPro'
+    diplomes_params = base_params.copy()
+    diplomes_params['_resultatsportlet_javax.portlet.action'] = 'detailsPPDiplomes'
+    personne_params = base_params.copy()
+    personne_params['_resultatsportlet_javax.portlet.action'] = 'detailsPPPersonne'
     
-    if not rpps:
+    return [
+        (None, RESULTS_URL, detail_params, None),
+        ('situation_data', RESULTS_URL, situation_params, extract_situation_content),
+        ('dossier_data', DETAILS_URL, dossier_params, extract_dossier_content),
+        ('diplomes_data', DETAILS_URL, diplomes_params, extract_diplomes_content),
+        ('personne_data', DETAILS_URL, personne_params, extract_personne_content),
+    ]
+
+
+def has_full_details(doctor_data):
+    """True when all 4 detail tabs were extracted"""
+    return (
+        len(doctor_data.get('situation_data', '{}')) > 10 and
+        len(doctor_data.get('dossier_data', '{}')) > 10 and
+        len(doctor_data.get('diplomes_data', '{}')) > 10 and
+        len(doctor_data.get('personne_data', '{}')) > 10
+    )
+
+
+def fetch_details(worker, data, ids, tabs=None, extract=True):
+    """
+    Run the 5-request detail chain for one doctor with a WorkerSession and
+    store the extracted tabs in `data` (only the fields in `tabs` if given).
+    A tab still failing after the retries is skipped, the others are still
+    fetched; failures end up in data['failed_requests'] for the dead-letter table.
+    With extract=False the raw pages are left in data['raw'] for
+    response_store.extract_raw, to be run in another process.
+    """
+    failed = {}
+    raw = {}
+    steps = build_detail_requests(data['rpps'], ids, worker.ensure_p_auth())
+    fields = [field for field, _, _, _ in steps if field and (tabs is None or field in tabs)]
+    profiling = profiler.activate(data)
+    
+    for index in range(len(steps)):
+        field, url, params, _ = steps[index]
+        if field and field not in fields:
+            continue
+        try:
+            response = limited_request(worker.session, 'POST', url, params=params, data='')
+            if not field and not worker.accepted(response.text):
+                # Stale p_auth: open the popup again, and go on, with the token of the new session
+                steps = build_detail_requests(data['rpps'], ids, worker.p_auth)
+                response = limited_request(worker.session, 'POST', url, params=steps[index][2], data='')
+            if field:
+                raw[field] = response.text
+        except Exception as e:
+            print(f"    ERROR fetching {field or 'details'} for {data['name']}: {e}")
+            if not field:
+                # No detail context on the server, none of the tabs can be fetched
+                failed = {f: str(e) for f in fields}
+                break
+            failed[field] = str(e)
+    
+    profiler.deactivate(profiling)
+    data['failed_requests'] = {'ids': ids, 'tabs': failed}
+    data['raw'] = raw
+    return extract_raw(data) if extract else data
+
+
+def scrape_one_doctor(worker, card, prefix):
+    """Scrape one doctor (same as simple_scraper.py)"""
+    data, ids = parse_card(card, prefix)
+    if not data:
         return None
     
-    data = {'rpps': rpps, 'name': name, 'prefix': prefix}
+    return fetch_details(worker, data, ids)
+
+
+def endpoint_name(url, params=None):
+    """Metrics label of a request: home, search, pagination or the portlet action"""
+    for key, value in (params or {}).items():
+        if key.endswith('javax.portlet.action'):
+            return value
+    if url == HOME_URL:
+        return 'home'
+    if url == SEARCH_URL:
+        return 'search'
+    if params and '_resultatportlet_cur' in params:
+        return 'pagination'
+    return 'other'
+
+
+def record_request(endpoint, status, latency, size=0):
+    """Feed one request attempt to the metrics (status None = timeout / connection error)"""
+    progress = telemetry.reporter()
+    progress.count('scraper_requests_total', endpoint=endpoint, status=status or 'error')
+    progress.observe('scraper_request_seconds', latency, endpoint=endpoint)
+    if size:
+        progress.count('scraper_response_bytes_total', size, endpoint=endpoint)
+
+
+def limited_request(session, method, url, **kwargs):
+    """
+    session.request() behind the global rate limiter, retried up to
+    RETRY_ATTEMPTS times with backoff on retryable errors (see retries.py).
+    Status and latency of every attempt are fed back to the AIMD controller
+    and to the request metrics.
+    Raises RequestFailed if the last attempt still got a retryable status.
+    """
+    limiter = get_rate_limiter()
+    endpoint = endpoint_name(url, kwargs.get('params'))
+    profile = profiler.current()
+    kwargs.setdefault('timeout', config.REQUEST_TIMEOUT)
     
-    # Basic fields
-    profession_divs = card.find_all('div', class_='profession')
-    if profession_divs:
-        texts = [p.get_text(strip=True) for p in profession_divs if p.get_text(strip=True)]
-        if texts:
-            data['profession'] = texts[0]
-        if len(texts) > 1:
-            data['organization'] = ' | '.join(texts[1:])
-    
-    address_div = card.find('div', class_='adresse')
-    if address_div:
-        data['address'] = address_div.get_text(' ', strip=True)
-    
-    tel_div = card.find('div', class_='tel')
-    if tel_div:
-        data['phone'] = tel_div.get_text(strip=True)
-    
-    email_div = card.find('div', class_='mssante')
-    if email_div:
-        data['email'] = email_div.get_text(strip=True)
-    
-    # Fetch details
-    try:
-        # Step 1: Open detail popup
-        detail_params = {
-            'p_p_id': 'mapportlet',
-            'p_p_lifecycle': '1',
-            'p_p_state': 'normal',
-            'p_p_mode': 'view',
-            '_mapportlet_javax.portlet.action': 'DetailsPPAction',
-            '_mapportlet_idSituExe': ids.get('_mapportlet_idSituExe', ''),
-            '_mapportlet_idExePro': ids.get('_mapportlet_idExePro', ''),
-            '_mapportlet_resultatIndex': ids.get('_mapportlet_resultatIndex', ''),
-            '_mapportlet_idRpps': rpps,
-            '_mapportlet_siteId': ids.get('_mapportlet_siteId', ''),
-            '_mapportlet_coordonneesId': ids.get('_mapportlet_coordonneesId', ''),
-            '_mapportlet_etatPP': ids.get('_mapportlet_etatPP', 'OUVERT'),
-            'p_auth': p_auth
-        }
-        detail = session.post('https://annuaire.sante.fr/web/site-pro/recherche/resultats', 
-                            params=detail_params, data='', timeout=config.REQUEST_TIMEOUT)
-        time.sleep(config.DELAY_BETWEEN_TABS)
+    for attempt in range(1, config.RETRY_ATTEMPTS + 1):
+        waited = profiler.clock() if profile is not None else None
+        limiter.acquire()
+        if waited:
+            profiler.add(profile, 'sleep', waited)
+            fetching = profiler.clock()
+        start = time.monotonic()
+        try:
+            response = session.request(method, url, **kwargs)
+        except RETRYABLE_ERRORS:
+            limiter.record(None, time.monotonic() - start)
+            record_request(endpoint, None, time.monotonic() - start)
+            if waited:
+                profiler.add(profile, f'fetch:{endpoint}', fetching)
+            if attempt == config.RETRY_ATTEMPTS:
+                raise
+            backoff(backoff_delay(attempt), profile)
+            continue
         
-        # Step 2: Navigate to situation tab
-        situation_params = {
-            'p_p_id': 'mapportlet',
-            'p_p_lifecycle': '1',
-            'p_p_state': 'normal',
-            'p_p_mode': 'view',
-            '_mapportlet_javax.portlet.action': 'infoDetailPP',
-            '_mapportlet_idSituExePourDetail': ids.get('_mapportlet_idSituExe', ''),
-            '_mapportlet_idNat': '8' + rpps,
-            '_mapportlet_idExeProPourDetail': ids.get('_mapportlet_idExePro', ''),
-            '_mapportlet_coordonneIdPourDetail': ids.get('_mapportlet_coordonneesId', ''),
-            '_mapportlet_resultatIndex': ids.get('_mapportlet_resultatIndex', ''),
-            '_mapportlet_idRpps': rpps,
-            '_mapportlet_etat': ids.get('_mapportlet_etatPP', 'OUVERT'),
-            '_mapportlet_siteIdPourDetail': ids.get('_mapportlet_siteId', ''),
-            'p_auth': p_auth
-        }
-        situation = session.post('https://annuaire.sante.fr/web/site-pro/recherche/resultats',
-                                params=situation_params, data='', timeout=config.REQUEST_TIMEOUT)
-        data['situation_data'] = extract_situation_content(situation.text)
-        time.sleep(config.DELAY_BETWEEN_TABS)
+        latency = time.monotonic() - start
+        limiter.record(response.status_code, latency)
+        record_request(endpoint, response.status_code, latency, len(response.content))
+        if waited:
+            profiler.add(profile, f'fetch:{endpoint}', fetching)
+        if not is_retryable_status(response.status_code):
+            return response
+        if attempt == config.RETRY_ATTEMPTS:
+            raise RequestFailed(response.status_code, url)
+        backoff(backoff_delay(attempt, response.headers.get('Retry-After')), profile)
+
+
+def backoff(delay, profile=None):
+    """Sleep before a retry, counted in the 'sleep' stage of the profile if any"""
+    start = profiler.clock() if profile is not None else None
+    time.sleep(delay)
+    if start:
+        profiler.add(profile, 'sleep', start)
+
+
+def create_session():
+    """New HTTP session (config.TRANSPORT) with browser-like headers"""
+    return transport.create_session({
+        'User-Agent': USER_AGENT,
+    })
+
+
+def get_p_auth(session):
+    """Load the home page and return the p_auth token ('' if missing)"""
+    home = limited_request(session, 'GET', HOME_URL)
+    return extract_p_auth(home.text)
+
+
+class WorkerSession:
+    """
+    HTTP session and p_auth of one worker, reused across prefixes and doctors:
+    one keep-alive connection pool, one cookie jar, one home page load.
+    
+    p_auth belongs to the server-side session. It is not checked up front:
+    every page carries the search form with the token of the session it was
+    rendered for, so a response showing another token means ours was rejected
+    (session expired or reset) and the new one is picked up from that page.
+    """
+    
+    def __init__(self, session):
+        self.session = session
+        self.p_auth = ''
+        self.refreshes = 0
+    
+    def ensure_p_auth(self):
+        """p_auth of the session, loading the home page only if there is none yet"""
+        if not self.p_auth:
+            self.p_auth = get_p_auth(self.session)
+        return self.p_auth
+    
+    def accepted(self, html):
+        """
+        False if the page was rendered for another p_auth than ours, which
+        is then replaced by the token of the page (redo the request).
+        """
+        current = extract_p_auth(html)
+        if not current or current == self.p_auth:
+            return True
+        self.p_auth = current
+        self.refreshes += 1
+        return False
+
+
+# WorkerSession of this process (created lazily, kept for the life of the worker)
+_worker_session = None
+
+
+def get_worker_session():
+    """WorkerSession of this worker process, shared by every prefix and doctor it handles"""
+    global _worker_session
+    if _worker_session is None:
+        _worker_session = WorkerSession(create_session())
+    return _worker_session
+
+
+def search_prefix(worker, prefix):
+    """Search for a prefix (once more with the new token if the server rejected ours), returns the response"""
+    search = limited_request(worker.session, 'POST', SEARCH_URL, data=build_search_data(prefix, worker.ensure_p_auth()))
+    if not worker.accepted(search.text):
+        search = limited_request(worker.session, 'POST', SEARCH_URL, data=build_search_data(prefix, worker.p_auth))
+    return search
+
+
+def harvest_cards(worker, prefix, expand=False):
+    """
+    Search for a prefix and paginate through all result pages with a WorkerSession.
+    Returns (cards of pages 1..MAX_PAGES, total results shown by the site or None).
+    With expand=True (the scheduler expands capped prefixes), a prefix whose
+    results count already shows it will be expanded is not paginated:
+    its children list those results anyway.
+    """
+    search = search_prefix(worker, prefix)
+    all_cards = list(parse_cards(search.text))
+    total_results = extract_total_results(search.text)
+    if expand and will_expand(total_results):
+        return all_cards, total_results
+    
+    for page in range(2, config.MAX_PAGES + 1):
+        page_response = limited_request(worker.session, 'GET', RESULTS_URL, params=build_pagination_params(page),
+                                        headers=PAGINATION_HEADERS)
         
-        # Step 3: Fetch other tabs
-        base_params = {
-            'p_p_id': 'resultatsportlet',
-            'p_p_lifecycle': '1',
-            'p_p_state': 'normal',
-            'p_p_mode': 'view',
-            '_resultatsportlet_idNat': '8' + rpps,
-            '_resultatsportlet_resultatIndex': ids.get('_mapportlet_resultatIndex', ''),
-            '_resultatsportlet_idRpps': rpps,
-            '_resultatsportlet_siteId': ids.get('_mapportlet_siteId', ''),
-            '_resultatsportlet_coordonneId': ids.get('_mapportlet_coordonneesId', ''),
-            '_resultatsportlet_etat': ids.get('_mapportlet_etatPP', 'OUVERT'),
-            'p_auth': p_auth,
-            '_resultatsportlet_idExePro': ids.get('_mapportlet_idExePro', '')
-        }
+        if page_response.status_code == 200 and not worker.accepted(page_response.text):
+            # Session reset mid-pagination: the search lives in the session, run it again
+            search_prefix(worker, prefix)
+            page_response = limited_request(worker.session, 'GET', RESULTS_URL, params=build_pagination_params(page),
+                                            headers=PAGINATION_HEADERS)
         
-        # Dossier
-        dossier_params = base_params.copy()
-        dossier_params['_resultatsportlet_javax.portlet.action'] = 'detailsPPDossierPro'
-        dossier = session.post('https://annuaire.sante.fr/web/site-pro/information-detaillees',
-                              params=dossier_params, data='', timeout=config.REQUEST_TIMEOUT)
-        data['dossier_data'] = extract_dossier_content(dossier.text)
-        time.sleep(config.DELAY_BETWEEN_TABS)
+        if page_response.status_code != 200:
+            break
         
-        # Diplomes
-        diplomes_params = base_params.copy()
-        diplomes_params['_resultatsportlet_javax.portlet.action'] = 'detailsPPDiplomes'
-        diplomes = session.post('https://annuaire.sante.fr/web/site-pro/information-detaillees',
-                               params=diplomes_params, data='', timeout=config.REQUEST_TIMEOUT)
-        data['diplomes_data'] = extract_diplomes_content(diplomes.text)
-        time.sleep(config.DELAY_BETWEEN_TABS)
+        page_cards = parse_cards(page_response.text)
         
-        # Personne
-        personne_params = base_params.copy()
-        personne_params['_resultatsportlet_javax.portlet.action'] = 'detailsPPPersonne'
-        personne = session.post('https://annuaire.sante.fr/web/site-pro/information-detaillees',
-                               params=personne_params, data='', timeout=config.REQUEST_TIMEOUT)
-        data['personne_data'] = extract_personne_content(personne.text)
+        if not page_cards:
+            break
         
-    except Exception as e:
-        print(f"    ERROR fetching details for {name}: {e}")
+        all_cards.extend(page_cards)
     
-    return data
+    return all_cards, total_results
+
 
+# Seen-RPPS index of scrape_prefix called without a shared one (created lazily)
+_seen_index = None
 
-def scrape_prefix(prefix, progress_queue=None):
+
+def get_seen_index():
+    """Seen-RPPS index of this process, None if SKIP_SEEN_DOCTORS is off"""
+    global _seen_index
+    if not config.SKIP_SEEN_DOCTORS:
+        return None
+    if _seen_index is None:
+        # Workers share the database, not memory: look RPPS up on demand
+        _seen_index = SeenIndex(preload=False)
+    return _seen_index
+
+
+def scrape_prefix(prefix, events=None, expand=False, seen=None):
     """
     Scrape all doctors for a given search prefix.
-    This runs in its own process with its own session.
+    This runs in a worker process, on the session that worker keeps across prefixes.
+    
+    If events is given (smart_scrape), the scheduler records the harvest and
+    saves the doctors: ('paginated', prefix, total_cards, total_results,
+    captured RPPS) is put on it as soon as pagination is done (or skipped,
+    see harvest_cards, with expand=True) so it can expand early, then
+    ('doctor', record) for every doctor, saved by the scheduler's DbWriter
+    (which also tells duplicates). Without it, doctors go through save_doctor.
+    seen is the scheduler's shared SeenIndex (a proxy), without it the
+    process keeps its own. Progress goes to the worker's telemetry reporter.
     """
     process_id = mp.current_process().name
+    progress = telemetry.reporter()
+    started = time.monotonic()
     
     try:
-        # Create session
-        session = requests.Session()
-        session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
-        })
+        # Session and p_auth of this worker (home page loaded on its first prefix only)
+        worker = get_worker_session()
         
-        # Get p_auth
-        home = session.get('https://annuaire.sante.fr/web/site-pro', timeout=30)
-        soup = BeautifulSoup(home.text, 'html.parser')
-        form = soup.find('form', attrs={'name': 'fmRecherche'})
-        p_auth = ''
-        if form:
-            action = form.get('action', '')
-            match = re.search(r'p_auth=([^&]+)', action)
-            if match:
-                p_auth = match.group(1)
-        
-        if not p_auth:
+        if not worker.ensure_p_auth():
             print(f"[{process_id}] Prefix '{prefix}': Failed to get p_auth")
             return {'prefix': prefix, 'count': 0, 'error': 'No p_auth'}
         
-        # Search
-        search_data = {
-            'p_p_id': 'rechercheportlet_INSTANCE_blk14HrIzEMS',
-            'p_p_lifecycle': '1',
-            'p_p_state': 'normal',
-            'p_p_mode': 'view',
-            '_rechercheportlet_INSTANCE_blk14HrIzEMS_javax.portlet.action': 'rechercheAction',
-            'p_auth': p_auth,
-            '_rechercheportlet_INSTANCE_blk14HrIzEMS_texttofind': prefix,
-            '_rechercheportlet_INSTANCE_blk14HrIzEMS_adresse': '',
-            '_rechercheportlet_INSTANCE_blk14HrIzEMS_cordonneesGeo': '',
-            '_rechercheportlet_INSTANCE_blk14HrIzEMS_integralite': 'active_only',
-            '_rechercheportlet_INSTANCE_blk14HrIzEMS_typeRecherche': 'textLibre'
-        }
-        search = session.post('https://annuaire.sante.fr/web/site-pro/home', data=search_data, timeout=30)
-        soup = BeautifulSoup(search.text, 'html.parser')
-        cards = soup.find_all('div', class_='contenant_resultat')
-        
         # Collect ALL cards from pagination FIRST
-        all_cards = list(cards)
-        max_pages = 10
-        
-        for page in range(2, max_pages + 1):
-            pagination_params = {
-                'p_p_id': 'resultatportlet',
-                'p_p_lifecycle': '0',
-                'p_p_state': 'normal',
-                'p_p_mode': 'view',
-                '_resultatportlet_delta': '10',
-                '_resultatportlet_resetCur': 'false',
-                '_resultatportlet_cur': str(page)
-            }
-            pagination_headers = {
-                'Referer': 'https://annuaire.sante.fr/web/site-pro/recherche/resultats',
-                'Upgrade-Insecure-Requests': '1'
-            }
-            page_response = session.get('https://annuaire.sante.fr/web/site-pro/recherche/resultats', 
-                                       params=pagination_params, headers=pagination_headers, timeout=30)
-            
-            if page_response.status_code != 200:
-                break
-            
-            soup = BeautifulSoup(page_response.text, 'html.parser')
-            page_cards = soup.find_all('div', class_='contenant_resultat')
-            
-            if not page_cards:
-                break
-            
-            all_cards.extend(page_cards)
-            time.sleep(config.DELAY_BETWEEN_PAGES)
+        all_cards, total_results = harvest_cards(worker, prefix, expand=expand)
         
         pages_scraped = (len(all_cards) + 9) // 10  # Round up to get page count
         print(f"[{process_id}] Prefix '{prefix}': ✓ Collected {len(all_cards)} cards from {pages_scraped} pages")
+        if events is not None:
+            events.put(('paginated', prefix, len(all_cards), total_results,
+                        [card['rpps'] for card in all_cards]))
+        
         print(f"[{process_id}] Prefix '{prefix}': Starting detail scraping...")
         
         # NOW scrape details
         count = 0
         duplicates = 0
         details_complete = 0
+        skipped = 0
+        if seen is None:
+            seen = get_seen_index()
         
         for idx, card in enumerate(all_cards, 1):
-            doctor_data = scrape_one_doctor(session, card, p_auth, prefix)
+            doctor_data, ids = parse_card(card, prefix)
+            
+            # Already scraped (from another prefix or a previous run): no detail requests
+            if (doctor_data and seen is not None
+                    and not seen.claim(doctor_data['rpps'], card_fingerprint(doctor_data))):
+                skipped += 1
+                continue
+            
             if doctor_data:
-                is_duplicate = save_doctor(doctor_data)
+                fetch_details(worker, doctor_data, ids)
+                if events is not None:
+                    # Saved in the scheduler's next batch, duplicates are counted there
+                    events.put(('doctor', doctor_data))
+                    is_duplicate = False
+                else:
+                    is_duplicate = save_doctor(doctor_data)
                 count += 1
                 
                 # Check if details were successfully scraped
-                has_details = (
-                    len(doctor_data.get('situation_data', '{}')) > 10 and
-                    len(doctor_data.get('dossier_data', '{}')) > 10 and
-                    len(doctor_data.get('diplomes_data', '{}')) > 10 and
-                    len(doctor_data.get('personne_data', '{}')) > 10
-                )
+                has_details = has_full_details(doctor_data)
                 
                 if has_details:
                     details_complete += 1
+                elif seen is not None:
+                    seen.release(doctor_data['rpps'])
                 
                 if is_duplicate:
                     duplicates += 1
                 
-                # Enhanced logging
-                status_parts = []
-                if is_duplicate:
-                    status_parts.append("DUPLICATE")
-                if has_details:
-                    status_parts.append("DETAILS ✓")
-                else:
-                    status_parts.append("BASIC ONLY")
-                
-                status = f"[{', '.join(status_parts)}]" if status_parts else ""
-                
-                if progress_queue:
-                    progress_queue.put({
-                        'prefix': prefix, 
-                        'doctor': doctor_data['name'],
-                        'status': status,
-                        'idx': idx,
-                        'total': len(all_cards)
-                    })
-                
-                time.sleep(config.DELAY_BETWEEN_DOCTORS)  # Critical delay
+                progress.doctor(prefix, idx, len(all_cards), has_details, is_duplicate)
                 
             # Check if we hit the limit
             if config.MAX_DOCTORS_PER_PREFIX > 0 and count >= config.MAX_DOCTORS_PER_PREFIX:
@@ -378,19 +703,85 @@ def scrape_prefix(prefix, progress_queue=None):
                 break
         
         # Summary log
-        print(f"[{process_id}] Prefix '{prefix}': ✓ FINISHED - {count} doctors ({details_complete} with full details, {duplicates} duplicates)")
+        saved_here = f", {duplicates} duplicates" if events is None else ""
+        print(f"[{process_id}] Prefix '{prefix}': ✓ FINISHED - {count} doctors ({details_complete} with full details{saved_here}, {skipped} already seen)")
         
         return {
             'prefix': prefix, 
             'count': count, 
             'total_cards': len(all_cards),
+            'total_results': total_results,
             'details_complete': details_complete,
-            'duplicates': duplicates
+            'duplicates': duplicates,
+            'skipped': skipped
         }
         
     except Exception as e:
         print(f"[{process_id}] Prefix '{prefix}': ERROR - {e}")
         return {'prefix': prefix, 'count': 0, 'error': str(e)}
+    
+    finally:
+        progress.count('scraper_worker_busy_seconds_total', time.monotonic() - started, pool='prefix')
+        progress.done(prefix)
+
+
+# professionals columns loaded back into a doctor record (name in the record → column)
+DOCTOR_FIELDS = {
+    'rpps': 'rpps', 'name': 'name', 'profession': 'profession', 'organization': 'organization',
+    'address': 'address', 'phone': 'phone', 'email': 'email',
+    'situation_data': 'situation_data', 'dossier_data': 'dossier_data',
+    'diplomes_data': 'diplomes_data', 'personne_data': 'personne_data', 'prefix': 'search_prefix'
+}
+
+
+def replay_failed(num_workers=None):
+    """
+    --replay-failed: refetch every tab of the dead-letter table (failed_requests).
+    The rest of each doctor's record is kept; tabs that work now leave the table,
+    tabs that fail again stay with attempts + 1.
+    """
+    from pipeline import fetch_doctor
+    from db_writer import DbWriter
+    
+    create_database()
+    conn = sqlite3.connect(config.DATABASE_PATH, timeout=config.DB_TIMEOUT)
+    entries = pending_failures(conn)
+    columns = ', '.join(DOCTOR_FIELDS.values())
+    
+    jobs = []
+    for entry in entries:
+        row = conn.execute(f'SELECT {columns} FROM professionals WHERE rpps = ?', (entry['rpps'],)).fetchone()
+        data = dict(zip(DOCTOR_FIELDS, row)) if row else {'rpps': entry['rpps'], 'name': entry['rpps']}
+        for field in TAB_COLUMNS:
+            if field in data:
+                data[field] = decode_tab(data[field])
+        data['prefix'] = entry['prefix'] or data.get('prefix', '')
+        jobs.append((entry, data))
+    conn.close()
+    
+    total_tabs = sum(len(entry['tabs']) for entry in entries)
+    print(f"Replaying {total_tabs} failed tabs of {len(entries)} doctors")
+    if not jobs:
+        return
+    
+    num_workers = min(num_workers or config.DETAIL_WORKERS, len(jobs))
+    fixed = 0
+    writer = DbWriter()
+    with Pool(processes=num_workers, **pool_options()) as pool:
+        # Started after the fork, see pipeline_scrape
+        writer.start()
+        pending = [(entry, pool.apply_async(fetch_doctor, ((data, entry['ids']), entry['tabs'])))
+                   for entry, data in jobs]
+        for idx, (entry, result) in enumerate(pending, 1):
+            data = result.get()
+            failed = data['failed_requests']['tabs']
+            data['failed_requests']['attempts'] = {tab: entry['attempts'][tab] + 1 for tab in failed}
+            writer.save(data)
+            fixed += len(entry['tabs']) - len(failed)
+            print(f"  [{idx}/{len(jobs)}] {data['name']}: {len(entry['tabs']) - len(failed)}/{len(entry['tabs'])} tabs recovered")
+    writer.close()
+    
+    print(f"\nRecovered {fixed}/{total_tabs} tabs, {total_tabs - fixed} still in failed_requests")
 
 
 def main():
@@ -423,59 +814,61 @@ def main():
     
     # Create database
     create_database()
+    if config.REFRESH:
+        # Refresh = re-walk the results, skip every known, unchanged, fresh doctor
+        config.SKIP_SEEN_DOCTORS = True
     
     # Use config values
     prefixes = config.PREFIXES
-    num_workers = min(config.NUM_WORKERS, len(prefixes))
+    if config.ENGINE == 'async':
+        num_workers = config.ASYNC_DETAIL_CONCURRENCY
+    elif config.ENGINE == 'pipeline':
+        num_workers = config.DETAIL_WORKERS
+    else:
+        num_workers = min(config.NUM_WORKERS, len(prefixes))
     
     log(f"\n1. Configuration:")
     log(f"   Prefixes to scrape: {', '.join(prefixes)}")
+    log(f"   Engine: {config.ENGINE}")
+    if config.ENGINE == 'pipeline':
+        log(f"   Harvest workers: {config.HARVEST_WORKERS}")
+    elif config.ENGINE == 'async':
+        log(f"   Harvest sessions: {config.ASYNC_CONCURRENCY}")
     log(f"   Concurrent workers: {num_workers}")
     log(f"   Database: {config.DATABASE_PATH}")
+    if config.ENGINE != 'async':
+        log(f"   Transport: {transport.name()}"
+            + (" (httpx[http2] not installed)" if config.TRANSPORT == 'httpx' and transport.name() != 'httpx' else ''))
     log(f"   Max doctors per prefix: {config.MAX_DOCTORS_PER_PREFIX if config.MAX_DOCTORS_PER_PREFIX > 0 else 'Unlimited'}")
-    log(f"   Delay between doctors: {config.DELAY_BETWEEN_DOCTORS}s")
+    log(f"   Rate limit: {config.RATE_LIMIT_INITIAL} req/s to start (adaptive, "
+        f"{config.RATE_LIMIT_MIN}-{config.RATE_LIMIT_MAX} req/s, shared by all workers)")
     log(f"   Log file: {log_path if config.ENABLE_FILE_LOGGING else 'Console only'}")
     
     log(f"   Smart expansion: {'ENABLED' if config.SMART_EXPANSION else 'DISABLED'}")
+    if config.REFRESH:
+        log(f"   Refresh: details of new, changed or older than {config.SEEN_MAX_AGE_DAYS} days doctors only")
     log(f"\n2. Starting parallel scraping...")
     start_time = time.time()
     
-    # Create manager for progress tracking
-    with Manager() as manager:
-        progress_queue = manager.Queue()
-        
-        # Monitor progress in background
-        import threading
-        stop_monitoring = threading.Event()
-        
-        def monitor_progress():
-            while not stop_monitoring.is_set():
-                try:
-                    msg = progress_queue.get(timeout=1)
-                    doctor_name = msg['doctor']
-                    status = msg.get('status', '')
-                    idx = msg.get('idx', '')
-                    total = msg.get('total', '')
-                    progress = f"({idx}/{total})" if idx and total else ""
-                    log(f"   [{msg['prefix']}] {progress} {doctor_name} {status}")
-                except:
-                    pass
-        
-        monitor_thread = threading.Thread(target=monitor_progress, daemon=True)
-        monitor_thread.start()
-        
+    # Batched progress from every process, one log line per TELEMETRY_RENDER_INTERVAL
+    with telemetry.Monitor(log) as monitor:
         # Choose scraping mode
-        if config.SMART_EXPANSION:
+        if config.ENGINE == 'async':
+            from async_scraper import async_scrape
+            log(f"   Mode: ASYNC ({'smart expansion' if config.SMART_EXPANSION else 'fixed prefixes'})")
+            results = asyncio.run(async_scrape(prefixes, config.ASYNC_CONCURRENCY, num_workers,
+                                               expand=config.SMART_EXPANSION))
+        elif config.ENGINE == 'pipeline':
+            from pipeline import pipeline_scrape
+            log(f"   Mode: PIPELINE ({'smart expansion' if config.SMART_EXPANSION else 'fixed prefixes'})")
+            results = pipeline_scrape(prefixes, config.HARVEST_WORKERS, num_workers,
+                                      expand=config.SMART_EXPANSION)
+        elif config.SMART_EXPANSION:
             log("   Mode: SMART EXPANSION (will auto-expand prefixes that hit limits)")
-            results = smart_scrape(scrape_prefix, prefixes, num_workers, progress_queue)
+            results = smart_scrape(scrape_prefix, prefixes, num_workers)
         else:
             log("   Mode: FIXED PREFIXES (no expansion)")
-            with Pool(processes=num_workers) as pool:
-                scrape_with_queue = partial(scrape_prefix, progress_queue=progress_queue)
-                results = pool.map(scrape_with_queue, prefixes)
-        
-        stop_monitoring.set()
-        monitor_thread.join(timeout=2)
+            results = smart_scrape(scrape_prefix, prefixes, num_workers, expand=False)
     
     elapsed = time.time() - start_time
     
@@ -487,6 +880,7 @@ def main():
     total_doctors = 0
     total_details = 0
     total_duplicates = 0
+    total_skipped = 0
     failed_prefixes = []
     
     for res in results:
@@ -499,12 +893,13 @@ def main():
         total_doctors += count
         total_details += details
         total_duplicates += duplicates
+        total_skipped += res.get('skipped', 0)
         
         if error:
             status = f"✗ Error: {error}"
             failed_prefixes.append({'prefix': prefix, 'error': error})
         else:
-            status = f"✓ {count}/{total_cards} doctors ({details} full details, {duplicates} dups)"
+            status = f"✓ {count}/{total_cards} doctors ({details} full details, {duplicates} dups, {res.get('skipped', 0)} seen)"
         log(f"  {prefix:3s}: {status}")
     
     success_rate = (len(prefixes) - len(failed_prefixes)) / len(prefixes) * 100 if prefixes else 0
@@ -513,10 +908,17 @@ def main():
     log(f"\n  Total: {total_doctors} doctors scraped")
     log(f"  Full details: {total_details}/{total_doctors} ({detail_completion_rate:.1f}%)")
     log(f"  Duplicates: {total_duplicates}")
+    log(f"  Already seen (details skipped): {total_skipped}")
     log(f"  Failed prefixes: {len(failed_prefixes)}/{len(prefixes)}")
     log(f"  Success rate: {success_rate:.1f}%")
     log(f"  Time: {elapsed:.1f} seconds ({elapsed/60:.1f} minutes)")
     log(f"  Speed: {total_doctors/elapsed:.2f} doctors/second")
+    limiter = get_rate_limiter()
+    log(f"  Requests: {limiter.requests} ({limiter.requests/elapsed:.2f}/second), "
+        f"final rate limit {limiter.rate:.1f} req/s after {limiter.backoffs} backoffs")
+    connections = transport.reuse_summary(monitor.metrics)
+    if connections:
+        log(f"  Connections: {connections}")
     log(f"\nDatabase: {config.DATABASE_PATH}")
     log(f"{'='*80}")
     
@@ -528,19 +930,23 @@ def main():
                 'num_workers': num_workers,
                 'prefixes': prefixes,
                 'max_doctors_per_prefix': config.MAX_DOCTORS_PER_PREFIX,
-                'delay_between_doctors': config.DELAY_BETWEEN_DOCTORS,
-                'delay_between_tabs': config.DELAY_BETWEEN_TABS,
-                'delay_between_pages': config.DELAY_BETWEEN_PAGES
+                'rate_limit_initial': config.RATE_LIMIT_INITIAL,
+                'rate_limit_min': config.RATE_LIMIT_MIN,
+                'rate_limit_max': config.RATE_LIMIT_MAX
             },
             'results': {
                 'total_doctors': total_doctors,
                 'total_details_complete': total_details,
                 'detail_completion_rate': detail_completion_rate,
                 'total_duplicates': total_duplicates,
+                'total_skipped': total_skipped,
                 'failed_prefixes': len(failed_prefixes),
                 'success_rate': success_rate,
                 'elapsed_seconds': elapsed,
-                'doctors_per_second': total_doctors / elapsed if elapsed > 0 else 0
+                'doctors_per_second': total_doctors / elapsed if elapsed > 0 else 0,
+                'requests': limiter.requests,
+                'final_rate_limit': limiter.rate,
+                'rate_limit_backoffs': limiter.backoffs
             },
             'by_prefix': [
                 {
@@ -549,6 +955,7 @@ def main():
                     'total_cards': r.get('total_cards', 0),
                     'details_complete': r.get('details_complete', 0),
                     'duplicates': r.get('duplicates', 0),
+                    'skipped': r.get('skipped', 0),
                     'error': r.get('error', None)
                 }
                 for r in results
@@ -562,6 +969,16 @@ def main():
             json.dump(metrics, f, indent=2)
         log(f"\nMetrics saved to: {metrics_path}")
     
+    # Stage profile report (PROFILE_STAGES)
+    if monitor.profile is not None:
+        for line in monitor.profile.render():
+            log(line)
+        Path(config.LOGS_DIR).mkdir(exist_ok=True)
+        profile_path = Path(config.LOGS_DIR) / f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{num_workers}workers.json"
+        with open(profile_path, 'w', encoding='utf-8') as f:
+            json.dump(monitor.profile.report(), f, indent=2)
+        log(f"\nProfile saved to: {profile_path}")
+    
     if log_file:
         log_file.close()
 
@@ -569,5 +986,29 @@ def main():
 if __name__ == '__main__':
     # Required for Windows multiprocessing
     mp.freeze_support()
-    main()
+    
+    import argparse
+    parser = argparse.ArgumentParser(description='Parallel scraper for annuaire.sante.fr')
+    parser.add_argument('--replay-failed', action='store_true',
+                        help='refetch the detail tabs recorded in failed_requests, then exit')
+    parser.add_argument('--refresh', action='store_true',
+                        help='walk the search results again, fetch details only of new, changed or stale doctors')
+    parser.add_argument('--reextract', action='store_true',
+                        help='re-run the extractors over the stored raw pages (STORE_RESPONSES), then exit')
+    parser.add_argument('--profile', action='store_true',
+                        help='time every stage of every doctor and write a profile report (PROFILE_STAGES)')
+    args = parser.parse_args()
+    if args.profile:
+        config.PROFILE_STAGES = True
+    
+    if args.replay_failed:
+        replay_failed()
+    elif args.reextract:
+        from response_store import reextract
+        create_database()
+        reextract()
+    else:
+        if args.refresh:
+            config.REFRESH = True
+        main()
 
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Two-stage scraping pipeline: result-list harvesting decoupled from details.
+
+scrape_prefix does search → pagination → 5 detail requests per doctor in one
+go, so the expansion decision for a prefix waits for ~500 detail requests.
+Here the work is split in two pools:
+
+    Stage 1 (HARVEST_WORKERS): search + pagination for a prefix only.
+        Cheap. Returns compact card records and total_cards, so capped
+        prefixes are expanded immediately.
+    Stage 2 (DETAIL_WORKERS): the 5-request detail chain for one doctor.
+        Each worker process keeps one session and p_auth and works
+        through a shared queue of cards coming from every prefix.
+        Records come back to the main process and are saved by a DbWriter.
+        With OFFLOAD_EXTRACTION they come back with the raw tab pages,
+        which are extracted by a third pool (EXTRACT_WORKERS processes)
+        on their way to the DbWriter.
+
+Both pools are fed continuously from the main process, the prefix tree is
+explored as fast as stage 1 allows and detail throughput is tuned on its own.
+Workers of both stages reuse one session (connection, cookies, p_auth) for
+every prefix or doctor they handle, see parallel_scraper.WorkerSession.
+"""
+
+import multiprocessing as mp
+from multiprocessing import Pool
+import queue
+import time
+from contextlib import nullcontext
+
+import config
+from smart_expansion import ExpansionPlanner, expansion_message
+from seen_index import SeenIndex, card_fingerprint
+from frontier import Frontier, PrefixQueue
+from db_writer import DbWriter
+from rate_limiter import pool_options
+import telemetry
+from response_store import extract_raw, extract_workers
+from parallel_scraper import (
+    get_worker_session,
+    harvest_cards,
+    parse_card,
+    fetch_details,
+    has_full_details,
+)
+
+
+def harvest_prefix(prefix, expand=False):
+    """
+    Stage 1: search + pagination for one prefix, no detail requests.
+    expand=True skips the pagination of prefixes that will be expanded.
+    Returns {'prefix', 'total_cards', 'total_results', 'pages', 'cards': [(data, ids), ...]} or an error dict.
+    """
+    process_id = mp.current_process().name
+    started = time.monotonic()
+
+    try:
+        worker = get_worker_session()
+
+        if not worker.ensure_p_auth():
+            print(f"[{process_id}] Prefix '{prefix}': Failed to get p_auth")
+            return {'prefix': prefix, 'error': 'No p_auth'}
+
+        all_cards, total_results = harvest_cards(worker, prefix, expand)
+
+        # Compact, picklable records instead of BeautifulSoup tags
+        cards = []
+        for card in all_cards:
+            data, ids = parse_card(card, prefix)
+            if data:
+                cards.append((data, ids))
+
+        pages_scraped = (len(all_cards) + 9) // 10
+        print(f"[{process_id}] Prefix '{prefix}': ✓ Collected {len(all_cards)} cards from {pages_scraped} pages")
+
+        return {'prefix': prefix, 'total_cards': len(all_cards), 'total_results': total_results,
+                'pages': pages_scraped, 'cards': cards}
+
+    except Exception as e:
+        print(f"[{process_id}] Prefix '{prefix}': ERROR - {e}")
+        return {'prefix': prefix, 'error': str(e)}
+
+    finally:
+        telemetry.reporter().count('scraper_worker_busy_seconds_total', time.monotonic() - started, pool='harvest')
+
+
+def fetch_doctor(card, tabs=None, extract=True):
+    """
+    Stage 2: fetch the detail tabs of one card (only `tabs` if given).
+    Returns the doctor record (with its raw pages if not extract);
+    saving is left to the scheduler's DbWriter.
+    """
+    data, ids = card
+    started = time.monotonic()
+    fetch_details(get_worker_session(), data, ids, tabs, extract)
+    telemetry.reporter().count('scraper_worker_busy_seconds_total', time.monotonic() - started, pool='detail')
+
+    return data
+
+
+def new_prefix_result(prefix, total_cards):
+    """Empty per-prefix result, filled in as its doctors come back"""
+    return {
+        'prefix': prefix,
+        'count': 0,
+        'total_cards': total_cards,
+        'details_complete': 0,
+        'duplicates': 0,
+        'skipped': 0,
+        'remaining': 0
+    }
+
+
+def pipeline_scrape(initial_prefixes, harvest_workers, detail_workers, expand=True):
+    """
+    Run the two-stage pipeline until every prefix (and its expansions) is harvested
+    and every harvested card has been through the detail stage.
+    Cards of doctors in the seen-RPPS index never reach the detail stage.
+
+    Progress is checkpointed in the frontier tables: prefixes harvested or
+    cards completed by a previous (interrupted) run are not requested again.
+    At most 2 × harvest_workers prefixes are in flight; the others wait in a
+    PrefixQueue so the highest-priority one is dispatched next.
+
+    Returns:
+        List of per-prefix results (same shape as scrape_prefix results)
+    """
+    events = queue.Queue()
+    results = {}
+    progress = telemetry.reporter()
+    pending_prefixes = 0
+    pending_doctors = 0
+    # All detail work is dispatched from here, so one in-memory index serves every worker
+    seen = SeenIndex() if config.SKIP_SEEN_DOCTORS else None
+    if seen is not None:
+        print(f"   Seen-RPPS index: {len(seen)} doctors already complete in the database")
+
+    planner = ExpansionPlanner()
+    frontier = Frontier()
+    frontier.seed(initial_prefixes, planner.priorities(initial_prefixes))
+    to_harvest = frontier.resumable_prefixes()
+    resumed_cards = frontier.pending_cards()
+    print(f"   Frontier: {frontier.counts()} → {len(to_harvest)} prefixes to harvest, "
+          f"{len(resumed_cards)} cards pending from a previous run")
+
+    # Only this process writes doctors, in batches
+    writer = DbWriter()
+
+    offload = config.OFFLOAD_EXTRACTION
+    # Both network pools draw from the same global request budget; all three report telemetry
+    with Pool(processes=harvest_workers, **pool_options()) as harvest_pool, \
+            Pool(processes=detail_workers, **pool_options()) as detail_pool, \
+            (Pool(processes=extract_workers(), **pool_options()) if offload else nullcontext()) as extract_pool:
+        # Started once the workers are forked: a fork while the writer thread is inside
+        # SQLite copies its locked mutexes into the children, which can then deadlock
+        writer.start()
+
+        def submit_prefix(prefix):
+            frontier.mark_harvesting(prefix)
+            harvest_pool.apply_async(
+                harvest_prefix, (prefix, expand),
+                callback=lambda result: events.put(('harvested', result)),
+                error_callback=lambda e: events.put(('harvested', {'prefix': prefix, 'error': str(e)}))
+            )
+
+        def on_fetched(doctor):
+            def on_saved(is_duplicate, error):
+                events.put(('doctor', {
+                    'prefix': doctor['prefix'],
+                    'rpps': doctor['rpps'],
+                    'name': doctor['name'],
+                    'is_duplicate': is_duplicate,
+                    'has_details': has_full_details(doctor),
+                    'error': error
+                }))
+            writer.save(doctor, on_saved)
+
+        def submit_doctor(card):
+            data = card[0]
+            results[data['prefix']]['remaining'] += 1
+
+            def on_error(e):
+                events.put(('doctor', {
+                    'prefix': data['prefix'], 'rpps': data['rpps'], 'name': data['name'], 'error': str(e)
+                }))
+
+            def on_raw(doctor):
+                extract_pool.apply_async(extract_raw, (doctor,), callback=on_fetched, error_callback=on_error)
+
+            detail_pool.apply_async(
+                fetch_doctor, (card, None, not offload),
+                callback=on_raw if offload else on_fetched,
+                error_callback=on_error
+            )
+
+        waiting = PrefixQueue(to_harvest, frontier.priorities())
+        max_in_flight = harvest_workers * 2
+
+        def dispatch_prefixes():
+            nonlocal in_flight
+            while waiting and in_flight < max_in_flight:
+                submit_prefix(waiting.pop())
+                in_flight += 1
+
+        in_flight = 0
+        pending_prefixes = len(waiting)
+        dispatch_prefixes()
+
+        progress.set('scraper_pool_workers', harvest_workers, pool='harvest')
+        progress.set('scraper_pool_workers', detail_workers, pool='detail')
+        if offload:
+            progress.set('scraper_pool_workers', extract_workers(), pool='extract')
+
+        for card in resumed_cards:
+            prefix = card[0]['prefix']
+            if seen is not None and not seen.claim(card[0]['rpps'], card_fingerprint(card[0])):
+                frontier.card_done(card[0]['rpps'])
+                continue
+            if prefix not in results:
+                info = frontier.prefix_info(prefix)
+                results[prefix] = new_prefix_result(prefix, info[1] if info else 0)
+            submit_doctor(card)
+            pending_doctors += 1
+        frontier.finish_harvested()
+
+        while pending_prefixes or pending_doctors:
+            kind, payload = events.get()
+            prefix = payload['prefix']
+            progress.set('scraper_queue_depth', len(waiting), queue='prefixes')
+            progress.set('scraper_queue_depth', pending_doctors, queue='doctors')
+            progress.set('scraper_queue_depth', writer.queue.qsize(), queue='db_writer')
+
+            if kind == 'harvested':
+                pending_prefixes -= 1
+                in_flight -= 1
+                dispatch_prefixes()
+
+                if payload.get('error'):
+                    frontier.mark_failed(prefix, payload['error'])
+                    results[prefix] = {'prefix': prefix, 'count': 0, 'error': payload['error']}
+                    continue
+
+                total_cards = payload['total_cards']
+                total_results = payload.get('total_results')
+                results[prefix] = new_prefix_result(prefix, total_cards)
+
+                # Expand right away, before any detail request of this prefix
+                children, pruned = planner.plan(prefix, total_cards, total_results) if expand else ([], [])
+                if children or pruned:
+                    print(expansion_message(prefix, total_cards, total_results, children, pruned))
+
+                cards = payload['cards']
+                captured = [card[0]['rpps'] for card in cards]
+                priorities = planner.priorities(
+                    children, total_results or total_cards,
+                    frontier.new_fraction(prefix, captured)) if children else {}
+                if config.MAX_DOCTORS_PER_PREFIX > 0:
+                    cards = cards[:config.MAX_DOCTORS_PER_PREFIX]
+                if seen is not None:
+                    fresh = [card for card in cards
+                             if seen.claim(card[0]['rpps'], card_fingerprint(card[0]))]
+                    results[prefix]['skipped'] = len(cards) - len(fresh)
+                    cards = fresh
+
+                # Checkpoint before dispatching anything
+                frontier.mark_harvested(prefix, total_cards, payload['pages'], children, cards,
+                                        total_results=total_results, pruned=pruned, captured=captured,
+                                        priorities=priorities)
+                if not cards:
+                    frontier.mark_done(prefix)
+
+                for child in children:
+                    waiting.push(child, priorities[child])
+                pending_prefixes += len(children)
+                dispatch_prefixes()
+
+                for card in cards:
+                    submit_doctor(card)
+                pending_doctors += len(cards)
+
+                print(f"   Queue: {pending_prefixes} prefixes to harvest, {pending_doctors} doctors to fetch\n")
+
+            elif kind == 'doctor':
+                pending_doctors -= 1
+                res = results[prefix]
+                res['remaining'] -= 1
+                if res['remaining'] == 0:
+                    frontier.mark_done(prefix)
+                    progress.done(prefix)
+
+                if payload.get('error'):
+                    # Card stays in the detail queue for the next run
+                    print(f"    ERROR scraping {payload['name']} ({prefix}): {payload['error']}")
+                    if seen is not None:
+                        seen.release(payload['rpps'])
+                    continue
+
+                res['count'] += 1
+                if payload['has_details']:
+                    res['details_complete'] += 1
+                    frontier.card_done(payload['rpps'])
+                elif seen is not None:
+                    seen.release(payload['rpps'])
+                if payload['is_duplicate']:
+                    res['duplicates'] += 1
+
+                progress.doctor(prefix, res['count'], res['count'] + res['remaining'],
+                                payload['has_details'], payload['is_duplicate'])
+
+    writer.close()
+    frontier.close()
+    print(f"   DB writer: {writer.rows} doctors saved in {writer.batches} batches")
+    if seen is not None:
+        print(f"   Seen-RPPS index: {seen.changed} known doctors refetched because their card changed")
+
+    for res in results.values():
+        res.pop('remaining', None)
+
+    return list(results.values())
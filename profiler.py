@@ -0,0 +1,164 @@
+"""
+Per-stage profile of every doctor (PROFILE_STAGES, opt-in).
+
+A slow run can be the network, the rate limiter, BeautifulSoup or SQLite;
+the metrics endpoint shows totals, not where one doctor's time goes. With
+PROFILE_STAGES each doctor record carries data['profile'] = {stage: [wall,
+cpu]} (seconds, cpu = time.thread_time of the thread doing the work) from
+one process to the next:
+
+    parse          share of its results page parse + parse_card
+    sleep          waiting for the rate limiter and retry backoffs
+    fetch:<action> network time of each detail request (DetailsPPAction,
+                   infoDetailPP, detailsPPDossierPro, ...), retries included
+    extract        the four tab extractors
+    save           its share of the database transaction that saved it
+
+When the doctor is saved its profile goes to the telemetry Reporter; the
+Monitor aggregates them into a StageProfile and main() writes the report
+(percentiles per stage and the stacked breakdown) next to the metrics JSON.
+In the async engine, cpu of the network stages also counts the other
+sessions served by the event loop in the meantime.
+"""
+
+import contextvars
+import random
+import time
+
+import config
+import telemetry
+
+
+# Stages in report order, others (unknown endpoints) come after them
+STAGE_ORDER = ('parse', 'sleep', 'fetch:DetailsPPAction', 'fetch:infoDetailPP', 'fetch:detailsPPDossierPro',
+               'fetch:detailsPPDiplomes', 'fetch:detailsPPPersonne', 'extract', 'save')
+
+# Profile of the doctor whose details are being fetched (per thread / asyncio task)
+_current = contextvars.ContextVar('profile', default=None)
+
+
+def clock():
+    """Start mark of a stage, for add()"""
+    return time.perf_counter(), time.thread_time()
+
+
+def add(profile, stage, start):
+    """Add the time since `start` (a clock() mark) to a stage of a profile"""
+    wall, cpu = start
+    entry = profile.setdefault(stage, [0.0, 0.0])
+    entry[0] += time.perf_counter() - wall
+    entry[1] += time.thread_time() - cpu
+
+
+def activate(data):
+    """Make data's profile the current one (limited_request adds its stages to it), returns a token for deactivate"""
+    return _current.set(data.get('profile'))
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def current():
+    """Profile of the doctor being fetched, None when not profiling"""
+    return _current.get()
+
+
+def finish(data, save_wall=0.0, save_cpu=0.0):
+    """Record the save stage and send the profile of a saved doctor to the telemetry Reporter"""
+    profile = data.pop('profile', None)
+    if profile is None:
+        return
+    entry = profile.setdefault('save', [0.0, 0.0])
+    entry[0] += save_wall
+    entry[1] += save_cpu
+    telemetry.reporter().profile(profile)
+
+
+def _sample(reservoir, seen, value, size):
+    """Reservoir sampling (algorithm R): keep `size` uniformly chosen values out of `seen`"""
+    if len(reservoir) < size:
+        reservoir.append(value)
+    else:
+        slot = random.randrange(seen)
+        if slot < size:
+            reservoir[slot] = value
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class StageProfile:
+    """Stage times of every profiled doctor: exact sums, percentiles over a reservoir sample"""
+
+    def __init__(self, sample_size=None):
+        self.sample_size = sample_size or config.PROFILE_SAMPLE_SIZE
+        self.doctors = 0
+        # stage → [doctors, wall sum, cpu sum, sample of per-doctor wall]
+        self.stages = {}
+        self.totals = []
+
+    def add(self, profile):
+        self.doctors += 1
+        for stage, (wall, cpu) in profile.items():
+            entry = self.stages.setdefault(stage, [0, 0.0, 0.0, []])
+            entry[0] += 1
+            entry[1] += wall
+            entry[2] += cpu
+            _sample(entry[3], entry[0], wall, self.sample_size)
+        _sample(self.totals, self.doctors, sum(wall for wall, _ in profile.values()), self.sample_size)
+
+    def ordered_stages(self):
+        known = [stage for stage in STAGE_ORDER if stage in self.stages]
+        return known + sorted(stage for stage in self.stages if stage not in STAGE_ORDER)
+
+    def report(self):
+        """Per-stage statistics in milliseconds per doctor, JSON-ready"""
+        wall_total = sum(entry[1] for entry in self.stages.values())
+        stages = {}
+        for stage in self.ordered_stages():
+            count, wall, cpu, sample = self.stages[stage]
+            stages[stage] = {
+                'doctors': count,
+                'mean_ms': wall / count * 1000,
+                'p50_ms': _percentile(sample, 0.50) * 1000,
+                'p90_ms': _percentile(sample, 0.90) * 1000,
+                'p99_ms': _percentile(sample, 0.99) * 1000,
+                'cpu_mean_ms': cpu / count * 1000,
+                'share': wall / wall_total if wall_total else 0.0,
+            }
+        return {
+            'doctors': self.doctors,
+            'total': {
+                'mean_ms': wall_total / self.doctors * 1000 if self.doctors else 0.0,
+                'p50_ms': _percentile(self.totals, 0.50) * 1000,
+                'p90_ms': _percentile(self.totals, 0.90) * 1000,
+                'p99_ms': _percentile(self.totals, 0.99) * 1000,
+            },
+            'stages': stages,
+        }
+
+    def render(self, width=60):
+        """Text report: one row per stage, then the stacked breakdown of a doctor's wall time"""
+        report = self.report()
+        lines = [f"  Stage profile of {report['doctors']} doctors (ms per doctor)",
+                 f"    {'stage':<26} {'mean':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'cpu':>8} {'share':>6}"]
+        for stage, row in report['stages'].items():
+            lines.append(f"    {stage:<26} {row['mean_ms']:8.1f} {row['p50_ms']:8.1f} {row['p90_ms']:8.1f} "
+                         f"{row['p99_ms']:8.1f} {row['cpu_mean_ms']:8.1f} {row['share']:6.1%}")
+        total = report['total']
+        lines.append(f"    {'total':<26} {total['mean_ms']:8.1f} {total['p50_ms']:8.1f} {total['p90_ms']:8.1f} "
+                     f"{total['p99_ms']:8.1f}")
+
+        symbols = '#=*+%@&o:~-.'
+        bar, legend = '', []
+        for symbol, (stage, row) in zip(symbols, report['stages'].items()):
+            bar += symbol * round(row['share'] * width)
+            legend.append(f"{symbol} {stage}")
+        lines.append(f"    |{bar}|")
+        lines.append(f"    {'  '.join(legend)}")
+        return lines
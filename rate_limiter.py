@@ -0,0 +1,148 @@
+"""
+Global adaptive rate limiter: one token bucket shared by every worker.
+
+The fixed DELAY_BETWEEN_* sleeps were applied per process, so the request
+rate seen by the site grew blindly with NUM_WORKERS. Here every request of
+every process (and every async session) takes a token from one bucket held
+in shared memory, and the bucket's rate is tuned by an AIMD controller:
+
+    - healthy response (status < 400, latency under RATE_LIMIT_LATENCY_TARGET):
+      additive increase, about RATE_LIMIT_INCREASE req/s per second
+    - 429, 403, 5xx, timeout or connection error: the rate is multiplied
+      by RATE_LIMIT_DECREASE (at most once per DECREASE_COOLDOWN seconds,
+      so a burst of in-flight failures counts once) and the bucket is drained
+    - slow or 4xx responses: the rate is held
+
+The scheduler creates the limiter; worker pools receive it (and the
+telemetry channel and the WORKER_SETTINGS of config) through install() as
+their initializer.
+"""
+
+import asyncio
+import multiprocessing as mp
+import time
+
+import config
+import telemetry
+
+
+# Slots of the shared state array
+_RATE, _TOKENS, _UPDATED, _LAST_DECREASE, _REQUESTS, _BACKOFFS = range(6)
+
+# Minimum seconds between two multiplicative decreases
+DECREASE_COOLDOWN = 1.0
+
+# Status codes that mean "slow down"
+BACKOFF_STATUSES = {403, 429}
+
+# config values the command line changes at run time: workers get them through
+# install(), as a worker started with spawn (Windows, macOS) re-imports config
+WORKER_SETTINGS = ('SKIP_SEEN_DOCTORS', 'REFRESH', 'PROFILE_STAGES')
+
+
+class RateLimiter:
+    """Token bucket + AIMD controller in shared memory (safe across processes)"""
+
+    def __init__(self, rate=None, min_rate=None, max_rate=None, burst=None):
+        self.min_rate = min_rate or config.RATE_LIMIT_MIN
+        self.max_rate = max_rate or config.RATE_LIMIT_MAX
+        self.burst = burst or config.RATE_LIMIT_BURST
+
+        self.state = mp.Array('d', 6)
+        self.state[_RATE] = rate or config.RATE_LIMIT_INITIAL
+        self.state[_TOKENS] = self.burst
+        self.state[_UPDATED] = time.monotonic()
+
+    @property
+    def rate(self):
+        return self.state[_RATE]
+
+    @property
+    def requests(self):
+        return int(self.state[_REQUESTS])
+
+    @property
+    def backoffs(self):
+        return int(self.state[_BACKOFFS])
+
+    def _take(self):
+        """Take a token if one is available, else return the seconds to wait for one"""
+        with self.state.get_lock():
+            state = self.state
+            now = time.monotonic()
+            state[_TOKENS] = min(self.burst, state[_TOKENS] + (now - state[_UPDATED]) * state[_RATE])
+            state[_UPDATED] = now
+
+            if state[_TOKENS] >= 1:
+                state[_TOKENS] -= 1
+                state[_REQUESTS] += 1
+                return 0
+            return (1 - state[_TOKENS]) / state[_RATE]
+
+    def acquire(self):
+        """Block until the global rate allows one more request"""
+        wait = self._take()
+        while wait:
+            time.sleep(wait)
+            wait = self._take()
+
+    async def acquire_async(self):
+        """acquire() for the asyncio engine"""
+        wait = self._take()
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self._take()
+
+    def record(self, status, latency):
+        """
+        Feed the outcome of a request to the AIMD controller.
+        status is the HTTP status, or None for a timeout / connection error.
+        """
+        if status is None or status in BACKOFF_STATUSES or status >= 500:
+            self._decrease(status)
+        elif status < 400 and latency <= config.RATE_LIMIT_LATENCY_TARGET:
+            with self.state.get_lock():
+                rate = self.state[_RATE]
+                self.state[_RATE] = min(self.max_rate, rate + config.RATE_LIMIT_INCREASE / rate)
+
+    def _decrease(self, status):
+        with self.state.get_lock():
+            now = time.monotonic()
+            if now - self.state[_LAST_DECREASE] < DECREASE_COOLDOWN:
+                return
+            old_rate = self.state[_RATE]
+            self.state[_RATE] = max(self.min_rate, old_rate * config.RATE_LIMIT_DECREASE)
+            self.state[_TOKENS] = 0
+            self.state[_LAST_DECREASE] = now
+            self.state[_BACKOFFS] += 1
+            new_rate = self.state[_RATE]
+
+        reason = status if status is not None else 'timeout/connection error'
+        print(f"    RATE LIMIT: {reason} → {old_rate:.1f} → {new_rate:.1f} req/s")
+
+
+# Limiter of this process (the scheduler's, inherited by pool workers via install)
+_limiter = None
+
+
+def get_rate_limiter():
+    """Limiter shared with this process' workers, created on first use"""
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter()
+    return _limiter
+
+
+def install(limiter, channel=None, settings=None):
+    """Pool initializer: make the worker use the scheduler's limiter, telemetry channel and settings"""
+    global _limiter
+    _limiter = limiter
+    for name, value in (settings or {}).items():
+        setattr(config, name, value)
+    telemetry.install(channel)
+
+
+def pool_options():
+    """Pool(...) keyword arguments that share this process' limiter, telemetry channel and settings with the workers"""
+    settings = {name: getattr(config, name) for name in WORKER_SETTINGS}
+    return {'initializer': install, 'initargs': (get_rate_limiter(), telemetry.channel(), settings)}
@@ -0,0 +1,212 @@
+"""
+Raw response store: the HTML of every detail tab, kept for re-extraction.
+
+The extractors in legacy/scraper/content_extractor.py turn each tab into
+JSON and the page itself used to be thrown away, so fixing an extractor
+meant scraping the whole site again. With STORE_RESPONSES the fetch layer
+also keeps the page:
+
+    RESPONSE_STORE_DIR/ab/cdef....zst   zstd-compressed HTML, named by the
+                                        sha256 of its content (identical
+                                        pages are stored once)
+    responses table                     (rpps, tab) → digest, written with
+                                        the doctor, in the same transaction
+
+`python parallel_scraper.py --reextract` runs the extractors over the
+stored pages on every core and updates the tab columns of professionals,
+without a single request to the site.
+
+extract_raw is also the extraction stage of a live run: fetch_details
+leaves the pages in data['raw'] and, with OFFLOAD_EXTRACTION, the pipeline
+and async engines run extract_raw in a pool of EXTRACT_WORKERS processes.
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+from multiprocessing import Pool
+from pathlib import Path
+
+import config
+import telemetry
+import profiler
+from detail_tables import rebuild_details
+from detail_codec import encode_tab
+from legacy.scraper.content_extractor import (
+    extract_situation_content,
+    extract_dossier_content,
+    extract_diplomes_content,
+    extract_personne_content
+)
+
+
+# professionals column of each tab → its extractor
+TAB_EXTRACTORS = {
+    'situation_data': extract_situation_content,
+    'dossier_data': extract_dossier_content,
+    'diplomes_data': extract_diplomes_content,
+    'personne_data': extract_personne_content,
+}
+
+_compressor = None
+_decompressor = None
+
+
+def create_response_index(conn):
+    """Create the responses table if missing"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS responses (
+            rpps TEXT NOT NULL,
+            tab TEXT NOT NULL,
+            digest TEXT NOT NULL,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (rpps, tab)
+        ) WITHOUT ROWID
+    ''')
+    conn.commit()
+
+
+def blob_path(digest):
+    return Path(config.RESPONSE_STORE_DIR) / digest[:2] / f'{digest[2:]}.zst'
+
+
+def store_response(html):
+    """Write a page to the store (if not there yet), return its digest"""
+    global _compressor
+    raw = html.encode('utf-8')
+    digest = hashlib.sha256(raw).hexdigest()
+    path = blob_path(digest)
+    if path.exists():
+        return digest
+
+    if _compressor is None:
+        import zstandard
+        _compressor = zstandard.ZstdCompressor(level=config.RESPONSE_STORE_LEVEL)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename: other workers may store the same page at the same time
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    tmp.write_bytes(_compressor.compress(raw))
+    os.replace(tmp, path)
+    return digest
+
+
+def load_response(digest):
+    """HTML of a stored page"""
+    global _decompressor
+    if _decompressor is None:
+        import zstandard
+        _decompressor = zstandard.ZstdDecompressor()
+    return _decompressor.decompress(blob_path(digest).read_bytes()).decode('utf-8')
+
+
+def extract_raw(data):
+    """
+    Store (STORE_RESPONSES) and extract the raw pages of a fetched doctor
+    (data['raw'] = {tab: html}), in place. A page that cannot be extracted
+    is recorded in data['failed_requests'] like a failed request.
+    """
+    responses = {}
+    profile = data.get('profile')
+    for tab, html in data.pop('raw', {}).items():
+        try:
+            if config.STORE_RESPONSES:
+                responses[tab] = store_response(html)
+            start = profiler.clock()
+            data[tab] = TAB_EXTRACTORS[tab](html)
+            telemetry.reporter().observe('scraper_extraction_seconds', time.perf_counter() - start[0], tab=tab)
+            if profile is not None:
+                profiler.add(profile, 'extract', start)
+        except Exception as e:
+            print(f"    ERROR extracting {tab} for {data.get('name', data['rpps'])}: {e}")
+            data.setdefault('failed_requests', {'ids': {}, 'tabs': {}})['tabs'][tab] = str(e) or repr(e)
+    if responses:
+        data['responses'] = responses
+    return data
+
+
+def extract_workers():
+    """Size of the extraction pool (EXTRACT_WORKERS, 0 = one per core)"""
+    return config.EXTRACT_WORKERS or os.cpu_count() or 1
+
+
+def record_responses(conn, doctors):
+    """Index the pages stored for saved doctors (data['responses'] = {tab: digest}), inside the caller's transaction"""
+    conn.executemany("INSERT OR REPLACE INTO responses (rpps, tab, digest) VALUES (?, ?, ?)", [
+        (data['rpps'], tab, digest)
+        for data in doctors
+        for tab, digest in data.get('responses', {}).items()
+    ])
+
+
+def stored_responses(conn):
+    """[(rpps, {tab: digest}), ...] of every doctor with stored pages"""
+    doctors = {}
+    for rpps, tab, digest in conn.execute('SELECT rpps, tab, digest FROM responses ORDER BY rpps'):
+        doctors.setdefault(rpps, {})[tab] = digest
+    return list(doctors.items())
+
+
+def extract_stored(item):
+    """Pool task: (rpps, {tab: digest}) → (rpps, {tab: extracted JSON}, {tab: error})"""
+    rpps, digests = item
+    extracted, errors = {}, {}
+    for tab, digest in digests.items():
+        try:
+            extracted[tab] = TAB_EXTRACTORS[tab](load_response(digest))
+        except Exception as e:
+            errors[tab] = str(e) or repr(e)
+    return rpps, extracted, errors
+
+
+def reextract(num_workers=None, db_path=None):
+    """
+    --reextract: run the extractors over every stored page, on num_workers
+    processes (default: all cores), and update the tab columns in batches
+    of DB_BATCH_SIZE doctors. No network access.
+    """
+    db_path = db_path or config.DATABASE_PATH
+    conn = sqlite3.connect(db_path, timeout=config.DB_TIMEOUT)
+    create_response_index(conn)
+    items = stored_responses(conn)
+    pages = sum(len(digests) for _, digests in items)
+    print(f"Re-extracting {pages} stored pages of {len(items)} doctors")
+    if not items:
+        conn.close()
+        return
+
+    num_workers = num_workers or os.cpu_count() or 1
+    start = time.time()
+    updated = failed = 0
+    batch = []
+
+    def flush():
+        # updated_at is left alone: it dates the fetch, which SeenIndex uses for
+        # freshness (SEEN_MAX_AGE_DAYS), and re-extraction fetches nothing
+        with conn:
+            for tab in TAB_EXTRACTORS:
+                conn.executemany(f'''
+                    UPDATE professionals SET {tab} = ? WHERE rpps = ?
+                ''', [(encode_tab(extracted[tab]), rpps) for rpps, extracted in batch if tab in extracted])
+        if config.NORMALIZE_DETAILS:
+            rebuild_details(conn, [rpps for rpps, _ in batch])
+        batch.clear()
+
+    with Pool(processes=num_workers) as pool:
+        chunksize = max(1, min(50, len(items) // (num_workers * 4)))
+        for idx, (rpps, extracted, errors) in enumerate(pool.imap_unordered(extract_stored, items, chunksize), 1):
+            for tab, error in errors.items():
+                print(f"    ERROR re-extracting {tab} of {rpps}: {error}")
+            failed += len(errors)
+            updated += len(extracted)
+            batch.append((rpps, extracted))
+            if len(batch) >= config.DB_BATCH_SIZE:
+                flush()
+            if idx % 1000 == 0:
+                print(f"  {idx}/{len(items)} doctors ({idx / (time.time() - start):.0f}/s)")
+    flush()
+    conn.close()
+
+    elapsed = time.time() - start
+    print(f"\nRe-extracted {updated} tabs in {elapsed:.1f}s on {num_workers} processes "
+          f"({updated / elapsed if elapsed else 0:.0f} tabs/s), {failed} failed")
@@ -0,0 +1,106 @@
+"""
+Retry policy and dead-letter table for HTTP requests.
+
+Every request goes through parallel_scraper.limited_request (or its async
+twin), which retries transient failures with exponential backoff and full
+jitter:
+
+    retryable      timeouts, connection errors, 429, 403 (site throttling), 5xx
+    not retryable  any other 4xx, parsing errors
+
+A detail tab that still fails after RETRY_ATTEMPTS is not lost: the doctor
+is saved with the tabs that worked and (rpps, tab, ids, error) goes to the
+failed_requests table. `python parallel_scraper.py --replay-failed` later
+refetches only those tabs. A row is deleted as soon as its tab is fetched.
+"""
+
+import json
+import random
+
+import config
+
+
+RETRYABLE_STATUSES = {403, 429}
+
+
+class RequestFailed(Exception):
+    """A request still failing (retryable status) after every attempt"""
+
+    def __init__(self, status, url):
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+
+
+def is_retryable_status(status):
+    return status in RETRYABLE_STATUSES or status >= 500
+
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    Seconds to wait before retry number `attempt` (1-based): full jitter over
+    RETRY_BACKOFF_BASE * 2^(attempt-1), capped at RETRY_BACKOFF_MAX.
+    A numeric Retry-After header is honoured as a minimum.
+    """
+    delay = random.uniform(0, min(config.RETRY_BACKOFF_MAX, config.RETRY_BACKOFF_BASE * 2 ** (attempt - 1)))
+    if retry_after and str(retry_after).isdigit():
+        delay = max(delay, min(config.RETRY_BACKOFF_MAX, int(retry_after)))
+    return delay
+
+
+# ----------------------------------------------------------------------------
+# Dead-letter table
+# ----------------------------------------------------------------------------
+
+def create_dead_letter_table(conn):
+    """Create the failed_requests table if missing"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS failed_requests (
+            rpps TEXT NOT NULL,
+            tab TEXT NOT NULL,
+            prefix TEXT,
+            ids TEXT,
+            error TEXT,
+            attempts INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (rpps, tab)
+        )
+    ''')
+    conn.commit()
+
+
+def record_failures(conn, doctors):
+    """
+    Update failed_requests for saved doctors (inside the caller's transaction):
+    tabs listed in data['failed_requests'] are (re)inserted, every other tab
+    of those doctors is cleared. Doctors without the key are left alone.
+    """
+    doctors = [data for data in doctors if 'failed_requests' in data]
+    if not doctors:
+        return
+
+    conn.executemany('DELETE FROM failed_requests WHERE rpps = ?', [(data['rpps'],) for data in doctors])
+    conn.executemany('''
+        INSERT INTO failed_requests (rpps, tab, prefix, ids, error, attempts)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [
+        (data['rpps'], tab, data.get('prefix', ''), json.dumps(data['failed_requests']['ids']),
+         error, data['failed_requests'].get('attempts', {}).get(tab, 1))
+        for data in doctors
+        for tab, error in data['failed_requests']['tabs'].items()
+    ])
+
+
+def pending_failures(conn):
+    """
+    Failed tabs grouped by doctor, oldest first:
+    [{'rpps', 'prefix', 'ids', 'tabs': [...], 'attempts': {tab: n}}, ...]
+    """
+    doctors = {}
+    rows = conn.execute('SELECT rpps, tab, prefix, ids, attempts FROM failed_requests ORDER BY created_at, rpps')
+    for rpps, tab, prefix, ids, attempts in rows:
+        entry = doctors.setdefault(rpps, {'rpps': rpps, 'prefix': prefix, 'ids': json.loads(ids),
+                                          'tabs': [], 'attempts': {}})
+        entry['tabs'].append(tab)
+        entry['attempts'][tab] = attempts
+    return list(doctors.values())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Running counts of the professionals table, kept up to date by triggers.
+
+monitor_parallel.py used to COUNT(*), GROUP BY search_prefix and scan every
+situation_data every 2 seconds: full-table scans that grow with the database
+and compete with the writer. Here triggers on professionals maintain, in
+the transaction that writes the doctor (save_doctor, DbWriter, reextract):
+
+    scrape_stats   one row: doctors, complete (situation tab fetched)
+    prefix_stats   the same per search_prefix
+
+so a refresh of the monitor reads a handful of rows whatever the size of
+the database. created_at is indexed for the recent-doctors rate of
+coverage_estimator.py. `python scrape_stats.py` recounts both tables from
+professionals.
+"""
+
+import sqlite3
+
+import config
+
+
+# A tab is fetched when its stored value is longer than '{}' (any DETAIL_ENCODING)
+_COMPLETE = 'IFNULL(LENGTH({row}.situation_data) > 10, 0)'
+
+
+def create_stats_tables(conn):
+    """Create the stats tables and their triggers if missing (counted from professionals when new)"""
+    new = not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'scrape_stats'").fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS scrape_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            doctors INTEGER NOT NULL DEFAULT 0,
+            complete INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS prefix_stats (
+            search_prefix TEXT PRIMARY KEY,
+            doctors INTEGER NOT NULL DEFAULT 0,
+            complete INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_professionals_created_at ON professionals(created_at)')
+
+    new_complete, old_complete = _COMPLETE.format(row='NEW'), _COMPLETE.format(row='OLD')
+    add_new = f'''
+        INSERT INTO prefix_stats (search_prefix, doctors, complete)
+        VALUES (IFNULL(NEW.search_prefix, ''), 1, {new_complete})
+        ON CONFLICT(search_prefix) DO UPDATE SET doctors = doctors + 1, complete = complete + excluded.complete;
+    '''
+    remove_old = f'''
+        UPDATE prefix_stats SET doctors = doctors - 1, complete = complete - {old_complete}
+        WHERE search_prefix = IFNULL(OLD.search_prefix, '');
+    '''
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS professionals_stats_insert AFTER INSERT ON professionals BEGIN
+            UPDATE scrape_stats SET doctors = doctors + 1, complete = complete + {new_complete};
+            {add_new}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS professionals_stats_update
+        AFTER UPDATE OF search_prefix, situation_data ON professionals BEGIN
+            UPDATE scrape_stats SET complete = complete - {old_complete} + {new_complete};
+            {remove_old}
+            {add_new}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS professionals_stats_delete AFTER DELETE ON professionals BEGIN
+            UPDATE scrape_stats SET doctors = doctors - 1, complete = complete - {old_complete};
+            {remove_old}
+        END
+    ''')
+    if new:
+        recount(conn)
+    conn.commit()
+
+
+def recount(conn):
+    """Rebuild both stats tables from professionals (one full scan)"""
+    complete = _COMPLETE.format(row='professionals')
+    with conn:
+        conn.execute('DELETE FROM scrape_stats')
+        conn.execute('DELETE FROM prefix_stats')
+        conn.execute(f'''
+            INSERT INTO scrape_stats (id, doctors, complete)
+            SELECT 0, COUNT(*), IFNULL(SUM({complete}), 0) FROM professionals
+        ''')
+        conn.execute(f'''
+            INSERT INTO prefix_stats (search_prefix, doctors, complete)
+            SELECT IFNULL(search_prefix, ''), COUNT(*), SUM({complete}) FROM professionals
+            GROUP BY IFNULL(search_prefix, '')
+        ''')
+
+
+def totals(conn):
+    """(doctors, complete) of the whole table"""
+    return conn.execute('SELECT doctors, complete FROM scrape_stats').fetchone() or (0, 0)
+
+
+def top_prefixes(conn, limit=20):
+    """[(search_prefix, doctors, complete), ...] of the prefixes with the most doctors"""
+    return conn.execute('SELECT search_prefix, doctors, complete FROM prefix_stats WHERE doctors > 0 '
+                        'ORDER BY doctors DESC, search_prefix LIMIT ?', (limit,)).fetchall()
+
+
+def recent_doctors(conn, limit=5):
+    """[(name, search_prefix), ...] of the last inserted doctors (rowid order, no scan)"""
+    return conn.execute('SELECT name, search_prefix FROM professionals ORDER BY rowid DESC LIMIT ?',
+                        (limit,)).fetchall()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Recount the scrape_stats and prefix_stats tables')
+    parser.add_argument('--db', default=config.DATABASE_PATH)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db, timeout=config.DB_TIMEOUT)
+    create_stats_tables(conn)
+    recount(conn)
+    doctors, complete = totals(conn)
+    conn.close()
+    print(f"{doctors} doctors, {complete} with their situation tab")
@@ -0,0 +1,135 @@
+"""
+Seen-RPPS index: skip detail requests for doctors we already have.
+
+Prefixes overlap heavily (a "Martin" shows up under 'ma', 'mar', 'mart',
+'ar', 'in', ...), so most harvested cards are doctors already in the
+professionals table. The index is consulted before any detail request is
+issued, so a repeat costs zero extra HTTP requests.
+
+A doctor counts as seen when its row has all 4 detail tabs and was updated
+less than SEEN_MAX_AGE_DAYS ago (freshness policy), and the card listed now
+still has the fingerprint stored with the row (name, profession, address,
+phone, email unchanged). Doctors claimed during the current run are also
+seen, so two prefixes never fetch the same RPPS at the same time.
+
+The pipeline and async engines dispatch every detail request from the
+scheduler and keep the index there. The process engine's workers fetch
+details themselves: they share one index hosted by SeenIndexManager.
+"""
+
+import hashlib
+import sqlite3
+import threading
+from multiprocessing.managers import SyncManager
+
+import config
+
+
+# Card fields whose change makes a known doctor worth fetching again
+FINGERPRINT_FIELDS = ('name', 'profession', 'address', 'phone', 'email')
+
+
+def card_fingerprint(data):
+    """Short hash of the card fields of a doctor record (or professionals row as a dict)"""
+    text = '\x1f'.join((data.get(field) or '').strip() for field in FINGERPRINT_FIELDS)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def _fresh_condition(max_age_days):
+    """SQL condition (and params) for a complete, fresh professionals row"""
+    condition = '''
+        LENGTH(situation_data) > 10 AND LENGTH(dossier_data) > 10
+        AND LENGTH(diplomes_data) > 10 AND LENGTH(personne_data) > 10
+    '''
+    params = ()
+    if max_age_days > 0:
+        condition += " AND updated_at >= datetime('now', ?)"
+        params = (f'-{max_age_days} days',)
+    return condition, params
+
+
+class SeenIndex:
+    """
+    In-memory set of RPPS backed by the professionals table, with the card
+    fingerprint stored for each.
+
+    preload=True loads every fresh RPPS up front (one scan, for the process
+    that dispatches all detail work, or the SeenIndexManager serving every
+    worker). preload=False only checks the database row of RPPS not already
+    in memory (for a worker process on its own). claim and release are
+    thread-safe.
+    """
+
+    def __init__(self, db_path=None, max_age_days=None, preload=True):
+        self.db_path = db_path or config.DATABASE_PATH
+        self.max_age_days = config.SEEN_MAX_AGE_DAYS if max_age_days is None else max_age_days
+        self.preload = preload
+        self.seen = set()
+        self.claimed = set()
+        self.fingerprints = {}
+        self.changed = 0
+        self.lock = threading.Lock()
+
+        if preload:
+            condition, params = _fresh_condition(self.max_age_days)
+            conn = sqlite3.connect(self.db_path, timeout=config.DB_TIMEOUT)
+            rows = conn.execute(f'SELECT rpps, card_fingerprint FROM professionals WHERE {condition}', params)
+            self.fingerprints.update(rows)
+            self.seen.update(self.fingerprints)
+            conn.close()
+
+    def __len__(self):
+        return len(self.seen)
+
+    def __contains__(self, rpps):
+        if rpps in self.seen:
+            return True
+        if self.preload:
+            return False
+
+        condition, params = _fresh_condition(self.max_age_days)
+        conn = sqlite3.connect(self.db_path, timeout=config.DB_TIMEOUT)
+        row = conn.execute(f'SELECT card_fingerprint FROM professionals WHERE rpps = ? AND {condition}',
+                           (rpps,) + params).fetchone()
+        conn.close()
+        if row:
+            self.seen.add(rpps)
+            self.fingerprints[rpps] = row[0]
+        return row is not None
+
+    def claim(self, rpps, fingerprint=None):
+        """
+        Return True if the caller should fetch this doctor's details: new,
+        stale, or listed with a card fingerprint different from the stored one.
+        The RPPS is marked claimed so nobody else fetches it.
+        """
+        with self.lock:
+            if rpps in self:
+                stored = self.fingerprints.get(rpps)
+                if rpps in self.claimed or fingerprint is None or stored is None or stored == fingerprint:
+                    return False
+                self.changed += 1
+            self.seen.add(rpps)
+            self.claimed.add(rpps)
+            return True
+
+    def release(self, rpps):
+        """Forget a claimed RPPS whose details could not be fetched, so it can be retried"""
+        with self.lock:
+            self.seen.discard(rpps)
+            self.claimed.discard(rpps)
+
+    def counts(self):
+        """(doctors in the index, known doctors claimed again because their card changed)"""
+        return len(self.seen), self.changed
+
+
+class SeenIndexManager(SyncManager):
+    """
+    SyncManager that also serves one SeenIndex: manager.SeenIndex(...)
+    returns a proxy the worker processes all claim through (one round trip
+    per card), so the whole pool shares the index of the scheduler.
+    """
+
+
+SeenIndexManager.register('SeenIndex', SeenIndex, exposed=('claim', 'release', 'counts'))
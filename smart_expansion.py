@@ -1,60 +1,377 @@
 """
 Smart prefix expansion for complete database coverage
 Automatically expands prefixes that hit pagination limits
+
+The site lists at most 100 results (10 pages) per search, so a prefix with
+more results is split into its 26 children. When the first results page
+shows the total number of results (span.nombre), the decision is exact and
+is taken before paginating (PREDICTIVE_EXPANSION). Children whose last two
+letters never occur in the names already in the database ('qx', 'zq', ...)
+are pruned (PRUNE_EXPANSION) and recorded as 'pruned' in the frontier.
+
+With PRIORITIZE_FRONTIER, pending prefixes are dispatched by expected yield
+(ExpansionPlanner.priority) instead of in list order.
 """
 
+import re
+import sqlite3
+import time
+import unicodedata
+from collections import Counter
+
+import config
+
+
 def generate_expanded_prefixes(prefix):
     """Generate sub-prefixes: 'a' → ['aa', 'ab', ..., 'az']"""
     return [prefix + letter for letter in 'abcdefghijklmnopqrstuvwxyz']
 
 
-def should_expand(total_cards, max_pages=10):
+def should_expand(total_cards, max_pages=10, total_results=None):
     """
     Check if prefix needs expansion
-    If we collected ~100 cards (10 pages × 10 cards), there might be more
+    With the results count of the first page (total_results) this is exact:
+    more results than max_pages pages can list.
+    Without it: if we collected ~100 cards (10 pages × 10 cards), there might be more
     """
+    if total_results is not None:
+        return total_results > max_pages * 10
     return total_cards >= (max_pages * 10 - 5)  # Allow 5 card margin
 
 
-def smart_scrape(scrape_function, initial_prefixes, num_workers, progress_queue=None):
+def will_expand(total_results):
+    """True if the results count of the first page already decides expansion: no need to paginate"""
+    return config.PREDICTIVE_EXPANSION and total_results is not None and should_expand(0, total_results=total_results)
+
+
+# Words of a name, once accents are stripped
+_WORD = re.compile(r'[a-z]+')
+
+
+def name_words(name):
+    """'DUPRÉ-LÉON Hélène' → ['dupre', 'leon', 'helene']"""
+    ascii_name = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode('ascii')
+    return _WORD.findall(ascii_name.lower())
+
+
+class NameBigrams:
+    """
+    Letter-bigram counts of the names (surnames and first names) in the
+    professionals table, loaded incrementally by rowid, and counts of the
+    words starting with every prefix of up to PREFIX_COUNT_LENGTH letters.
+    """
+
+    PREFIX_COUNT_LENGTH = 3
+
+    def __init__(self, db_path=None, max_age=60):
+        self.db_path = db_path or config.DATABASE_PATH
+        self.max_age = max_age
+        self.counts = Counter()
+        self.prefixes = Counter()
+        self.names = 0
+        self.last_rowid = 0
+        self.loaded_at = None
+
+    def add(self, name):
+        self.names += 1
+        for word in name_words(name):
+            self.counts.update(word[i:i + 2] for i in range(len(word) - 1))
+            self.prefixes.update(word[:n] for n in range(1, min(len(word), self.PREFIX_COUNT_LENGTH) + 1))
+
+    def share(self, prefix):
+        """Estimated fraction of the names matching prefix[:-1] that also match prefix"""
+        parent = prefix[:-1]
+        if len(prefix) <= self.PREFIX_COUNT_LENGTH and self.prefixes[parent]:
+            return self.prefixes[prefix] / self.prefixes[parent]
+        following = sum(count for bigram, count in self.counts.items() if bigram[0] == prefix[-2])
+        if following:
+            return self.counts[prefix[-2:]] / following
+        return 1 / 26
+
+    def start_share(self, prefix):
+        """
+        Estimated fraction of the names starting with prefix: share of its
+        first letter (add-one smoothed) × share() of each following letter.
+        0 for a prefix no saved name continues ('qx').
+        """
+        words = sum(self.prefixes[letter] for letter in 'abcdefghijklmnopqrstuvwxyz')
+        share = (self.prefixes[prefix[0]] + 1) / (words + 26)
+        for end in range(2, len(prefix) + 1):
+            share *= self.share(prefix[:end])
+        return share
+
+    def refresh(self):
+        """Add the names saved since the last load (at most every max_age seconds)"""
+        if self.loaded_at is not None and time.monotonic() - self.loaded_at < self.max_age:
+            return
+        self.loaded_at = time.monotonic()
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=config.DB_TIMEOUT)
+            try:
+                rows = conn.execute('SELECT rowid, name FROM professionals WHERE rowid > ? ORDER BY rowid',
+                                    (self.last_rowid,)).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return
+        for rowid, name in rows:
+            self.add(name)
+            self.last_rowid = rowid
+
+
+class ExpansionPlanner:
+    """Scheduler-side expansion decisions: which prefixes to expand, into which children"""
+
+    # Priority of a prefix nothing is known about yet: before every scored prefix
+    UNSCORED = 1e9
+
+    def __init__(self, db_path=None):
+        use_model = config.PRUNE_EXPANSION or config.PRIORITIZE_FRONTIER
+        self.bigrams = NameBigrams(db_path) if use_model else None
+        self.pruned = 0
+
+    def priority(self, prefix, parent_size=None, new_fraction=1.0):
+        """
+        Expected number of new doctors a pending prefix will list:
+        parent_size (results count, or cards, of its parent) × the share of
+        the parent's names observed to continue with its letter × the
+        parent's fraction of new doctors (new_fraction). An initial prefix
+        has the whole directory as parent: the saved names are taken as a
+        sample of it, so the estimate is its share of them (NameBigrams.
+        start_share, low for unlikely prefixes) × new_fraction, scaled by
+        the number of names. UNSCORED only while the database holds no
+        names; 0 for everything when PRIORITIZE_FRONTIER is off.
+        """
+        if not config.PRIORITIZE_FRONTIER:
+            return 0.0
+        self.bigrams.refresh()
+        if parent_size is None:
+            if not self.bigrams.names:
+                return self.UNSCORED
+            return self.bigrams.names * self.bigrams.start_share(prefix) * new_fraction
+        if not self.bigrams.names:
+            return parent_size / 26 * new_fraction
+        return parent_size * self.bigrams.share(prefix) * new_fraction
+
+    def priorities(self, prefixes, parent_size=None, new_fraction=1.0):
+        """{prefix: priority} for initial prefixes (parent_size None) or the children of one parent"""
+        return {prefix: self.priority(prefix, parent_size, new_fraction) for prefix in prefixes}
+
+    def plan(self, prefix, total_cards, total_results=None):
+        """
+        (children, pruned) of a harvested prefix, both empty if it needs no
+        expansion. Nothing is pruned until the database holds
+        EXPANSION_MODEL_MIN_NAMES names.
+        """
+        if not should_expand(total_cards, total_results=total_results):
+            return [], []
+
+        children = generate_expanded_prefixes(prefix)
+        if self.bigrams is None:
+            return children, []
+
+        if not config.PRUNE_EXPANSION:
+            return children, []
+
+        self.bigrams.refresh()
+        if self.bigrams.names < config.EXPANSION_MODEL_MIN_NAMES:
+            return children, []
+
+        kept = [child for child in children if self.bigrams.counts[child[-2:]] >= config.EXPANSION_MIN_BIGRAM_COUNT]
+        pruned = [child for child in children if child not in kept]
+        self.pruned += len(pruned)
+        return kept, pruned
+
+
+def expansion_message(prefix, total_cards, total_results, children, pruned):
+    """Log line of an expansion"""
+    found = f"{total_results} results" if total_results is not None else f"{total_cards} cards"
+    skipped = f", {len(pruned)} pruned ({' '.join(pruned)})" if pruned else ""
+    return f"\n🔄 Expanding '{prefix}' ({found}) → {len(children)} sub-prefixes{skipped}"
+
+
+def smart_scrape(scrape_function, initial_prefixes, num_workers, expand=True):
     """
     Scrape with automatic prefix expansion
     
+    One persistent Pool is fed continuously: the scrape function reports
+    ('paginated', prefix, total_cards, total_results, captured) on `events`
+    as soon as it has collected the result cards, and the children of a prefix
+    that hit the limit are submitted right away, while its detail scraping still runs.
+    Workers never wait on a batch barrier. Each worker holds one prefix at
+    a time; the rest wait in a PrefixQueue, highest priority first.
+    
+    The doctors come back on `events` too, ('doctor', record), and are saved
+    by one DbWriter thread in batches. A prefix is done once the worker
+    returned and all its doctors are committed. With SKIP_SEEN_DOCTORS the
+    workers claim every card in one SeenIndex shared through the manager.
+    
+    Prefix states are checkpointed in the frontier table, so a restarted run
+    skips prefixes a previous run already finished.
+    
     Args:
-        scrape_function: The scraping function (takes prefix, progress_queue)
+        scrape_function: The scraping function (takes prefix, events, expand, seen)
         initial_prefixes: Starting prefixes (e.g., ['a', 'b', 'c'])
         num_workers: Number of concurrent workers
-        progress_queue: Queue for progress updates
+        expand: Expand capped prefixes (False: scrape initial_prefixes only)
     
     Returns:
         List of all results
     """
+    from collections import defaultdict
     from multiprocessing import Pool
-    from functools import partial
+    from frontier import Frontier, PrefixQueue
+    from seen_index import SeenIndexManager
+    from rate_limiter import pool_options
+    from db_writer import DbWriter
+    from parallel_scraper import has_full_details
+    import telemetry
     
-    to_scrape = list(initial_prefixes)
     all_results = []
+    expanded = set()
+    planner = ExpansionPlanner()
+    
+    frontier = Frontier()
+    frontier.seed(initial_prefixes, planner.priorities(initial_prefixes))
+    # Details are scraped inline: a harvested prefix that isn't done must be redone
+    to_scrape = frontier.resumable_prefixes(include_harvested=True)
+    print(f"   Frontier: {frontier.counts()} → {len(to_scrape)} prefixes to scrape")
     
-    while to_scrape:
-        # Take next batch
-        batch = to_scrape[:num_workers]
-        to_scrape = to_scrape[num_workers:]
+    # Only this process writes doctors, in batches
+    writer = DbWriter()
+    # Doctors handed to the writer and not committed yet, per prefix
+    unsaved = defaultdict(int)
+    # Duplicates / failed saves (and how many of those had full details) per prefix
+    saves = defaultdict(lambda: {'duplicates': 0, 'failed': 0, 'failed_details': 0})
+    # Results of prefixes whose worker returned while their doctors were still unsaved
+    finished = {}
+    
+    with SeenIndexManager() as manager, Pool(processes=num_workers, **pool_options()) as pool:
+        # Started once the workers are forked, see pipeline_scrape
+        writer.start()
+        events = manager.Queue()
+        # Workers fetch details themselves: one index in the manager serves them all
+        seen = manager.SeenIndex(config.DATABASE_PATH, config.SEEN_MAX_AGE_DAYS) if config.SKIP_SEEN_DOCTORS else None
+        if seen is not None:
+            print(f"   Seen-RPPS index: {seen.counts()[0]} doctors already complete in the database")
+        waiting = PrefixQueue(to_scrape, frontier.priorities())
+        pending = len(waiting)
+        in_flight = 0
+        progress = telemetry.reporter()
+        progress.set('scraper_pool_workers', num_workers, pool='prefix')
+        
+        def submit(prefix):
+            frontier.mark_harvesting(prefix)
+            pool.apply_async(
+                scrape_function,
+                (prefix,),
+                {'events': events, 'expand': expand, 'seen': seen},
+                callback=lambda result: events.put(('done', result)),
+                error_callback=lambda e: events.put(('done', {'prefix': prefix, 'count': 0, 'error': str(e)}))
+            )
+        
+        def dispatch():
+            nonlocal in_flight
+            while waiting and in_flight < num_workers:
+                submit(waiting.pop())
+                in_flight += 1
+            progress.set('scraper_queue_depth', len(waiting), queue='prefixes')
         
-        # Scrape batch in parallel
-        scrape_with_queue = partial(scrape_function, progress_queue=progress_queue)
-        with Pool(processes=min(num_workers, len(batch))) as pool:
-            results = pool.map(scrape_with_queue, batch)
+        def maybe_expand(prefix, total_cards, total_results=None, captured=()):
+            if prefix in expanded:
+                return 0
+            expanded.add(prefix)
+            if frontier.children(prefix):
+                # Expanded by the run we resume: its children were queued from the frontier
+                frontier.mark_harvested(prefix, total_cards, (total_cards + 9) // 10,
+                                        total_results=total_results, captured=captured)
+                return 0
+            children, pruned = planner.plan(prefix, total_cards, total_results) if expand else ([], [])
+            priorities = planner.priorities(
+                children, total_results or total_cards,
+                frontier.new_fraction(prefix, captured)) if children else {}
+            # Only children the frontier didn't have yet are queued (and counted as pending)
+            children = frontier.mark_harvested(prefix, total_cards, (total_cards + 9) // 10, children,
+                                               total_results=total_results, pruned=pruned, captured=captured,
+                                               priorities=priorities)
+            if not children and not pruned:
+                return 0
+            for child in children:
+                waiting.push(child, priorities[child])
+            dispatch()
+            print(expansion_message(prefix, total_cards, total_results, children, pruned))
+            return len(children)
         
-        # Check which need expansion
-        for result in results:
+        def save(data):
+            prefix = data['prefix']
+            unsaved[prefix] += 1
+            
+            def on_saved(is_duplicate, error):
+                events.put(('saved', prefix, is_duplicate, error, error is not None and has_full_details(data)))
+            writer.save(data, on_saved)
+        
+        def complete(result):
+            """The worker returned and every doctor of the prefix is committed"""
+            nonlocal pending
+            pending -= 1
+            prefix = result['prefix']
+            saved = saves.pop(prefix, None)
+            if result.get('error'):
+                frontier.mark_failed(prefix, result['error'])
+            else:
+                if saved:
+                    result['duplicates'] = saved['duplicates']
+                    result['count'] -= saved['failed']
+                    result['details_complete'] -= saved['failed_details']
+                frontier.mark_done(prefix)
             all_results.append(result)
+            print(f"   Queue: {pending} prefixes pending, {len(all_results)} done\n")
+        
+        dispatch()
+        
+        while pending:
+            event = events.get()
+            progress.set('scraper_queue_depth', writer.queue.qsize(), queue='db_writer')
+            
+            if event[0] == 'paginated':
+                # Pagination finished: enqueue children before details are scraped
+                _, prefix, total_cards, total_results, captured = event
+                pending += maybe_expand(prefix, total_cards, total_results, captured)
+            
+            elif event[0] == 'doctor':
+                save(event[1])
             
-            # If hit the limit, expand
-            if not result.get('error') and should_expand(result.get('total_cards', 0)):
-                expanded = generate_expanded_prefixes(result['prefix'])
-                to_scrape.extend(expanded)
-                print(f"\n🔄 Expanding '{result['prefix']}' ({result['total_cards']} cards) → {len(expanded)} sub-prefixes")
-                print(f"   Queue: {len(to_scrape)} prefixes remaining\n")
+            elif event[0] == 'saved':
+                _, prefix, is_duplicate, error, had_details = event
+                unsaved[prefix] -= 1
+                if error:
+                    print(f"    ERROR saving a doctor of '{prefix}': {error}")
+                    saves[prefix]['failed'] += 1
+                    saves[prefix]['failed_details'] += had_details
+                elif is_duplicate:
+                    saves[prefix]['duplicates'] += 1
+                    progress.count('scraper_doctors_duplicate_total')
+                if not unsaved[prefix] and prefix in finished:
+                    complete(finished.pop(prefix))
+            
+            elif event[0] == 'done':
+                # Every doctor of this prefix was put on `events` before the worker returned
+                result = event[1]
+                in_flight -= 1
+                if not result.get('error'):
+                    # Fallback for scrape functions that don't report pagination
+                    pending += maybe_expand(result['prefix'], result.get('total_cards', 0), result.get('total_results'))
+                dispatch()
+                if unsaved[result['prefix']]:
+                    finished[result['prefix']] = result
+                else:
+                    complete(result)
+        
+        # Callbacks of the last batch still put on `events`: close before the manager
+        writer.close()
+        if seen is not None:
+            print(f"   Seen-RPPS index: {seen.counts()[1]} known doctors refetched because their card changed")
     
+    frontier.close()
+    print(f"   DB writer: {writer.rows} doctors saved in {writer.batches} batches")
     return all_results
-
@@ -0,0 +1,236 @@
+"""
+Progress telemetry: batched counters from every worker, rendered by the main process.
+
+Every saved doctor used to be one put() on a Manager queue proxy (a
+round-trip to the manager process) and one log line, flushed to the log
+file, in the main process. Now each process counts in its own Reporter and
+sends at most one batch every TELEMETRY_INTERVAL seconds on a plain
+multiprocessing queue (put() hands the batch to a feeder thread and returns).
+The Monitor thread of the main process merges the batches and logs one line
+every TELEMETRY_RENDER_INTERVAL seconds:
+
+    Progress: 1520 doctors (38.2/s, avg 35.1/s), 1490 with details, 12 duplicates | 3 prefixes: ba 33/50, ...
+
+Pool workers get the channel with the rate limiter (rate_limiter.pool_options).
+
+The batches also carry the metrics of metrics.py, served by the Monitor on
+http://METRICS_HOST:METRICS_PORT/metrics, and the stage profiles of
+profiler.py (PROFILE_STAGES), aggregated in Monitor.profile.
+"""
+
+import multiprocessing as mp
+import queue
+import threading
+import time
+
+import config
+import metrics
+
+
+# Channel of this process (the Monitor's, inherited by pool workers via install)
+_channel = None
+_reporter = None
+
+
+class Reporter:
+    """Per-process progress and metrics, sent as one batch per TELEMETRY_INTERVAL"""
+
+    def __init__(self, channel=None, interval=None):
+        self.channel = channel
+        self.interval = config.TELEMETRY_INTERVAL if interval is None else interval
+        # The DbWriter thread records too (pipeline and async engines)
+        self.lock = threading.Lock()
+        self.metrics = metrics.Registry()
+        self.prefixes = {}
+        self.profiles = []
+        self.last_flush = time.monotonic()
+
+    def doctor(self, prefix, idx, total, has_details=False, is_duplicate=False):
+        """Count a saved doctor, card idx of the total of its prefix"""
+        with self.lock:
+            self.metrics.count('scraper_doctors_total')
+            if has_details:
+                self.metrics.count('scraper_doctors_with_details_total')
+            if is_duplicate:
+                self.metrics.count('scraper_doctors_duplicate_total')
+            self.prefixes[prefix] = (idx, total)
+        self.tick()
+
+    def done(self, prefix):
+        """The prefix went through the detail stage, send its final state now"""
+        with self.lock:
+            self.prefixes[prefix] = None
+        self.flush()
+
+    def count(self, name, value=1, **labels):
+        with self.lock:
+            self.metrics.count(name, value, **labels)
+        self.tick()
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.metrics.set(name, value, **labels)
+        self.tick()
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            self.metrics.observe(name, value, **labels)
+        self.tick()
+
+    def profile(self, profile):
+        """Stage profile of a saved doctor (see profiler.py)"""
+        with self.lock:
+            self.profiles.append(profile)
+        self.tick()
+
+    def tick(self):
+        if time.monotonic() - self.last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            batch = (self.metrics, self.prefixes, self.profiles)
+            self.metrics = metrics.Registry()
+            self.prefixes = {}
+            self.profiles = []
+            self.last_flush = time.monotonic()
+        if self.channel is not None and any(batch):
+            self.channel.put(batch)
+
+
+def channel():
+    """Telemetry channel of this process, None when no Monitor runs"""
+    return _channel
+
+
+def install(channel):
+    """Pool initializer part: report to the scheduler's Monitor"""
+    global _channel, _reporter
+    _channel = channel
+    _reporter = Reporter(channel)
+    if channel is not None:
+        # Idle workers still send what they counted last
+        threading.Thread(target=_flush_periodically, args=(_reporter,), daemon=True).start()
+
+
+def _flush_periodically(current):
+    while current is _reporter:
+        time.sleep(current.interval)
+        current.flush()
+
+
+def reporter():
+    """Reporter of this process (counts are dropped when no Monitor runs)"""
+    global _reporter
+    if _reporter is None:
+        _reporter = Reporter(_channel)
+    return _reporter
+
+
+class Monitor:
+    """
+    Main-process side: merges the batches of every process, logs periodic
+    progress lines and serves the merged metrics (METRICS_PORT, 0 = off)
+    """
+
+    def __init__(self, log=print, interval=None):
+        self.log = log
+        self.interval = config.TELEMETRY_RENDER_INTERVAL if interval is None else interval
+        self.channel = mp.Queue()
+        self.lock = threading.Lock()
+        self.metrics = metrics.Registry()
+        self.prefixes = {}
+        self.profile = None
+        self.server = None
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def __enter__(self):
+        install(self.channel)
+        self.started = self.last_render = time.monotonic()
+        self.last_doctors = 0
+        self.thread.start()
+        if config.METRICS_PORT:
+            try:
+                self.server = metrics.serve(self.exposition, config.METRICS_HOST, config.METRICS_PORT)
+                self.log(f"   Metrics: http://{config.METRICS_HOST}:{config.METRICS_PORT}/metrics")
+            except OSError as e:
+                self.log(f"   Metrics: endpoint disabled, cannot listen on port {config.METRICS_PORT} ({e})")
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def merge(self, batch):
+        registry, prefixes, profiles = batch
+        with self.lock:
+            self.metrics.merge(registry)
+            if profiles:
+                if self.profile is None:
+                    from profiler import StageProfile
+                    self.profile = StageProfile()
+                for profile in profiles:
+                    self.profile.add(profile)
+            for prefix, progress in prefixes.items():
+                if progress is None or progress[0] >= progress[1]:
+                    self.prefixes.pop(prefix, None)
+                else:
+                    self.prefixes[prefix] = progress
+
+    def exposition(self):
+        """Merged metrics plus the rate limiter's state, in the Prometheus text format"""
+        from rate_limiter import get_rate_limiter
+        limiter = get_rate_limiter()
+        with self.lock:
+            self.metrics.set('scraper_rate_limit_rps', limiter.rate)
+            self.metrics.counters[('scraper_rate_limit_backoffs_total', ())] = limiter.backoffs
+            self.metrics.set('scraper_uptime_seconds', round(time.monotonic() - self.started, 3))
+            return self.metrics.exposition()
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                self.merge(self.channel.get(timeout=min(1.0, self.interval)))
+            except queue.Empty:
+                pass
+            if time.monotonic() - self.last_render >= self.interval:
+                self.render()
+
+    def render(self):
+        now = time.monotonic()
+        with self.lock:
+            doctors = self.metrics.total('scraper_doctors_total')
+            details = self.metrics.total('scraper_doctors_with_details_total')
+            duplicates = self.metrics.total('scraper_doctors_duplicate_total')
+            prefixes = sorted(self.prefixes.items())
+        rate = (doctors - self.last_doctors) / max(now - self.last_render, 1e-9)
+        average = doctors / max(now - self.started, 1e-9)
+        self.last_render, self.last_doctors = now, doctors
+
+        line = (f"   Progress: {doctors} doctors ({rate:.1f}/s, avg {average:.1f}/s), "
+                f"{details} with details, {duplicates} duplicates")
+        if prefixes:
+            shown = prefixes[:config.TELEMETRY_MAX_PREFIXES]
+            more = len(prefixes) - len(shown)
+            line += (f" | {len(prefixes)} prefixes: "
+                     + ', '.join(f"{prefix} {idx}/{total}" for prefix, (idx, total) in shown)
+                     + (f", +{more}" if more > 0 else ''))
+        self.log(line)
+
+    def stop(self):
+        """Send this process' last batch, merge what is left and log the final line"""
+        global _channel, _reporter
+        reporter().flush()
+        self.stopping.set()
+        self.thread.join()
+        while True:
+            try:
+                self.merge(self.channel.get(timeout=0.1))
+            except queue.Empty:
+                break
+        self.render()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        _channel = _reporter = None
+        self.channel.close()
@@ -0,0 +1,165 @@
+"""
+HTTP transports of the worker sessions, with connection reuse metrics.
+
+A doctor costs 5 sequential POSTs to the same host, and a worker keeps its
+session for every prefix and doctor it handles (parallel_scraper.WorkerSession),
+so after the first request each one should go out on a warm connection:
+one round trip instead of TCP + TLS handshakes first. config.TRANSPORT picks
+the client behind the session:
+
+    requests  requests.Session on an HTTPAdapter keeping HTTP_POOL_SIZE
+              keep-alive connections per host (HTTP/1.1)
+    httpx     httpx.Client with HTTP/2: the server negotiates h2 over TLS
+              (ALPN) and every request of the worker is a stream on one
+              connection; HTTP/1.1 keep-alive otherwise. Needs httpx[http2],
+              'requests' is used when it is not installed
+
+Every transport counts the connections it opens (scraper_connections_opened_total)
+and its responses by protocol version (scraper_http_responses_total), so
+reuse = 1 - opened / responses. The async engine feeds the same two metrics
+from its aiohttp sessions.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+import config
+import telemetry
+
+try:
+    import httpx
+    import h2  # noqa: F401  (httpx needs it for http2=True)
+except ImportError:
+    httpx = None
+
+
+# Network errors worth retrying (anything else is raised right away)
+RETRYABLE_ERRORS = (requests.Timeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError)
+if httpx is not None:
+    RETRYABLE_ERRORS += (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+
+# urllib3 HTTPResponse.version → protocol label
+_HTTP_VERSIONS = {10: 'HTTP/1.0', 11: 'HTTP/1.1', 20: 'HTTP/2'}
+
+
+def count_opened(transport):
+    telemetry.reporter().count('scraper_connections_opened_total', transport=transport)
+
+
+def count_response(transport, protocol):
+    telemetry.reporter().count('scraper_http_responses_total', transport=transport, protocol=protocol)
+
+
+def name():
+    """Transport the worker sessions use (config.TRANSPORT, unless httpx is missing)"""
+    if config.TRANSPORT == 'httpx' and httpx is not None:
+        return 'httpx'
+    return 'requests'
+
+
+def create_session(headers):
+    """New worker session of the configured transport, with the given default headers"""
+    if name() == 'httpx':
+        return HttpxSession(headers)
+    session = requests.Session()
+    adapter = CountingAdapter(pool_maxsize=config.HTTP_POOL_SIZE)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(headers)
+    return session
+
+
+# requests: count the connects of urllib3 (a dropped keep-alive connection
+# is reconnected through the same connection object, so not in _new_conn)
+
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        super().connect()
+        count_opened('requests')
+
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        super().connect()
+        count_opened('requests')
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+class CountingAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools count the connections they open and the responses by protocol"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        count_response('requests', _HTTP_VERSIONS.get(getattr(response.raw, 'version', None), 'other'))
+        return response
+
+
+class HttpxSession:
+    """
+    httpx.Client with HTTP/2, behind the part of the requests.Session API
+    the workers use (request(), headers, close()). Cookies and redirects
+    behave as with requests.
+    """
+
+    def __init__(self, headers):
+        self.client = httpx.Client(
+            http2=True,
+            headers=headers,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=config.HTTP_POOL_SIZE,
+                                max_keepalive_connections=config.HTTP_POOL_SIZE,
+                                keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY),
+        )
+        self.headers = self.client.headers
+
+    def request(self, method, url, params=None, data=None, headers=None, timeout=None):
+        # requests sends a str/bytes `data` as the raw body, httpx wants it as content
+        content = None
+        if isinstance(data, (str, bytes)):
+            content, data = data, None
+        # timeout=None means no timeout to httpx, keep the client's default then
+        options = {'timeout': timeout} if timeout is not None else {}
+        response = self.client.request(method, url, params=params, data=data, content=content, headers=headers,
+                                       extensions={'trace': _trace_httpx}, **options)
+        count_response('httpx', response.http_version)
+        return response
+
+    def close(self):
+        self.client.close()
+
+
+def _trace_httpx(event_name, info):
+    """httpcore trace hook: one event per TCP connect of the client's pool"""
+    if event_name == 'connection.connect_tcp.complete':
+        count_opened('httpx')
+
+
+def reuse_summary(registry):
+    """'N opened for M responses (x% reused), HTTP/1.1 M' from a merged metrics registry, None if no response"""
+    responses = registry.total('scraper_http_responses_total')
+    if not responses:
+        return None
+    opened = registry.total('scraper_connections_opened_total')
+    protocols = {}
+    for (metric, labels), value in registry.counters.items():
+        if metric == 'scraper_http_responses_total':
+            protocol = dict(labels)['protocol']
+            protocols[protocol] = protocols.get(protocol, 0) + value
+    return (f"{opened} opened for {responses} responses ({max(0.0, 1 - opened / responses):.1%} reused), "
+            + ', '.join(f"{protocol} {count}" for protocol, count in sorted(protocols.items())))